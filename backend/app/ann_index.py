@@ -0,0 +1,139 @@
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+ANN_INDEX_ENABLED = os.getenv("ANN_INDEX_ENABLED", "0") == "1"
+ANN_CAPACITY = int(os.getenv("ANN_CAPACITY", "100000"))
+ANN_TABLES = int(os.getenv("ANN_TABLES", "4"))
+ANN_BITS = int(os.getenv("ANN_BITS", "12"))
+ANN_MAX_CANDIDATES = int(os.getenv("ANN_MAX_CANDIDATES", "512"))
+# A neighbour counts as "the same probe" at or above this cosine similarity
+ANN_MATCH_THRESHOLD = float(os.getenv("ANN_MATCH_THRESHOLD", "0.92"))
+# Distinct other users needed before cross-user similarity raises a d-score
+ANN_MIN_USERS = int(os.getenv("ANN_MIN_USERS", "3"))
+ANN_SEED = int(os.getenv("ANN_SEED", "1337"))
+
+
+class ProbeIndex:
+    """
+    Global approximate-nearest-neighbour index over recent prompt embeddings
+    from all users, used to spot the same probe arriving from many X-User-IDs.
+
+    Random-hyperplane LSH: ANN_TABLES hash tables of ANN_BITS sign bits each.
+    Vectors live in a fixed (ANN_CAPACITY, dim) ring, so memory is bounded and
+    the oldest prompts age out. Each bucket keeps only the latest slot per
+    user, so one bot resending a prompt cannot grow a bucket. A query re-ranks
+    at most ANN_MAX_CANDIDATES bucket-mates with one matrix-vector product.
+    """
+
+    def __init__(self, capacity: int = ANN_CAPACITY, tables: int = ANN_TABLES,
+                 bits: int = ANN_BITS, seed: int = ANN_SEED):
+        self.capacity = capacity
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self.dim: Optional[int] = None
+        self._bit_weights = (1 << np.arange(bits)).astype(np.int64)
+
+    def _allocate(self, dim: int):
+        rng = np.random.default_rng(self.seed)
+        self.dim = dim
+        self._planes = rng.standard_normal((self.tables * self.bits, dim)).astype(np.float32)
+        self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._keys = np.zeros((self.capacity, self.tables), dtype=np.int64)
+        self._owners: List[Optional[str]] = [None] * self.capacity
+        # Per table: hash key -> {user_id: latest slot}
+        self._buckets: List[Dict[int, Dict[str, int]]] = [{} for _ in range(self.tables)]
+        self._next = 0
+        self._count = 0
+
+    def _hash(self, unit: np.ndarray) -> np.ndarray:
+        signs = (self._planes @ unit > 0).reshape(self.tables, self.bits)
+        return signs.astype(np.int64) @ self._bit_weights
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> Optional[np.ndarray]:
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return None
+        return (embedding / norm).astype(np.float32, copy=False)
+
+    def add(self, user_id: str, embedding: np.ndarray):
+        if self.dim != embedding.shape[-1]:
+            # First vector, or the embedding backend changed: start over
+            self._allocate(embedding.shape[-1])
+        unit = self._unit(embedding)
+        if unit is None:
+            return
+
+        slot = self._next
+        owner = self._owners[slot]
+        if owner is not None:
+            for t, key in enumerate(self._keys[slot]):
+                bucket = self._buckets[t].get(int(key))
+                if bucket is not None and bucket.get(owner) == slot:
+                    del bucket[owner]
+                    if not bucket:
+                        del self._buckets[t][int(key)]
+
+        keys = self._hash(unit)
+        self._vectors[slot] = unit
+        self._keys[slot] = keys
+        self._owners[slot] = user_id
+        for t, key in enumerate(keys):
+            self._buckets[t].setdefault(int(key), {})[user_id] = slot
+
+        self._next = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def query(self, user_id: str, embedding: np.ndarray,
+              threshold: float = ANN_MATCH_THRESHOLD) -> Tuple[float, int]:
+        """
+        Best similarity to other users' recent prompts, and how many distinct
+        other users sent a prompt at least `threshold` similar.
+        """
+        if self.dim != embedding.shape[-1] or self._count == 0:
+            return 0.0, 0
+        unit = self._unit(embedding)
+        if unit is None:
+            return 0.0, 0
+
+        candidates: Set[int] = set()
+        for t, key in enumerate(self._hash(unit)):
+            for owner, slot in self._buckets[t].get(int(key), {}).items():
+                if owner != user_id:
+                    candidates.add(slot)
+                    if len(candidates) >= ANN_MAX_CANDIDATES:
+                        break
+            if len(candidates) >= ANN_MAX_CANDIDATES:
+                break
+        if not candidates:
+            return 0.0, 0
+        candidates = list(candidates)
+
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = self._vectors[slots] @ unit
+        matches = {self._owners[slot] for slot, sim in zip(candidates, similarities) if sim >= threshold}
+        return float(similarities.max()), len(matches)
+
+    def cross_user_score(self, user_id: str, embedding: np.ndarray) -> float:
+        """d-score contribution from coordinated probing across X-User-IDs"""
+        best, users = self.query(user_id, embedding)
+        if users < ANN_MIN_USERS:
+            return 0.0
+        return max(0.0, min(1.0, best))
+
+    def metrics(self) -> Dict:
+        if self.dim is None:
+            return {"enabled": True, "vectors": 0}
+        return {
+            "enabled": True,
+            "vectors": self._count,
+            "capacity": self.capacity,
+            "buckets": sum(len(b) for b in self._buckets)
+        }
+
+
+probe_index: Optional[ProbeIndex] = ProbeIndex() if ANN_INDEX_ENABLED else None
@@ -1,34 +1,389 @@
+import asyncio
 import httpx
 import os
+import random
+import time
 from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from audit_policy import AuditEvent
+from database import (
+    count_audit_events,
+    due_audit_events,
+    enqueue_audit_event,
+    get_install_id,
+    mark_audit_events,
+    next_audit_attempt_at,
+    run_db
+)
+from live_feed import live_feed
+from state_store import user_store
 
 BLOCKCHAIN_SERVICE_URL = os.getenv("BLOCKCHAIN_SERVICE_URL", "http://localhost:3001")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "20"))
+# Upper bound on how long a pending event waits when nothing wakes the sender
+AUDIT_POLL_INTERVAL_S = float(os.getenv("AUDIT_POLL_INTERVAL_S", "5.0"))
+AUDIT_MAX_ATTEMPTS = int(os.getenv("AUDIT_MAX_ATTEMPTS", "8"))
+AUDIT_BACKOFF_BASE_S = float(os.getenv("AUDIT_BACKOFF_BASE_S", "1.0"))
+AUDIT_BACKOFF_MAX_S = float(os.getenv("AUDIT_BACKOFF_MAX_S", "300"))
+# The bridge answers /log-threats once the batch is submitted, without waiting
+# for blocks; a timed-out batch is retried and deduped by outbox id
+AUDIT_HTTP_TIMEOUT_S = float(os.getenv("AUDIT_HTTP_TIMEOUT_S", "30"))
+# How often submitted (sent, not yet mined) transactions are checked for a receipt
+AUDIT_CONFIRM_INTERVAL_S = float(os.getenv("AUDIT_CONFIRM_INTERVAL_S", "5"))
 
 
-async def trigger_blockchain_audit(user_id: str, hybrid_score: float, duration_mins: float) -> dict:
-    try:
-        payload = {
+class AuditOutbox:
+    """
+    Fire-and-forget delivery of Tier 3 audit events to the blockchain bridge.
+
+    Requests only insert a row into the audit_outbox table; one background
+    task sends due rows in batches of up to AUDIT_BATCH_SIZE over a pooled,
+    keep-alive HTTP client (POST /log-threats, or one /log-threat call per
+    event against an older bridge). Failed events are retried with jittered
+    exponential backoff and marked failed after AUDIT_MAX_ATTEMPTS. Rows
+    survive restarts, so delivery is at-least-once; each event carries
+    "<install id>-<outbox id>" as idempotency_key, which the bridge uses as
+    the on-chain threatId, so a resent event is recorded once.
+
+    The bulk endpoint answers before its transactions are mined: those rows
+    are 'submitted' and checked every AUDIT_CONFIRM_INTERVAL_S
+    (POST /threat-status) until the bridge reports them mined ('sent'), or
+    reverted / dropped by the node, which puts them back to pending. Only
+    mined transaction hashes are written back to users.blockchain_tx.
+    """
+
+    def __init__(
+        self,
+        base_url: str = BLOCKCHAIN_SERVICE_URL,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        poll_interval_s: float = AUDIT_POLL_INTERVAL_S,
+        max_attempts: int = AUDIT_MAX_ATTEMPTS
+    ):
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.poll_interval_s = poll_interval_s
+        self.max_attempts = max_attempts
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        # Set once the bridge answers 404 for /log-threats
+        self._bulk_supported = True
+        self._install_id: Optional[str] = None
+
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.confirmed = 0
+        self.requeued = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=AUDIT_HTTP_TIMEOUT_S,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop sending; pending rows stay in the outbox for the next start"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def enqueue(self, user_id: str, event: AuditEvent) -> int:
+        timestamp = datetime.now(timezone.utc).isoformat()
+        event_id = await run_db(
+            enqueue_audit_event,
+            user_id,
+            event.threat_score,
+            event.duration_mins,
+            timestamp,
+            event.event_type,
+            event.event_count,
+            event.episode_started_at.isoformat()
+        )
+        self.enqueued += 1
+        self._publish({
+            "id": event_id,
             "user_id": user_id,
-            "threat_score": hybrid_score,
-            "duration_minutes": duration_mins,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{BLOCKCHAIN_SERVICE_URL}/log-threat",
-                json=payload,
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ Blockchain proof generated for: {user_id}")
-                return {
-                    "tx_hash": data.get("txHash"),
-                    "hash_id": data.get("userHashId")
-                }
+            "timestamp": timestamp,
+            "event_type": event.event_type,
+            "event_count": event.event_count
+        }, "pending")
+        self._wakeup.set()
+        return event_id
+
+    # ------------------------------------------------------------------
+    # Sender
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            try:
+                delay = await self._send_due()
+            except Exception as e:
+                print(f"❌ Audit outbox error: {e}")
+                delay = self.poll_interval_s
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+    async def _send_due(self) -> float:
+        """Check one batch of submitted events, send one batch of due events; returns how long to sleep"""
+        if self._install_id is None:
+            self._install_id = await run_db(get_install_id)
+        checked = await self._confirm_submitted()
+
+        events = await run_db(due_audit_events, time.time(), self.batch_size)
+        if not events:
+            return 0.0 if checked == self.batch_size else await self._idle_delay()
+
+        results = await self._post(events)
+        self.batches += 1
+
+        sent, submitted, retry, failed, confirmed = [], [], [], [], []
+        for event, result in zip(events, results):
+            if result.get("success"):
+                tx_hash, hash_id = result.get("txHash"), result.get("userHashId")
+                if result.get("mined", True):
+                    sent.append((tx_hash, hash_id, event["id"]))
+                    confirmed.append((event, tx_hash, hash_id))
+                else:
+                    submitted.append((tx_hash, hash_id, time.time() + AUDIT_CONFIRM_INTERVAL_S, event["id"]))
+                    self._publish(event, "submitted", tx_hash)
+                continue
+            error = str(result.get("error", "unknown error"))[:500]
+            attempts = event["attempts"] + 1
+            if result.get("retryable", True) and attempts < self.max_attempts:
+                retry.append((time.time() + self._backoff(attempts), error, event["id"]))
+            else:
+                failed.append((error, event["id"]))
+                self._publish(event, "failed")
+        await run_db(mark_audit_events, sent, retry, failed, submitted)
+
+        self.sent += len(sent)
+        self.retried += len(retry)
+        self.failed += len(failed)
+        if failed:
+            print(f"❌ {len(failed)} blockchain audit event(s) failed permanently")
+
+        await self._confirmed(confirmed)
+
+        # Go straight on while batches come back full
+        return 0.0 if self.batch_size in (len(events), checked) else await self._idle_delay()
+
+    async def _confirm_submitted(self) -> int:
+        """Check due submitted events for a receipt; returns how many were checked"""
+        events = await run_db(due_audit_events, time.time(), self.batch_size, "submitted")
+        if not events:
+            return 0
+
+        statuses = await self._check(events)
+        confirmed, rescheduled, failed, mined = [], [], [], []
+        for event, status in zip(events, statuses):
+            state = status.get("status")
+            if state == "confirmed":
+                tx_hash = status.get("txHash") or event["tx_hash"]
+                confirmed.append((tx_hash, event["id"]))
+                mined.append((event, tx_hash, event["hash_id"]))
+            elif state in ("reverted", "dropped"):
+                # Not on chain: send it again (the submission already counted as an attempt)
+                error = str(status.get("error", state))[:500]
+                if event["attempts"] < self.max_attempts:
+                    rescheduled.append(("pending", time.time() + self._backoff(event["attempts"]), error, event["id"]))
+                    self.requeued += 1
+                    self._publish(event, "pending")
+                else:
+                    failed.append((error, event["id"]))
+                    self._publish(event, "failed")
+            else:
+                rescheduled.append(("submitted", time.time() + AUDIT_CONFIRM_INTERVAL_S, status.get("error"), event["id"]))
+        await run_db(mark_audit_events, [], [], failed, (), confirmed, rescheduled)
+
+        self.sent += len(confirmed)
+        self.failed += len(failed)
+        if failed:
+            print(f"❌ {len(failed)} blockchain audit event(s) failed permanently")
+        await self._confirmed(mined)
+        return len(events)
+
+    async def _confirmed(self, mined: List[tuple]):
+        self.confirmed += len(mined)
+        for event, tx_hash, hash_id in mined:
+            await self._write_back(event["user_id"], tx_hash, hash_id)
+            self._publish(event, "confirmed", tx_hash)
+            print(f"✅ Blockchain proof generated for: {event['user_id']} ({tx_hash})")
+
+    async def _idle_delay(self) -> float:
+        """Sleep until the earliest retry is due, at most poll_interval_s"""
+        next_at = await run_db(next_audit_attempt_at)
+        if next_at is None:
+            return self.poll_interval_s
+        return min(max(next_at - time.time(), 0.0), self.poll_interval_s)
+
+    async def _post(self, events: List[Dict]) -> List[Dict]:
+        """Deliver events; returns one {success, txHash, userHashId | error, retryable} per event"""
+        payloads = [
+            {
+                "user_id": e["user_id"],
+                "threat_score": e["threat_score"],
+                "duration_minutes": e["duration_minutes"],
+                "timestamp": e["timestamp"],
+                "event_type": e["event_type"],
+                "event_count": e["event_count"],
+                "episode_started_at": e["episode_started_at"],
+                "idempotency_key": self._idempotency_key(e)
+            }
+            for e in events
+        ]
+
+        if self._bulk_supported:
+            try:
+                response = await self._client.post("/log-threats", json={"events": payloads})
+            except httpx.HTTPError as e:
+                return [{"success": False, "error": f"Blockchain bridge unreachable: {e}"}] * len(events)
+            if response.status_code == 404:
+                print("⚠️ Blockchain bridge has no /log-threats, sending events one by one")
+                self._bulk_supported = False
+            elif response.status_code == 200:
+                return self._bulk_results(response, len(events))
+            else:
+                return [{"success": False, "error": f"HTTP {response.status_code}: {response.text[:200]}"}] * len(events)
+
+        results = []
+        for payload in payloads:
+            try:
+                response = await self._client.post("/log-threat", json=payload)
+                if response.status_code == 200:
+                    result = self._json(response)
+                    results.append(result if isinstance(result, dict) else {
+                        "success": False,
+                        "error": f"Malformed bridge response: {response.text[:200]}"
+                    })
+                else:
+                    results.append({
+                        "success": False,
+                        "error": f"HTTP {response.status_code}: {response.text[:200]}",
+                        "retryable": response.status_code != 400
+                    })
+            except httpx.HTTPError as e:
+                results.append({"success": False, "error": f"Blockchain bridge unreachable: {e}"})
+        return results
+
+    async def _check(self, events: List[Dict]) -> List[Dict]:
+        """Receipt status of submitted events: one {status: confirmed | pending | reverted | dropped} per event"""
+        payload = {"events": [{"idempotency_key": self._idempotency_key(e), "txHash": e["tx_hash"]} for e in events]}
+        try:
+            response = await self._client.post("/threat-status", json=payload)
+        except httpx.HTTPError as e:
+            return [{"status": "pending", "error": f"Blockchain bridge unreachable: {e}"}] * len(events)
+        if response.status_code != 200:
+            return [{"status": "pending", "error": f"HTTP {response.status_code}: {response.text[:200]}"}] * len(events)
+        body = self._json(response)
+        results = body.get("results") if isinstance(body, dict) else None
+        if isinstance(results, list) and len(results) == len(events) and all(isinstance(r, dict) for r in results):
+            return results
+        return [{"status": "pending", "error": f"Malformed bridge response: {response.text[:200]}"}] * len(events)
+
+    def _idempotency_key(self, event: Dict) -> str:
+        # Outbox ids restart with a fresh database; the install id keeps keys unique on-chain
+        return f"{self._install_id}-{event['id']}"
+
+    @classmethod
+    def _bulk_results(cls, response: httpx.Response, count: int) -> List[Dict]:
+        """
+        The per-event results of a /log-threats answer. An unreadable answer
+        counts as a failed attempt for every event, so it is retried with
+        backoff and eventually marked failed rather than resent forever.
+        """
+        body = cls._json(response)
+        results = body.get("results") if isinstance(body, dict) else None
+        if isinstance(results, list) and len(results) == count and all(isinstance(r, dict) for r in results):
+            return results
+        error = f"Malformed bridge response: {response.text[:200]}"
+        return [{"success": False, "error": error}] * count
+
+    @staticmethod
+    def _json(response: httpx.Response):
+        try:
+            return response.json()
+        except ValueError:
             return None
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        # Full jitter, so events that failed together don't retry in lockstep
+        return random.uniform(0, min(AUDIT_BACKOFF_MAX_S, AUDIT_BACKOFF_BASE_S * 2 ** attempts))
+
+    @staticmethod
+    def _publish(event: Dict, status: str, tx_hash: Optional[str] = None):
+        # Same shape as /api/blockchain/status rows; keyed by outbox id so a
+        # confirmation replaces a still-buffered "pending"
+        live_feed.publish("audit", event["id"], {
+            "id": event["id"],
+            "timestamp": event["timestamp"],
+            "userId": event["user_id"],
+            "tier": 3,
+            "txHash": tx_hash,
+            "status": status,
+            "eventType": event["event_type"],
+            "eventCount": event["event_count"]
+        })
+
+    async def _write_back(self, user_id: str, tx_hash: Optional[str], hash_id: Optional[str]):
+        try:
+            state = await user_store.get(user_id)
+            user_store.update(state, {"blockchain_tx": tx_hash, "privacy_hash_id": hash_id})
+        except Exception as e:
+            print(f"❌ Could not record blockchain tx for {user_id}: {e}")
+
+    async def metrics(self) -> Dict:
+        return {
+            "outbox": await run_db(count_audit_events),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "confirmed": self.confirmed,
+            "requeued": self.requeued,
+            "batches": self.batches,
+            "bulk_endpoint": self._bulk_supported
+        }
+
+
+audit_outbox = AuditOutbox()
+
+
+async def trigger_blockchain_audit(user_id: str, event: AuditEvent) -> Optional[int]:
+    """
+    Queue an audit event chosen by the audit policy and return its outbox id
+    without waiting for the chain; users.blockchain_tx is filled in once the
+    bridge confirms it.
+    """
+    try:
+        return await audit_outbox.enqueue(user_id, event)
     except Exception as e:
         print(f"❌ Blockchain Bridge Error: {e}")
-        return None
\ No newline at end of file
+        return None
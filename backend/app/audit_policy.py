@@ -0,0 +1,127 @@
+import os
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+# How often an ongoing Tier 3 episode is summarized on-chain
+AUDIT_SUMMARY_INTERVAL_S = float(os.getenv("AUDIT_SUMMARY_INTERVAL_S", "600"))
+# How long a user must stay below Tier 3 before their episode closes
+AUDIT_EPISODE_COOLDOWN_S = float(os.getenv("AUDIT_EPISODE_COOLDOWN_S", str(AUDIT_SUMMARY_INTERVAL_S)))
+
+
+class AuditEvent(NamedTuple):
+    """One on-chain audit record, as queued in audit_outbox"""
+    event_type: str          # "escalation" or "summary"
+    threat_score: float      # request score, or max score over the summarized requests
+    duration_mins: float     # session duration, or episode duration for summaries
+    event_count: int         # requests covered by this record
+    episode_started_at: datetime
+
+
+class AuditPolicy:
+    """
+    Decides which Tier 3 requests reach the chain.
+
+    A user's escalation episode starts with the first Tier 3 request, which
+    is logged on its own. Later Tier 3 requests are only counted (with their
+    max score) on the user record, and flushed as one summary event once
+    AUDIT_SUMMARY_INTERVAL_S has passed since the last on-chain record.
+    Requests below Tier 3 within AUDIT_EPISODE_COOLDOWN_S of the last Tier 3
+    one are counted in the episode too, so a score hovering around the
+    threshold doesn't open a new escalation per request; the first one after
+    the cool-down closes the episode and flushes what is left. A bot at
+    30 RPM thus costs one transaction per interval instead of 30 a minute.
+    Summaries are only emitted from inside a request, so an episode whose
+    user goes silent is summarized by its next request.
+    """
+
+    def __init__(self, summary_interval_s: float = AUDIT_SUMMARY_INTERVAL_S,
+                 cooldown_s: float = AUDIT_EPISODE_COOLDOWN_S):
+        self.summary_interval_s = summary_interval_s
+        self.cooldown_s = cooldown_s
+        self.escalations = 0
+        self.summaries = 0
+        self.suppressed = 0
+
+    def observe(self, state: Dict, tier: int, hybrid_score: float, duration_mins: float,
+                now: datetime) -> Tuple[Optional[AuditEvent], Dict]:
+        """
+        Apply one request to the user's audit state. Returns the event to
+        queue (or None) and the state updates to commit with the request.
+        """
+        episode_started = state.get("audit_episode_started_at")
+        pending_count = state.get("audit_pending_count", 0)
+        pending_max = state.get("audit_pending_max_score", 0.0)
+
+        if tier < 3:
+            if episode_started is None:
+                return None, {}
+            last_tier3 = state.get("audit_last_tier3_at") or state.get("audit_last_logged_at") or episode_started
+            if (now - last_tier3).total_seconds() < self.cooldown_s:
+                # A dip inside the episode: counted, the episode stays open
+                self.suppressed += 1
+                return None, {
+                    "audit_pending_count": pending_count + 1,
+                    "audit_pending_max_score": max(pending_max, hybrid_score)
+                }
+            event = None
+            if pending_count:
+                event = self._summary(pending_count, pending_max, episode_started, now)
+            return event, self._closed()
+
+        if episode_started is None:
+            self.escalations += 1
+            event = AuditEvent("escalation", hybrid_score, duration_mins, 1, now)
+            return event, {
+                "audit_episode_started_at": now,
+                "audit_last_logged_at": now,
+                "audit_last_tier3_at": now,
+                "audit_pending_count": 0,
+                "audit_pending_max_score": 0.0
+            }
+
+        pending_count += 1
+        pending_max = max(pending_max, hybrid_score)
+        last_logged = state.get("audit_last_logged_at") or episode_started
+        if (now - last_logged).total_seconds() >= self.summary_interval_s:
+            event = self._summary(pending_count, pending_max, episode_started, now)
+            return event, {
+                "audit_last_logged_at": now,
+                "audit_last_tier3_at": now,
+                "audit_pending_count": 0,
+                "audit_pending_max_score": 0.0
+            }
+
+        self.suppressed += 1
+        return None, {
+            "audit_last_tier3_at": now,
+            "audit_pending_count": pending_count,
+            "audit_pending_max_score": pending_max
+        }
+
+    def _summary(self, count: int, max_score: float, episode_started: datetime, now: datetime) -> AuditEvent:
+        self.summaries += 1
+        episode_mins = (now - episode_started).total_seconds() / 60
+        return AuditEvent("summary", max_score, episode_mins, count, episode_started)
+
+    @staticmethod
+    def _closed() -> Dict:
+        return {
+            "audit_episode_started_at": None,
+            "audit_last_logged_at": None,
+            "audit_last_tier3_at": None,
+            "audit_pending_count": 0,
+            "audit_pending_max_score": 0.0
+        }
+
+    def metrics(self) -> Dict:
+        return {
+            "summary_interval_s": self.summary_interval_s,
+            "cooldown_s": self.cooldown_s,
+            "escalations": self.escalations,
+            "summaries": self.summaries,
+            "suppressed": self.suppressed
+        }
+
+
+audit_policy = AuditPolicy()
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Off by default: when enabled, a user's campaign score takes part in the tier
+# decision as max(hybrid_score, campaign score), so it can only escalate users
+CAMPAIGN_DETECTOR_ENABLED = os.getenv("CAMPAIGN_DETECTOR_ENABLED", "0") == "1"
+CAMPAIGN_INTERVAL_S = float(os.getenv("CAMPAIGN_INTERVAL_S", "2.0"))
+CAMPAIGN_QUEUE_MAX = int(os.getenv("CAMPAIGN_QUEUE_MAX", "50000"))
+CAMPAIGN_WINDOW_S = float(os.getenv("CAMPAIGN_WINDOW_S", "600"))
+CAMPAIGN_MAX_CLUSTERS = int(os.getenv("CAMPAIGN_MAX_CLUSTERS", "1024"))
+CAMPAIGN_MAX_EVENTS_PER_CLUSTER = int(os.getenv("CAMPAIGN_MAX_EVENTS_PER_CLUSTER", "10000"))
+# Prompts at or above this cosine similarity to a centroid join its cluster
+CAMPAIGN_SIM_THRESHOLD = float(os.getenv("CAMPAIGN_SIM_THRESHOLD", "0.9"))
+# A cluster needs this many distinct users in the window to score at all...
+CAMPAIGN_MIN_USERS = int(os.getenv("CAMPAIGN_MIN_USERS", "5"))
+# ...and reaches its full user factor at this many
+CAMPAIGN_USERS_SATURATION = int(os.getenv("CAMPAIGN_USERS_SATURATION", "50"))
+# Aggregate requests per minute at which the rate factor saturates
+CAMPAIGN_RPM_SATURATION = float(os.getenv("CAMPAIGN_RPM_SATURATION", "60"))
+
+
+class _Cluster:
+    __slots__ = ("cluster_id", "count", "events")
+
+    def __init__(self, cluster_id: int):
+        self.cluster_id = cluster_id
+        self.count = 0
+        # (epoch seconds, user_id), oldest first
+        self.events: deque = deque(maxlen=CAMPAIGN_MAX_EVENTS_PER_CLUSTER)
+
+
+class CampaignDetector:
+    """
+    Streaming cross-user probe campaign detector.
+
+    Subscribes to the query-log stream (see QueryLogWriter.subscribe) and
+    never runs on the request path: observations go onto a bounded queue and
+    a background task hands each batch to a worker thread every
+    CAMPAIGN_INTERVAL_S. The worker assigns prompt embeddings to clusters
+    incrementally (online leader clustering on cosine similarity), keeps a
+    sliding CAMPAIGN_WINDOW_S of (time, user) events per cluster, and scores
+    each cluster by how many distinct users and how much aggregate traffic
+    it drew. Scores are published as a fresh user -> score dict, swapped in
+    atomically, so handle_query reads them with one O(1) lookup.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=CAMPAIGN_QUEUE_MAX)
+        self._task: Optional[asyncio.Task] = None
+
+        # Worker-thread state (only touched by one _process call at a time)
+        self._dim: Optional[int] = None
+        self._centroids: Optional[np.ndarray] = None
+        # Per slot: occupied, and last event time (kept in step with _clusters)
+        self._active: Optional[np.ndarray] = None
+        self._last_seen: Optional[np.ndarray] = None
+        self._clusters: List[Optional[_Cluster]] = []
+        self._next_cluster_id = 0
+
+        # Published state (replaced wholesale, read from the event loop)
+        self._user_scores: Dict[str, float] = {}
+        self._cluster_summaries: List[Dict] = []
+
+        self.observed = 0
+        self.dropped = 0
+        self.passes = 0
+        self.last_pass_ms = 0.0
+
+    # ------------------------------------------------------------------
+    # Stream input / lookup (event loop)
+    # ------------------------------------------------------------------
+
+    def on_query_log(self, row: tuple, embedding: Optional[np.ndarray]):
+        """QueryLogWriter subscriber: enqueue without ever blocking the request"""
+        if embedding is None:
+            return
+        user_id = row[0]
+        try:
+            self._queue.put_nowait((time.time(), user_id, embedding))
+            self.observed += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def score_for(self, user_id: str) -> float:
+        """Threat score of the campaign cluster this user's recent prompts fall in"""
+        return self._user_scores.get(user_id, 0.0)
+
+    def campaigns(self) -> List[Dict]:
+        return self._cluster_summaries
+
+    # ------------------------------------------------------------------
+    # Background job
+    # ------------------------------------------------------------------
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CAMPAIGN_INTERVAL_S)
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                started = time.perf_counter()
+                user_scores, summaries = await asyncio.to_thread(self._process, batch, time.time())
+                self._user_scores = user_scores
+                self._cluster_summaries = summaries
+                self.passes += 1
+                self.last_pass_ms = round(1000 * (time.perf_counter() - started), 2)
+            except Exception as e:
+                print(f"❌ Campaign detector pass failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Incremental clustering (worker thread)
+    # ------------------------------------------------------------------
+
+    def _reset(self, dim: int):
+        self._dim = dim
+        self._centroids = np.zeros((CAMPAIGN_MAX_CLUSTERS, dim), dtype=np.float32)
+        self._active = np.zeros(CAMPAIGN_MAX_CLUSTERS, dtype=bool)
+        self._last_seen = np.zeros(CAMPAIGN_MAX_CLUSTERS, dtype=np.float64)
+        self._clusters = [None] * CAMPAIGN_MAX_CLUSTERS
+        self._next_cluster_id = 0
+
+    def _new_cluster_slot(self) -> int:
+        free = np.flatnonzero(~self._active)
+        if free.size:
+            return int(free[0])
+        # Full: recycle the cluster that has been quiet the longest
+        return int(np.argmin(self._last_seen))
+
+    def _assign(self, unit: np.ndarray, ts: float, user_id: str):
+        # Empty slots hold zero centroids (similarity 0); mask them out anyway
+        sims = np.where(self._active, self._centroids @ unit, -np.inf)
+        best_slot = int(np.argmax(sims))
+        best_sim = float(sims[best_slot])
+
+        if best_sim >= CAMPAIGN_SIM_THRESHOLD:
+            cluster = self._clusters[best_slot]
+            # Running mean of member directions, kept unit length
+            centroid = self._centroids[best_slot] * cluster.count + unit
+            self._centroids[best_slot] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        else:
+            best_slot = self._new_cluster_slot()
+            cluster = _Cluster(self._next_cluster_id)
+            self._next_cluster_id += 1
+            self._clusters[best_slot] = cluster
+            self._centroids[best_slot] = unit
+            self._active[best_slot] = True
+
+        cluster.count += 1
+        cluster.events.append((ts, user_id))
+        self._last_seen[best_slot] = ts
+
+    def _process(self, batch: List[Tuple[float, str, np.ndarray]], now: float):
+        for ts, user_id, embedding in batch:
+            if self._dim != embedding.shape[-1]:
+                self._reset(embedding.shape[-1])
+            norm = np.linalg.norm(embedding)
+            if norm == 0:
+                continue
+            self._assign((embedding / norm).astype(np.float32), ts, user_id)
+
+        cutoff = now - CAMPAIGN_WINDOW_S
+        user_scores: Dict[str, float] = {}
+        summaries = []
+        for slot, cluster in enumerate(self._clusters):
+            if cluster is None:
+                continue
+            while cluster.events and cluster.events[0][0] < cutoff:
+                cluster.events.popleft()
+            if not cluster.events:
+                self._clusters[slot] = None
+                self._active[slot] = False
+                continue
+
+            users = {user_id for _, user_id in cluster.events}
+            if len(users) < CAMPAIGN_MIN_USERS:
+                continue
+            span_mins = max((now - cluster.events[0][0]) / 60.0, 1.0)
+            rpm = len(cluster.events) / span_mins
+            user_factor = min(1.0, len(users) / CAMPAIGN_USERS_SATURATION)
+            rate_factor = min(1.0, rpm / CAMPAIGN_RPM_SATURATION)
+            score = round(user_factor * (0.5 + 0.5 * rate_factor), 3)
+
+            for user_id in users:
+                user_scores[user_id] = max(score, user_scores.get(user_id, 0.0))
+            summaries.append({
+                "cluster_id": cluster.cluster_id,
+                "distinct_users": len(users),
+                "events_in_window": len(cluster.events),
+                "rpm": round(rpm, 2),
+                "score": score
+            })
+
+        summaries.sort(key=lambda c: c["score"], reverse=True)
+        return user_scores, summaries
+
+    def metrics(self) -> Dict:
+        return {
+            "enabled": True,
+            "observed": self.observed,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "passes": self.passes,
+            "last_pass_ms": self.last_pass_ms,
+            "flagged_users": len(self._user_scores),
+            "campaigns": len(self._cluster_summaries)
+        }
+
+
+campaign_detector: Optional[CampaignDetector] = CampaignDetector() if CAMPAIGN_DETECTOR_ENABLED else None
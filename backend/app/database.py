@@ -1,15 +1,215 @@
 import sqlite3
+import base64
+import hashlib
 import json
 import os
-from datetime import datetime, timezone
-from typing import Dict, Optional
+import queue
+import threading
+import time
+import asyncio
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
 import numpy as np
 from contextlib import contextmanager
 
+from scoring import EmbeddingWindow
+from time_manager import TimestampRing
+
 
 # Database file path
 DB_PATH = os.getenv("SQLITE_DB_PATH", "sentinel.db")
 
+# Connection pool / pragma tuning
+# Threads running run_db() work
+SQLITE_EXECUTOR_WORKERS = int(os.getenv("SQLITE_EXECUTOR_WORKERS", "8"))
+# Connections borrowed outside the executor: the log archiver's maintenance
+# thread (log_archive.py, which also holds one through read_log_partition)
+SQLITE_EXTERNAL_BORROWERS = 1
+# Never smaller than executor workers + external borrowers
+SQLITE_POOL_SIZE = max(
+    int(os.getenv("SQLITE_POOL_SIZE", "0")),
+    SQLITE_EXECUTOR_WORKERS + SQLITE_EXTERNAL_BORROWERS
+)
+SQLITE_POOL_TIMEOUT_S = float(os.getenv("SQLITE_POOL_TIMEOUT_S", "10"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+# Per-connection prepared statement cache (keyed by SQL text)
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# Response bodies of at least this many bytes are stored zlib-compressed (-1: never)
+RESPONSE_BLOB_COMPRESS_MIN = int(os.getenv("RESPONSE_BLOB_COMPRESS_MIN", "256"))
+
+
+# ============================================================================
+# Connection Pool
+# ============================================================================
+
+class ConnectionPool:
+    """
+    Fixed-size pool of long-lived SQLite connections.
+
+    Every connection runs in WAL mode so admin reads don't block chat writes,
+    with synchronous=NORMAL, memory-mapped I/O, a larger page cache and a busy
+    timeout. Connections are kept open, so the fixed queries below stay in
+    each connection's prepared statement cache.
+    """
+
+    def __init__(self, path: str, size: int = SQLITE_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquisitions = 0
+        self._timeouts = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False,  # a connection is only ever used by one borrower at a time
+            cached_statements=SQLITE_STATEMENT_CACHE
+        )
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=SQLITE_POOL_TIMEOUT_S)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise TimeoutError(f"No SQLite connection available within {SQLITE_POOL_TIMEOUT_S}s")
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._acquisitions += 1
+            self._wait_total_s += waited
+            self._wait_max_s = max(self._wait_max_s, waited)
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._created -= 1
+        if discard:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        else:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquisitions": self._acquisitions,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": round(1000 * self._wait_total_s / self._acquisitions, 3) if self._acquisitions else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max_s, 3)
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def get_pool_metrics() -> Dict:
+    return get_pool().metrics()
+
+
+# ============================================================================
+# Async Data Access: all blocking sqlite3 work runs on a dedicated executor
+# ============================================================================
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                # The pool holds a connection per worker on top of the external
+                # borrowers' (SQLITE_EXTERNAL_BORROWERS), so workers never wait on it
+                _executor = ThreadPoolExecutor(max_workers=SQLITE_EXECUTOR_WORKERS, thread_name_prefix="sqlite")
+    return _executor
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking database function on the DB executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), partial(fn, *args, **kwargs))
+
+
+def close_db_pool():
+    """Wait for queued DB work, then close every pooled connection"""
+    global _pool, _executor
+    with _pool_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 
 # ============================================================================
 # Database Connection Context Manager
@@ -17,17 +217,61 @@ DB_PATH = os.getenv("SQLITE_DB_PATH", "sentinel.db")
 
 @contextmanager
 def get_db_connection():
-    """Context manager for SQLite connections"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    """Context manager that borrows a pooled SQLite connection"""
+    pool = get_pool()
+    conn = pool.acquire()
+    discard = False
     try:
         yield conn
         conn.commit()
     except Exception as e:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            # Connection is unusable; don't hand it to the next borrower
+            discard = True
         raise e
     finally:
-        conn.close()
+        pool.release(conn, discard=discard)
+
+
+# ============================================================================
+# Column Encodings
+# ============================================================================
+
+def encode_embedding(embedding: np.ndarray) -> bytes:
+    """Embedding -> raw little-endian float32 bytes (512 bytes for 128 dims)"""
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def decode_embedding(value) -> Optional[np.ndarray]:
+    """Raw float32 BLOB -> read-only float32 array sharing the row's buffer"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # Row written by a pre-migration process
+        return np.array(json.loads(value), dtype=np.float32)
+    return np.frombuffer(value, dtype="<f4")
+
+
+def decode_embedding_window(value, last_embedding: Optional[np.ndarray] = None) -> Optional[EmbeddingWindow]:
+    """EmbeddingWindow BLOB -> window; rows from before the window existed are seeded with the last embedding"""
+    if value is not None:
+        return EmbeddingWindow.from_bytes(value)
+    if last_embedding is not None:
+        window = EmbeddingWindow(last_embedding.shape[-1])
+        window.add(last_embedding)
+        return window
+    return None
+
+
+def decode_timestamps(value) -> TimestampRing:
+    """float64 epoch-seconds BLOB (or legacy JSON list of ISO strings) -> TimestampRing"""
+    if value is None:
+        return TimestampRing()
+    if isinstance(value, str):
+        return TimestampRing.from_array([datetime.fromisoformat(ts).timestamp() for ts in json.loads(value)])
+    return TimestampRing.from_bytes(value)
 
 
 # ============================================================================
@@ -39,9 +283,16 @@ def init_database():
     Create tables if they don't exist.
     Run this once at startup.
     """
+    needs_vacuum = False
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
+        # Incremental auto-vacuum hands the pages of dropped log partitions back to the OS
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # The pool opens connections in WAL mode, so the file only switches over with a VACUUM (run below)
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            needs_vacuum = True
+        
         # Users table - FIXED: Added missing CREATE TABLE statement
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -49,9 +300,9 @@ def init_database():
                 first_seen_at TEXT,
                 last_active_at TEXT NOT NULL,
                 dynamic_mean_rpm REAL DEFAULT 0.0,
-                last_query_embedding TEXT,
+                last_query_embedding BLOB,
                 total_queries INTEGER DEFAULT 0,
-                query_timestamps TEXT DEFAULT '[]',
+                query_timestamps BLOB DEFAULT x'',
                 tier INTEGER DEFAULT 1
             )
         """)
@@ -65,218 +316,1181 @@ def init_database():
 
         add_column_if_missing(conn, 'users', 'blockchain_tx', 'TEXT')
         add_column_if_missing(conn, 'users', 'privacy_hash_id', 'TEXT')
+        # Recent-embedding window for multi-query d-score
+        add_column_if_missing(conn, 'users', 'query_embeddings', 'BLOB')
+        # Audit policy state: current Tier 3 episode and its unlogged requests
+        add_column_if_missing(conn, 'users', 'audit_episode_started_at', 'TEXT')
+        add_column_if_missing(conn, 'users', 'audit_last_logged_at', 'TEXT')
+        add_column_if_missing(conn, 'users', 'audit_pending_count', 'INTEGER DEFAULT 0')
+        add_column_if_missing(conn, 'users', 'audit_pending_max_score', 'REAL DEFAULT 0')
+        add_column_if_missing(conn, 'users', 'audit_last_tier3_at', 'TEXT')
+        
+        # Migrate JSON-text embeddings to raw float32 BLOBs
+        cursor.execute("""
+            SELECT user_id, last_query_embedding FROM users
+            WHERE typeof(last_query_embedding) = 'text'
+        """)
+        legacy = cursor.fetchall()
+        if legacy:
+            cursor.executemany(
+                "UPDATE users SET last_query_embedding = ? WHERE user_id = ?",
+                [(encode_embedding(np.array(json.loads(text))), user_id) for user_id, text in legacy]
+            )
+            print(f"✅ Migrated {len(legacy)} embeddings to float32 BLOBs")
+        
+        # Migrate JSON lists of ISO timestamps to float64 epoch BLOBs
+        cursor.execute("""
+            SELECT user_id, query_timestamps FROM users
+            WHERE typeof(query_timestamps) = 'text'
+        """)
+        legacy = cursor.fetchall()
+        if legacy:
+            cursor.executemany(
+                "UPDATE users SET query_timestamps = ? WHERE user_id = ?",
+                [(decode_timestamps(text).to_bytes(), user_id) for user_id, text in legacy]
+            )
+            print(f"✅ Migrated {len(legacy)} query timestamp lists to ring BLOBs")
+        
+        # Query logs: one table per UTC day, see "Query Log Partitions" below
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS log_partitions (
+                day TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'hot',
+                row_count INTEGER,
+                archive_path TEXT,
+                created_at TEXT NOT NULL,
+                archived_at TEXT
+            )
+        """)
+        # Highest id the day has handed out, so a reopened day continues after its archive
+        add_column_if_missing(conn, 'log_partitions', 'max_id', 'INTEGER')
+        # Response bodies, stored once per distinct text (see "Response Blobs")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS response_blobs (
+                hash BLOB PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # References of partitions being dropped, released after the drop in chunks
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS response_blob_release_days (
+                day TEXT PRIMARY KEY,
+                dropped INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS response_blob_releases (
+                day TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                refs INTEGER NOT NULL,
+                PRIMARY KEY (day, hash)
+            )
+        """)
+        _log_partitions.clear()
+        _log_partitions.update(_hot_log_partitions(conn))
+        blob_columns = {r[1] for r in cursor.execute("PRAGMA table_info(response_blobs)").fetchall()}
+        if "refs" not in blob_columns:
+            cursor.execute("ALTER TABLE response_blobs ADD COLUMN refs INTEGER NOT NULL DEFAULT 0")
+            _count_response_refs(conn)
+        migrated = _upgrade_log_partitions(conn) + _migrate_legacy_query_logs(conn)
+        _refresh_query_logs_view(conn)
         
-        # Query logs table
+        # Durable outbound queue of blockchain audit events (see audit_bridge)
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS query_logs (
+            CREATE TABLE IF NOT EXISTS audit_outbox (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT NOT NULL,
+                threat_score REAL NOT NULL,
+                duration_minutes REAL NOT NULL,
                 timestamp TEXT NOT NULL,
-                query TEXT NOT NULL,
-                clean_response TEXT NOT NULL,
-                served_response TEXT NOT NULL,
-                tier INTEGER NOT NULL,
-                hybrid_score REAL NOT NULL,
-                duration_mins REAL NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                tx_hash TEXT,
+                hash_id TEXT,
+                sent_at TEXT
+            )
+        """)
+        # "escalation" opens an episode; "summary" aggregates event_count requests
+        add_column_if_missing(conn, 'audit_outbox', 'event_type', "TEXT DEFAULT 'escalation'")
+        add_column_if_missing(conn, 'audit_outbox', 'event_count', 'INTEGER DEFAULT 1')
+        add_column_if_missing(conn, 'audit_outbox', 'episode_started_at', 'TEXT')
+        # Facts about this database itself (e.g. its install id, see get_install_id)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS install_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
             )
         """)
-        
-        # Create index for faster queries
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_user_timestamp 
-            ON query_logs(user_id, timestamp)
+            CREATE INDEX IF NOT EXISTS idx_audit_outbox_due
+            ON audit_outbox(status, next_attempt_at)
         """)
         
+        # Keyset pagination for the admin listings (newest first, see _keyset_page).
+        # Log partitions carry their own indexes (_ensure_log_partition).
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active_at, user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_tier_last_active ON users(tier, last_active_at, user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_outbox_user ON audit_outbox(user_id, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_outbox_timestamp ON audit_outbox(timestamp, id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_audit_outbox_user_timestamp ON audit_outbox(user_id, timestamp, id)"
+        )
+        
         conn.commit()
+        
+        # Finish releasing blobs of partitions dropped before a crash or restart
+        freed = _recover_response_releases(conn)
+        
+        if needs_vacuum:
+            print("🧹 Enabling incremental auto-vacuum (one-time VACUUM)...")
+            conn.execute("VACUUM")
+        elif migrated or freed:
+            conn.executescript("PRAGMA incremental_vacuum")  # execute() would free a single page
 
 
 # ============================================================================
 # User State Management
 # ============================================================================
 
-async def get_user_state(user_id: str) -> Dict:
-    """
-    Fetch user state from SQLite.
-    Creates new user record if doesn't exist.
-    
-    Returns:
-        {
-            "user_id": str,
-            "first_seen_at": datetime | None,
-            "last_active_at": datetime,
-            "dynamic_mean_rpm": float,
-            "last_query_embedding": np.ndarray | None,
-            "total_queries": int,
-            "query_timestamps": List[datetime]
-        }
+def new_user_state(user_id: str) -> Dict:
+    """Fresh in-memory state for a user that has no row yet"""
+    return {
+        "user_id": user_id,
+        "first_seen_at": None,
+        "last_active_at": datetime.now(timezone.utc),
+        "dynamic_mean_rpm": 0.0,
+        "last_query_embedding": None,
+        "embedding_window": None,
+        "total_queries": 0,
+        "query_timestamps": TimestampRing(),
+        "tier": 1,
+        "blockchain_tx": None,
+        "privacy_hash_id": None,
+        "audit_episode_started_at": None,
+        "audit_last_logged_at": None,
+        "audit_pending_count": 0,
+        "audit_pending_max_score": 0.0,
+        "audit_last_tier3_at": None,
+        # Not persisted: False until TierCounters has counted this user
+        "in_tier_counts": False
+    }
+
+
+def _row_to_state(row: sqlite3.Row) -> Dict:
+    """Parse a users row into the in-memory state dict"""
+    last_embedding = decode_embedding(row["last_query_embedding"])
+    return {
+        "user_id": row["user_id"],
+        "first_seen_at": datetime.fromisoformat(row["first_seen_at"]) if row["first_seen_at"] else None,
+        "last_active_at": datetime.fromisoformat(row["last_active_at"]),
+        "dynamic_mean_rpm": row["dynamic_mean_rpm"],
+        "last_query_embedding": last_embedding,
+        "embedding_window": decode_embedding_window(row["query_embeddings"], last_embedding),
+        "total_queries": row["total_queries"],
+        "query_timestamps": decode_timestamps(row["query_timestamps"]),
+        "tier": row["tier"] if row["tier"] is not None else 1,
+        "blockchain_tx": row["blockchain_tx"],
+        "privacy_hash_id": row["privacy_hash_id"],
+        "audit_episode_started_at": _parse_ts(row["audit_episode_started_at"]),
+        "audit_last_logged_at": _parse_ts(row["audit_last_logged_at"]),
+        "audit_pending_count": row["audit_pending_count"] or 0,
+        "audit_pending_max_score": row["audit_pending_max_score"] or 0.0,
+        "audit_last_tier3_at": _parse_ts(row["audit_last_tier3_at"]),
+        # Every users row is counted by TierCounters.reconcile() or was recorded when created
+        "in_tier_counts": True
+    }
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def state_to_row(state: Dict) -> tuple:
+    """
+    Serialize a state dict into UPSERT_USER_SQL parameters.
+    Call on the thread that owns the state; the result is safe to hand off.
     """
+    embedding = state.get("last_query_embedding")
+    window = state.get("embedding_window")
+    first_seen = state.get("first_seen_at")
+    episode_started = state.get("audit_episode_started_at")
+    last_logged = state.get("audit_last_logged_at")
+    last_tier3 = state.get("audit_last_tier3_at")
+    return (
+        state["user_id"],
+        first_seen.isoformat() if first_seen else None,
+        state["last_active_at"].isoformat(),
+        state.get("dynamic_mean_rpm", 0.0),
+        encode_embedding(embedding) if embedding is not None else None,
+        state.get("total_queries", 0),
+        state["query_timestamps"].to_bytes(),
+        state.get("tier", 1),
+        state.get("blockchain_tx"),
+        state.get("privacy_hash_id"),
+        window.to_bytes() if window is not None else None,
+        episode_started.isoformat() if episode_started else None,
+        last_logged.isoformat() if last_logged else None,
+        state.get("audit_pending_count", 0),
+        state.get("audit_pending_max_score", 0.0),
+        last_tier3.isoformat() if last_tier3 else None
+    )
+
+
+SELECT_USER_SQL = "SELECT * FROM users WHERE user_id = ?"
+
+UPSERT_USER_SQL = """
+    INSERT INTO users (
+        user_id, first_seen_at, last_active_at, dynamic_mean_rpm,
+        last_query_embedding, total_queries, query_timestamps, tier,
+        blockchain_tx, privacy_hash_id, query_embeddings,
+        audit_episode_started_at, audit_last_logged_at,
+        audit_pending_count, audit_pending_max_score, audit_last_tier3_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        first_seen_at = excluded.first_seen_at,
+        last_active_at = excluded.last_active_at,
+        dynamic_mean_rpm = excluded.dynamic_mean_rpm,
+        last_query_embedding = excluded.last_query_embedding,
+        total_queries = excluded.total_queries,
+        query_timestamps = excluded.query_timestamps,
+        tier = excluded.tier,
+        blockchain_tx = excluded.blockchain_tx,
+        privacy_hash_id = excluded.privacy_hash_id,
+        query_embeddings = excluded.query_embeddings,
+        audit_episode_started_at = excluded.audit_episode_started_at,
+        audit_last_logged_at = excluded.audit_last_logged_at,
+        audit_pending_count = excluded.audit_pending_count,
+        audit_pending_max_score = excluded.audit_pending_max_score,
+        audit_last_tier3_at = excluded.audit_last_tier3_at
+"""
+
+
+def load_user_state(user_id: str) -> Optional[Dict]:
+    """Read one user's state, or None if the user has never been persisted"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        cursor.execute(SELECT_USER_SQL, (user_id,))
         row = cursor.fetchone()
-        
-        if not row:
-            # Create new user
-            now = datetime.now(timezone.utc).isoformat()
-            cursor.execute("""
-                INSERT INTO users (user_id, last_active_at, query_timestamps)
-                VALUES (?, ?, ?)
-            """, (user_id, now, '[]'))
-            conn.commit()
-            
-            return {
-                "user_id": user_id,
-                "first_seen_at": None,
-                "last_active_at": datetime.now(timezone.utc),
-                "dynamic_mean_rpm": 0.0,
-                "last_query_embedding": None,
-                "total_queries": 0,
-                "query_timestamps": []
-            }
-        
-        # Parse stored data
-        user_state = {
-            "user_id": row["user_id"],
-            "first_seen_at": datetime.fromisoformat(row["first_seen_at"]) if row["first_seen_at"] else None,
-            "last_active_at": datetime.fromisoformat(row["last_active_at"]),
-            "dynamic_mean_rpm": row["dynamic_mean_rpm"],
-            "last_query_embedding": np.array(json.loads(row["last_query_embedding"])) if row["last_query_embedding"] else None,
-            "total_queries": row["total_queries"],
-            "query_timestamps": [datetime.fromisoformat(ts) for ts in json.loads(row["query_timestamps"])]
-        }
-        
-        return user_state
+        return _row_to_state(row) if row else None
 
 
-async def update_user_state(user_id: str, updates: Dict) -> Dict:
-    """
-    Update user state in SQLite.
-    
-    Args:
-        user_id: User identifier
-        updates: Dict of fields to update
-    
-    Returns:
-        Updated user state
-    """
+def save_user_rows(rows: List[tuple]):
+    """Write many serialized user states in a single transaction"""
+    if not rows:
+        return
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Build UPDATE query dynamically
-        set_clauses = []
-        values = []
-        
-        for key, value in updates.items():
-            if key == "last_query_embedding" and isinstance(value, np.ndarray):
-                # Convert numpy array to JSON
-                set_clauses.append(f"{key} = ?")
-                values.append(json.dumps(value.tolist()))
-            elif key == "query_timestamps" and isinstance(value, list):
-                # Convert datetime list to JSON
-                set_clauses.append(f"{key} = ?")
-                values.append(json.dumps([ts.isoformat() for ts in value]))
-            elif isinstance(value, datetime):
-                set_clauses.append(f"{key} = ?")
-                values.append(value.isoformat())
-            else:
-                set_clauses.append(f"{key} = ?")
-                values.append(value)
-        
-        values.append(user_id)
-        
-        query = f"UPDATE users SET {', '.join(set_clauses)} WHERE user_id = ?"
-        cursor.execute(query, values)
-        conn.commit()
-    
-    # Return updated state
-    return await get_user_state(user_id)
+        conn.executemany(UPSERT_USER_SQL, rows)
+
+
+# Query log rows as queued, spilled and archived: responses as text
+QUERY_LOG_COLUMNS = (
+    "user_id", "timestamp", "query", "clean_response", "served_response", "tier",
+    "hybrid_score", "duration_mins", "request_id", "noise_seed", "noise_pipeline"
+)
+QUERY_LOG_ROW_LEN = len(QUERY_LOG_COLUMNS)
+
+# As stored in a partition: responses as response_blobs hashes
+QUERY_LOG_TABLE_COLUMNS = (
+    "user_id", "timestamp", "query", "clean_response_hash", "served_response_hash", "noisy_served",
+    "tier", "hybrid_score", "duration_mins", "request_id", "noise_seed", "noise_pipeline"
+)
 
 
-async def log_query(
+def query_log_row(
     user_id: str, 
     query: str, 
     clean_response: str, 
     served_response: str, 
     tier: int,
     hybrid_score: float,
-    duration_mins: float
-):
+    duration_mins: float,
+    timestamp: Optional[str] = None,
+    request_id: Optional[str] = None,
+    noise_seed: Optional[int] = None,
+    noise_pipeline: Optional[str] = None
+) -> tuple:
+    """Build one query log row (QUERY_LOG_COLUMNS order), stamping the current time by default"""
+    return (
+        user_id,
+        timestamp or datetime.now(timezone.utc).isoformat(),
+        query,
+        clean_response,
+        served_response,
+        tier,
+        hybrid_score,
+        duration_mins,
+        request_id,
+        noise_seed,
+        noise_pipeline
+    )
+
+
+def insert_query_logs(rows: List[tuple]):
+    """Insert many query_log_row() tuples in a single transaction, each into its day's partition"""
+    if not rows:
+        return
+    by_day: Dict[str, List[tuple]] = {}
+    for row in rows:
+        by_day.setdefault(log_partition_day(row[1]), []).append(row)
+    try:
+        with get_db_connection() as conn:
+            # Take the write lock before looking up known response hashes, so a
+            # blob release can't delete one before the row referencing it lands
+            conn.execute("BEGIN IMMEDIATE")
+            for day, day_rows in by_day.items():
+                _insert_log_rows(conn, day, day_rows)
+    except Exception:
+        # A partition created in the rolled-back transaction doesn't exist
+        with _log_partitions_lock:
+            _log_partitions.difference_update(by_day)
+        raise
+
+
+# ============================================================================
+# Response Blobs
+# ============================================================================
+# Bots repeat prompts, so the same response text recurs across thousands of
+# query logs. Each distinct body is stored once in response_blobs, keyed by
+# the SHA-256 of its text (zlib-compressed from RESPONSE_BLOB_COMPRESS_MIN
+# bytes); partitions hold the two 32-byte hashes plus a precomputed
+# noisy_served flag, so listings never read response text. Each blob counts
+# the hot partition rows referencing it (refs, two per row); a dropped
+# partition's references are staged before the drop and released after it
+# in short chunked transactions, deleting blobs that reach zero. Archives
+# carry the full text.
+
+# Hashes per "WHERE hash IN (...)" statement (SQLite's default variable limit is 999)
+_BLOB_LOOKUP_CHUNK = 500
+
+
+def response_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _encode_response(text: str) -> tuple:
+    """Response text -> (codec, size, body)"""
+    raw = text.encode("utf-8")
+    if 0 <= RESPONSE_BLOB_COMPRESS_MIN <= len(raw):
+        packed = zlib.compress(raw)
+        if len(packed) < len(raw):
+            return "zlib", len(raw), packed
+    return "raw", len(raw), raw
+
+
+def _decode_response(codec: str, body: bytes) -> str:
+    if codec == "zlib":
+        body = zlib.decompress(body)
+    return body.decode("utf-8")
+
+
+def _known_response_hashes(conn: sqlite3.Connection, hashes: List[bytes]) -> set:
+    known = set()
+    for i in range(0, len(hashes), _BLOB_LOOKUP_CHUNK):
+        chunk = hashes[i:i + _BLOB_LOOKUP_CHUNK]
+        cursor = conn.execute(
+            f"SELECT hash FROM response_blobs WHERE hash IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        known.update(row[0] for row in cursor.fetchall())
+    return known
+
+
+def _store_response_blobs(conn: sqlite3.Connection, texts: Dict[bytes, str], refs: Dict[bytes, int]):
+    """
+    Add refs[hash] references to each body (hash -> text), storing the ones
+    not already present; only new bodies get encoded. Caller holds the write lock.
+    """
+    known = _known_response_hashes(conn, list(texts))
+    conn.executemany(
+        "UPDATE response_blobs SET refs = refs + ? WHERE hash = ?",
+        [(refs[digest], digest) for digest in texts if digest in known]
+    )
+    conn.executemany(
+        "INSERT INTO response_blobs (hash, codec, size, body, refs) VALUES (?, ?, ?, ?, ?)",
+        [(digest,) + _encode_response(text) + (refs[digest],) for digest, text in texts.items() if digest not in known]
+    )
+
+
+def _load_response_blobs(conn: sqlite3.Connection, hashes) -> Dict[bytes, str]:
+    """hash -> response text for the given hashes"""
+    hashes = list(hashes)
+    texts = {}
+    for i in range(0, len(hashes), _BLOB_LOOKUP_CHUNK):
+        chunk = hashes[i:i + _BLOB_LOOKUP_CHUNK]
+        cursor = conn.execute(
+            f"SELECT hash, codec, body FROM response_blobs WHERE hash IN ({', '.join('?' * len(chunk))})",
+            chunk
+        )
+        for digest, codec, body in cursor.fetchall():
+            texts[digest] = _decode_response(codec, body)
+    return texts
+
+
+def _partition_response_refs(conn: sqlite3.Connection, table: str, after_id: int, last_id: int) -> List[tuple]:
+    """(hash, references) for the partition rows with after_id < id <= last_id"""
+    return conn.execute(
+        f"""
+        SELECT hash, COUNT(*) FROM (
+            SELECT clean_response_hash AS hash FROM {table} WHERE id > ? AND id <= ?
+            UNION ALL
+            SELECT served_response_hash FROM {table} WHERE id > ? AND id <= ?
+        ) GROUP BY hash
+        """,
+        (after_id, last_id, after_id, last_id)
+    ).fetchall()
+
+
+def _count_response_refs(conn: sqlite3.Connection):
+    """Set refs from the hot partitions (once, when the column is added)"""
+    for day in _hot_log_partitions(conn):
+        table = log_partition_table(day)
+        columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+        if "clean_response_hash" not in columns:
+            continue  # inline partitions are rebuilt by _upgrade_log_partitions, which counts them
+        last_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+        refs = _partition_response_refs(conn, table, 0, last_id)
+        conn.executemany("UPDATE response_blobs SET refs = refs + ? WHERE hash = ?", [(n, h) for h, n in refs])
+    orphans = conn.execute("DELETE FROM response_blobs WHERE refs <= 0").rowcount
+    print(f"✅ Counted response blob references ({orphans} unreferenced blobs removed)")
+
+
+def _stage_response_releases(conn: sqlite3.Connection, day: str, refs: List[tuple], commit: bool):
+    """Queue a partition's blob references for release once it is dropped"""
+    for i in range(0, len(refs), _BLOB_LOOKUP_CHUNK):
+        conn.executemany(
+            """
+            INSERT INTO response_blob_releases (day, hash, refs) VALUES (?, ?, ?)
+            ON CONFLICT(day, hash) DO UPDATE SET refs = refs + excluded.refs
+            """,
+            [(day, digest, count) for digest, count in refs[i:i + _BLOB_LOOKUP_CHUNK]]
+        )
+        if commit:
+            conn.commit()
+
+
+def _release_response_blobs(conn: sqlite3.Connection) -> int:
+    """
+    Apply the staged releases of dropped partitions, _BLOB_LOOKUP_CHUNK
+    hashes per short write transaction; blobs left without references are
+    deleted. Returns the number of blobs deleted.
+    """
+    freed = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """
+            SELECT r.day, r.hash, r.refs FROM response_blob_releases r
+            JOIN response_blob_release_days d ON d.day = r.day
+            WHERE d.dropped = 1
+            LIMIT ?
+            """,
+            (_BLOB_LOOKUP_CHUNK,)
+        ).fetchall()
+        if not rows:
+            conn.execute("DELETE FROM response_blob_release_days WHERE dropped = 1")
+            conn.commit()
+            return freed
+        conn.executemany("UPDATE response_blobs SET refs = refs - ? WHERE hash = ?", [(n, h) for _, h, n in rows])
+        hashes = [h for _, h, _ in rows]
+        freed += conn.execute(
+            f"DELETE FROM response_blobs WHERE refs <= 0 AND hash IN ({', '.join('?' * len(hashes))})", hashes
+        ).rowcount
+        conn.executemany("DELETE FROM response_blob_releases WHERE day = ? AND hash = ?", [(d, h) for d, h, _ in rows])
+        conn.commit()
+
+
+def _recover_response_releases(conn: sqlite3.Connection) -> int:
+    """Startup: discard releases staged for drops that never happened, apply the rest"""
+    conn.execute("""
+        DELETE FROM response_blob_releases
+        WHERE day IN (SELECT day FROM response_blob_release_days WHERE dropped = 0)
+    """)
+    conn.execute("DELETE FROM response_blob_release_days WHERE dropped = 0")
+    conn.commit()
+    freed = _release_response_blobs(conn)
+    if freed:
+        print(f"🧹 Freed {freed} response blobs of previously dropped partitions")
+    return freed
+
+
+def _with_responses(row: sqlite3.Row, texts: Dict[bytes, str]) -> Dict:
+    """Partition row -> dict with the response texts in place of their hashes"""
+    record = dict(row)
+    record["clean_response"] = texts.get(record.pop("clean_response_hash"))
+    record["served_response"] = texts.get(record.pop("served_response_hash"))
+    record["noisy_served"] = bool(record["noisy_served"])
+    return record
+
+
+# ============================================================================
+# Query Log Partitions
+# ============================================================================
+# Query logs live in one table per UTC day, query_logs_YYYYMMDD, listed in
+# log_partitions. Inserts only touch the current day's small indexes, and
+# old days are archived and dropped as whole tables (log_archive.py) rather
+# than DELETEd. A row's id encodes its day, (day number << 32) + sequence,
+# so ids grow across partitions and any id leads straight to its partition.
+# The query_logs view unions the hot partitions for ad-hoc forensic SQL
+# (join response_blobs on the hashes for response bodies).
+
+LOG_ID_DAY_SHIFT = 32
+# Rows per batch when moving existing logs into partitions
+_LOG_MIGRATION_BATCH = 5000
+_EPOCH_DAY = date(1970, 1, 1)
+
+# Days whose partition table exists (this process's view of log_partitions)
+_log_partitions: set = set()
+_log_partitions_lock = threading.Lock()
+
+
+def log_partition_day(timestamp: str) -> str:
+    """ISO-8601 UTC timestamp -> partition day 'YYYYMMDD'"""
+    return timestamp[:10].replace("-", "")
+
+
+def log_partition_table(day: str) -> str:
+    if len(day) != 8 or not day.isdigit():
+        raise ValueError(f"Invalid log partition day: {day!r}")
+    return f"query_logs_{day}"
+
+
+def log_id_day(log_id: int) -> str:
+    """Partition day a query log id belongs to"""
+    return (_EPOCH_DAY + timedelta(days=log_id >> LOG_ID_DAY_SHIFT)).strftime("%Y%m%d")
+
+
+def _day_number(day: str) -> int:
+    return (date(int(day[:4]), int(day[4:6]), int(day[6:])) - _EPOCH_DAY).days
+
+
+def _insert_query_log_sql(day: str, with_ids: bool = False) -> str:
+    columns = (("id",) if with_ids else ()) + QUERY_LOG_TABLE_COLUMNS
+    return (
+        f"INSERT INTO {log_partition_table(day)} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+
+def _insert_log_rows(conn: sqlite3.Connection, day: str, rows: List[tuple], with_ids: bool = False):
     """
-    Log query details for forensic analysis in SQLite.
+    Insert query_log_row() tuples (each prefixed by its id when with_ids)
+    into the day's partition, storing their responses as response_blobs
+    and counting the references
     """
+    _ensure_log_partition(conn, day)
+    hashes: Dict[str, bytes] = {}
+
+    def hash_of(text: str) -> bytes:
+        digest = hashes.get(text)
+        if digest is None:
+            digest = hashes[text] = response_hash(text)
+        return digest
+
+    table_rows = []
+    refs: Dict[bytes, int] = {}
+    for row in rows:
+        head, fields = (row[:1], row[1:]) if with_ids else ((), row)
+        clean_hash, served_hash = hash_of(fields[3]), hash_of(fields[4])
+        table_rows.append(head + fields[:3] + (clean_hash, served_hash, clean_hash != served_hash) + fields[5:])
+        refs[clean_hash] = refs.get(clean_hash, 0) + 1
+        refs[served_hash] = refs.get(served_hash, 0) + 1
+    _store_response_blobs(conn, {digest: text for text, digest in hashes.items()}, refs)
+    conn.executemany(_insert_query_log_sql(day, with_ids), table_rows)
+
+
+def _ensure_log_partition(conn: sqlite3.Connection, day: str):
+    """Create the day's partition table (in the caller's transaction) unless it exists"""
+    if day in _log_partitions:
+        return
+    table = log_partition_table(day)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            query TEXT NOT NULL,
+            clean_response_hash BLOB NOT NULL,
+            served_response_hash BLOB NOT NULL,
+            noisy_served INTEGER NOT NULL,
+            tier INTEGER NOT NULL,
+            hybrid_score REAL NOT NULL,
+            duration_mins REAL NOT NULL,
+            request_id TEXT,
+            noise_seed INTEGER,
+            noise_pipeline TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    # Every index implicitly ends in id (the rowid), the keyset tie-breaker
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table}(timestamp)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_tier_timestamp ON {table}(tier, timestamp)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_timestamp ON {table}(user_id, timestamp)")
+    # Start the AUTOINCREMENT sequence at this day's id range, after any ids
+    # already archived for the day (row_count bounds them for archives that
+    # predate max_id: ids are handed out consecutively)
+    if conn.execute("SELECT 1 FROM sqlite_sequence WHERE name = ?", (table,)).fetchone() is None:
+        base = _day_number(day) << LOG_ID_DAY_SHIFT
+        archived = conn.execute(
+            "SELECT COALESCE(max_id, ? + COALESCE(row_count, 0)) FROM log_partitions WHERE day = ?",
+            (base, day)
+        ).fetchone()
+        conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+            (table, max(base, archived[0] if archived else 0))
+        )
+    # A late row for an archived day reopens it; the archiver merges it in again
+    conn.execute(
+        """
+        INSERT INTO log_partitions (day, status, created_at) VALUES (?, 'hot', ?)
+        ON CONFLICT(day) DO UPDATE SET status = 'hot'
+        """,
+        (day, datetime.now(timezone.utc).isoformat())
+    )
+    _refresh_query_logs_view(conn)
+    with _log_partitions_lock:
+        _log_partitions.add(day)
+    print(f"🗂️  Created query log partition {table}")
+
+
+def _hot_log_partitions(conn: sqlite3.Connection) -> List[str]:
+    """Days with a live partition table, newest first"""
+    rows = conn.execute("SELECT day FROM log_partitions WHERE status = 'hot' ORDER BY day DESC").fetchall()
+    return [row[0] for row in rows]
+
+
+def _refresh_query_logs_view(conn: sqlite3.Connection):
+    existing = conn.execute("SELECT type FROM sqlite_master WHERE name = 'query_logs'").fetchone()
+    if existing is not None and existing[0] == "table":
+        # Legacy table, still being migrated
+        return
+    conn.execute("DROP VIEW IF EXISTS query_logs")
+    days = _hot_log_partitions(conn)
+    if days:
+        columns = ", ".join(("id",) + QUERY_LOG_TABLE_COLUMNS)
+        union = " UNION ALL ".join(f"SELECT {columns} FROM {log_partition_table(day)}" for day in days)
+        conn.execute(f"CREATE VIEW query_logs AS {union}")
+
+
+def _upgrade_log_partitions(conn: sqlite3.Connection) -> int:
+    """Rebuild partitions that still store response text inline, keeping ids; returns rows moved"""
+    count = 0
+    for day in _hot_log_partitions(conn):
+        table = log_partition_table(day)
+        columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+        if "clean_response" not in columns:
+            continue
+        old_table = f"{table}_inline"
+        conn.execute("DROP VIEW IF EXISTS query_logs")
+        conn.execute(f"ALTER TABLE {table} RENAME TO {old_table}")
+        for index in ("timestamp", "tier_timestamp", "user_timestamp"):
+            conn.execute(f"DROP INDEX IF EXISTS idx_{table}_{index}")
+        with _log_partitions_lock:
+            _log_partitions.discard(day)
+        cursor = conn.execute(f"SELECT id, {', '.join(QUERY_LOG_COLUMNS)} FROM {old_table} ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(_LOG_MIGRATION_BATCH)
+            if not rows:
+                break
+            _insert_log_rows(conn, day, [tuple(row) for row in rows], with_ids=True)
+            count += len(rows)
+        _ensure_log_partition(conn, day)  # an empty partition still gets its table back
+        conn.execute(f"DROP TABLE {old_table}")
+    if count:
+        print(f"✅ Moved responses of {count} query logs into response_blobs")
+    return count
+
+
+def _migrate_legacy_query_logs(conn: sqlite3.Connection) -> int:
+    """Move rows of the pre-partitioning query_logs table into day partitions (new ids)"""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'query_logs'").fetchone()
+    if row is None or row[0] != "table":
+        return 0
+    present = {r[1] for r in conn.execute("PRAGMA table_info(query_logs)").fetchall()}
+    select_columns = ", ".join(col if col in present else "NULL" for col in QUERY_LOG_COLUMNS)
+    days = [r[0] for r in conn.execute("SELECT DISTINCT substr(timestamp, 1, 10) FROM query_logs").fetchall()]
+    for day_iso in days:
+        cursor = conn.execute(
+            f"SELECT {select_columns} FROM query_logs WHERE substr(timestamp, 1, 10) = ? ORDER BY id",
+            (day_iso,)
+        )
+        while True:
+            rows = cursor.fetchmany(_LOG_MIGRATION_BATCH)
+            if not rows:
+                break
+            _insert_log_rows(conn, log_partition_day(day_iso), [tuple(row) for row in rows])
+    count = conn.execute("SELECT COUNT(*) FROM query_logs").fetchone()[0]
+    conn.execute("DROP TABLE query_logs")
+    print(f"✅ Migrated {count} query logs into {len(days)} daily partitions")
+    return count
+
+
+def list_log_partitions() -> List[Dict]:
+    """Every partition, hot or archived, newest first"""
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO query_logs 
-            (user_id, timestamp, query, clean_response, served_response, tier, hybrid_score, duration_mins)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            datetime.now(timezone.utc).isoformat(),
-            query,
-            clean_response,
-            served_response,
-            tier,
-            hybrid_score,
-            duration_mins
-        ))
+        rows = conn.execute("SELECT * FROM log_partitions ORDER BY day DESC").fetchall()
+        return [dict(row) for row in rows]
+
+
+def get_log_partition(day: str) -> Optional[Dict]:
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT * FROM log_partitions WHERE day = ?", (day,)).fetchone()
+        return dict(row) if row else None
+
+
+def read_log_partition(day: str, batch_size: int):
+    """
+    Yield (columns, rows) batches of a partition in id order. Generator:
+    holds a pooled connection (and a read snapshot) until exhausted.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.execute(f"SELECT * FROM {log_partition_table(day)} ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            texts = _load_response_blobs(
+                conn, {row["clean_response_hash"] for row in rows} | {row["served_response_hash"] for row in rows}
+            )
+            records = [_with_responses(row, texts) for row in rows]
+            yield list(records[0]), [tuple(record.values()) for record in records]
+
+
+def drop_log_partition(day: str, archive_path: Optional[str] = None, row_count: Optional[int] = None,
+                       expected_rows: Optional[int] = None) -> bool:
+    """
+    Drop a day's partition table. With archive_path the day stays listed as
+    'archived'; without, it is forgotten (retention expiry). With
+    expected_rows, nothing is dropped (returns False) if the table no longer
+    holds exactly that many rows, i.e. rows arrived after it was archived.
+
+    The partition's blob references are counted and staged before taking the
+    write lock (rows are only ever appended, so rows up to the current max id
+    are final), the drop itself is one short transaction, and the references
+    are then released in chunks. Blobs only the dropped rows referenced are
+    deleted.
+    """
+    table = log_partition_table(day)
+    with get_db_connection() as conn:
+        # A previous drop's releases must not be mixed up with this one's
+        freed = _release_response_blobs(conn)
+
+        # Read-only scan, so writers carry on meanwhile
+        last_id, refs = 0, []
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone() is not None:
+            last_id, counted = conn.execute(f"SELECT COALESCE(MAX(id), 0), COUNT(*) FROM {table}").fetchone()
+            if expected_rows is not None and counted != expected_rows:
+                return False
+            refs = _partition_response_refs(conn, table, 0, last_id)
+        conn.execute("DELETE FROM response_blob_releases WHERE day = ?", (day,))  # left by a drop that never happened
+        conn.execute("INSERT OR REPLACE INTO response_blob_release_days (day, dropped) VALUES (?, 0)", (day,))
+        _stage_response_releases(conn, day, refs, commit=True)
+        conn.commit()
+
+        conn.execute("BEGIN IMMEDIATE")
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone() is not None
+        tail_id = last_id
+        if exists:
+            tail_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            if tail_id != last_id:
+                if expected_rows is not None:
+                    return False
+                # Late rows since the count: few, staged inside the lock
+                _stage_response_releases(conn, day, _partition_response_refs(conn, table, last_id, tail_id),
+                                         commit=False)
+        with _log_partitions_lock:
+            _log_partitions.discard(day)
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        if archive_path:
+            conn.execute(
+                """
+                UPDATE log_partitions
+                SET status = 'archived', archive_path = ?, row_count = ?, archived_at = ?,
+                    max_id = MAX(COALESCE(max_id, 0), ?)
+                WHERE day = ?
+                """,
+                (archive_path, row_count, datetime.now(timezone.utc).isoformat(), tail_id, day)
+            )
+        else:
+            conn.execute("DELETE FROM log_partitions WHERE day = ?", (day,))
+        _refresh_query_logs_view(conn)
+        conn.execute("UPDATE response_blob_release_days SET dropped = 1 WHERE day = ?", (day,))
         conn.commit()
 
+        freed += _release_response_blobs(conn)
+        conn.executescript("PRAGMA incremental_vacuum")  # execute() would free a single page
+    if freed:
+        print(f"🧹 Freed {freed} response blobs with partition {table}")
+    return True
+
 
-async def get_all_users() -> list:
-    """Fetch all active users for admin dashboard"""
+# ============================================================================
+# Blockchain Audit Outbox
+# ============================================================================
+
+def enqueue_audit_event(user_id: str, threat_score: float, duration_minutes: float,
+                        timestamp: Optional[str] = None, event_type: str = "escalation",
+                        event_count: int = 1, episode_started_at: Optional[str] = None) -> int:
+    """Persist one pending audit event; returns its outbox id"""
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users ORDER BY last_active_at DESC")
-        rows = cursor.fetchall()
-        
-        users = []
-        for row in rows:
-            user_state = {
-                "user_id": row["user_id"],
-                "first_seen_at": row["first_seen_at"],
-                "last_active_at": row["last_active_at"],
-                "dynamic_mean_rpm": row["dynamic_mean_rpm"],
-                "total_queries": row["total_queries"],
-                "time_active": 0.0,
-                "hybrid_score": 0.0,
-                "tier": 1
-            }
-            
-            # Calculate time_active
-            if row["first_seen_at"]:
-                first_seen = datetime.fromisoformat(row["first_seen_at"])
-                last_active = datetime.fromisoformat(row["last_active_at"])
-                time_active = (last_active - first_seen).total_seconds() / 60
-                user_state["time_active"] = max(0, time_active)
-            
-            users.append(user_state)
-        
-        return users
+        cursor = conn.execute(
+            """
+            INSERT INTO audit_outbox (
+                user_id, threat_score, duration_minutes, timestamp,
+                event_type, event_count, episode_started_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                user_id, threat_score, duration_minutes,
+                timestamp or datetime.now(timezone.utc).isoformat(),
+                event_type, event_count, episode_started_at
+            )
+        )
+        return cursor.lastrowid
+
+
+def get_install_id() -> str:
+    """
+    Random id of this database, created on first use. Outbox ids restart
+    with a new database, so on-chain idempotency keys are prefixed with it.
+    """
+    with get_db_connection() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO install_meta (key, value) VALUES ('install_id', ?)", (uuid.uuid4().hex,)
+        )
+        return conn.execute("SELECT value FROM install_meta WHERE key = 'install_id'").fetchone()[0]
+
+
+def due_audit_events(now: float, limit: int, status: str = "pending") -> List[Dict]:
+    """
+    Oldest events in `status` whose next attempt is due: 'pending' ones to
+    send, 'submitted' ones (sent, not yet mined) to check for a receipt
+    """
+    with get_db_connection() as conn:
+        cursor = conn.execute(
+            """
+            SELECT id, user_id, threat_score, duration_minutes, timestamp, attempts,
+                   event_type, event_count, episode_started_at, tx_hash, hash_id
+            FROM audit_outbox
+            WHERE status = ? AND next_attempt_at <= ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (status, now, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def next_audit_attempt_at() -> Optional[float]:
+    """When the earliest pending or submitted event becomes due (None if there is none)"""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT MIN(next_attempt_at) FROM audit_outbox WHERE status IN ('pending', 'submitted')"
+        ).fetchone()
+        return row[0]
 
 
-async def get_all_logs() -> list:
-    """Fetch all query logs"""
+def mark_audit_events(sent: List[tuple], retry: List[tuple], failed: List[tuple],
+                      submitted: List[tuple] = (), confirmed: List[tuple] = (),
+                      rescheduled: List[tuple] = ()):
+    """
+    Record one send (or receipt check) pass in a single transaction.
+    Send attempts count towards attempts:
+      sent: (tx_hash, hash_id, id), mined; submitted: (tx_hash, hash_id,
+      next_attempt_at, id), awaiting a receipt; retry: (next_attempt_at,
+      error, id), back to pending; failed: (error, id).
+    Receipt checks don't:
+      confirmed: (tx_hash, id), now mined; rescheduled: (status,
+      next_attempt_at, error, id), checked again later ('submitted') or
+      resent ('pending', after a revert).
+    """
+    sent_at = datetime.now(timezone.utc).isoformat()
+    with get_db_connection() as conn:
+        conn.executemany(
+            """
+            UPDATE audit_outbox
+            SET status = 'sent', tx_hash = ?, hash_id = ?, attempts = attempts + 1,
+                last_error = NULL, sent_at = ?
+            WHERE id = ?
+            """,
+            [(tx_hash, hash_id, sent_at, event_id) for tx_hash, hash_id, event_id in sent]
+        )
+        conn.executemany(
+            """
+            UPDATE audit_outbox
+            SET status = 'submitted', tx_hash = ?, hash_id = ?, next_attempt_at = ?,
+                attempts = attempts + 1, last_error = NULL
+            WHERE id = ?
+            """,
+            submitted
+        )
+        conn.executemany(
+            """
+            UPDATE audit_outbox
+            SET status = 'sent', tx_hash = ?, last_error = NULL, sent_at = ?
+            WHERE id = ?
+            """,
+            [(tx_hash, sent_at, event_id) for tx_hash, event_id in confirmed]
+        )
+        conn.executemany(
+            """
+            UPDATE audit_outbox
+            SET status = ?1, next_attempt_at = ?2, last_error = ?3,
+                tx_hash = CASE WHEN ?1 = 'pending' THEN NULL ELSE tx_hash END
+            WHERE id = ?4
+            """,
+            rescheduled
+        )
+        conn.executemany(
+            """
+            UPDATE audit_outbox
+            SET status = 'pending', next_attempt_at = ?, last_error = ?, attempts = attempts + 1
+            WHERE id = ?
+            """,
+            retry
+        )
+        conn.executemany(
+            """
+            UPDATE audit_outbox
+            SET status = 'failed', last_error = ?, attempts = attempts + 1
+            WHERE id = ?
+            """,
+            failed
+        )
+
+
+def count_audit_events() -> Dict[str, int]:
+    with get_db_connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM audit_outbox GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+# ============================================================================
+# Admin Listings - keyset pagination
+# ============================================================================
+# Pages are ordered newest first on (sort column, unique id) and resumed with
+# an opaque cursor holding the last row's key, so each page is an index range
+# scan of `limit` rows no matter how deep it is.
+
+ADMIN_PAGE_MAX = 1000
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> tuple:
+    """Parse a cursor from encode_cursor(); raises ValueError if it is malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _keyset_query(conn: sqlite3.Connection, select_sql: str, key_columns: tuple, filters: List[str],
+                  params: list, after: Optional[tuple], fetch: int) -> List[Dict]:
+    """Up to `fetch` rows of select_sql (no WHERE/ORDER BY) after key `after`, newest first"""
+    filters = list(filters)
+    params = list(params)
+    if after is not None:
+        filters.append(f"({', '.join(key_columns)}) < ({', '.join('?' * len(key_columns))})")
+        params.extend(after)
+
+    sql = select_sql
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    sql += " ORDER BY " + ", ".join(f"{col} DESC" for col in key_columns) + " LIMIT ?"
+    params.append(fetch)
+    return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def _page_result(rows: List[Dict], key_columns: tuple, limit: int) -> tuple:
+    """Trim the look-ahead row fetched past `limit`; returns (rows, next cursor or None)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(tuple(rows[-1][col] for col in key_columns))
+
+
+def _keyset_page(conn: sqlite3.Connection, select_sql: str, key_columns: tuple, filters: List[str],
+                 params: list, cursor: Optional[str], limit: int):
+    """
+    Run select_sql (no WHERE/ORDER BY) for one page, newest first on key_columns.
+    Returns (rows as dicts, next cursor or None).
+    """
+    limit = max(1, min(limit, ADMIN_PAGE_MAX))
+    after = decode_cursor(cursor, len(key_columns)) if cursor else None
+    rows = _keyset_query(conn, select_sql, key_columns, filters, params, after, limit + 1)
+    return _page_result(rows, key_columns, limit)
+
+
+def _listing_filters(time_column: str, tier: Optional[int], user_id: Optional[str],
+                     since: Optional[str], until: Optional[str]):
+    filters, params = [], []
+    if tier is not None:
+        filters.append("tier = ?")
+        params.append(tier)
+    if user_id is not None:
+        filters.append("user_id = ?")
+        params.append(user_id)
+    if since is not None:
+        filters.append(f"{time_column} >= ?")
+        params.append(since)
+    if until is not None:
+        filters.append(f"{time_column} < ?")
+        params.append(until)
+    return filters, params
+
+
+async def get_all_users(limit: int = 100, cursor: Optional[str] = None, tier: Optional[int] = None,
+                        user_id: Optional[str] = None, since: Optional[str] = None,
+                        until: Optional[str] = None) -> tuple:
+    """
+    One page of users for the admin dashboard, most recently active first.
+    since/until bound last_active_at (ISO-8601 UTC). Returns (users, next_cursor).
+    """
+    return await run_db(_get_all_users, limit, cursor, tier, user_id, since, until)
+
+
+def _get_all_users(limit: int, cursor: Optional[str], tier: Optional[int], user_id: Optional[str],
+                   since: Optional[str], until: Optional[str]) -> tuple:
+    filters, params = _listing_filters("last_active_at", tier, user_id, since, until)
+    with get_db_connection() as conn:
+        return _keyset_page(
+            conn,
+            """
+            SELECT user_id, first_seen_at, last_active_at, dynamic_mean_rpm, total_queries,
+                   COALESCE(tier, 1) AS tier,
+                   CASE WHEN first_seen_at IS NULL THEN 0.0
+                        ELSE MAX(0.0, (julianday(last_active_at) - julianday(first_seen_at)) * 1440.0)
+                   END AS time_active
+            FROM users
+            """,
+            ("last_active_at", "user_id"),
+            filters, params, cursor, limit
+        )
+
+
+async def get_all_logs(limit: int = 100, cursor: Optional[str] = None, tier: Optional[int] = None,
+                       user_id: Optional[str] = None, since: Optional[str] = None,
+                       until: Optional[str] = None) -> tuple:
+    """
+    One page of query logs, newest first; since/until bound the log
+    timestamp (ISO-8601 UTC). Returns (rows, next_cursor).
+    """
+    return await run_db(_get_all_logs, limit, cursor, tier, user_id, since, until)
+
+
+def _get_all_logs(limit: int, cursor: Optional[str], tier: Optional[int], user_id: Optional[str],
+                  since: Optional[str], until: Optional[str]) -> tuple:
+    # Walks hot partitions newest first, reading only as many rows as the page
+    # still needs; partitions outside the cursor/time range are skipped unread
+    limit = max(1, min(limit, ADMIN_PAGE_MAX))
+    key_columns = ("timestamp", "id")
+    after = decode_cursor(cursor, 2) if cursor else None
+    if after is not None and not isinstance(after[0], str):
+        raise ValueError("Invalid cursor")
+    filters, params = _listing_filters("timestamp", tier, user_id, since, until)
+    newest_day = min(
+        (log_partition_day(ts) for ts in (until, after[0] if after else None) if ts),
+        default=None
+    )
+    oldest_day = log_partition_day(since) if since else None
+
+    rows: List[Dict] = []
+    with get_db_connection() as conn:
+        for day in _hot_log_partitions(conn):
+            if newest_day and day > newest_day:
+                continue
+            if oldest_day and day < oldest_day:
+                break
+            rows.extend(_keyset_query(
+                conn,
+                f"""
+                SELECT id, user_id, timestamp, query, tier, hybrid_score, duration_mins, noisy_served
+                FROM {log_partition_table(day)}
+                """,
+                key_columns, filters, params, after, limit + 1 - len(rows)
+            ))
+            if len(rows) > limit:
+                break
+    return _page_result(rows, key_columns, limit)
+
+
+async def get_query_log(log_id: int) -> Optional[Dict]:
+    """
+    Fetch one query log row by id from its hot partition (None if absent or
+    archived; log_archive.get_query_log() also searches archives)
+    """
+    return await run_db(_get_query_log, log_id)
+
+
+def _get_query_log(log_id: int) -> Optional[Dict]:
+    try:
+        day = log_id_day(log_id)
+    except (ValueError, OverflowError):
+        return None
+    if day not in _log_partitions:
+        return None
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM query_logs ORDER BY timestamp DESC LIMIT 1000")
-        rows = cursor.fetchall()
-        
-        return [dict(row) for row in rows]
+        cursor.execute(f"SELECT * FROM {log_partition_table(day)} WHERE id = ?", (log_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        texts = _load_response_blobs(conn, {row["clean_response_hash"], row["served_response_hash"]})
+        return _with_responses(row, texts)
+
+
+async def get_all_audit_records(limit: int = 100, cursor: Optional[str] = None,
+                                user_id: Optional[str] = None, since: Optional[str] = None,
+                                until: Optional[str] = None) -> tuple:
+    """
+    One page of blockchain audit events (pending, submitted, confirmed or
+    failed), newest first. Returns (rows, next_cursor).
+    """
+    return await run_db(_get_all_audit_records, limit, cursor, user_id, since, until)
 
 
-async def get_all_audit_records() -> list:
-    """Fetch all blockchain audit records"""
+def _get_all_audit_records(limit: int, cursor: Optional[str], user_id: Optional[str],
+                           since: Optional[str], until: Optional[str]) -> tuple:
+    # Untimed pages walk by id (assigned in enqueue order); since/until pages
+    # walk (timestamp, id) so the range is read off idx_audit_outbox_timestamp
+    filters, params = _listing_filters("timestamp", None, user_id, since, until)
+    key_columns = ("timestamp", "id") if since is not None or until is not None else ("id",)
+    with get_db_connection() as conn:
+        return _keyset_page(
+            conn,
+            """
+            SELECT id, user_id, timestamp, 3 AS tier, tx_hash,
+                   CASE status WHEN 'sent' THEN 'confirmed' ELSE status END AS status,
+                   event_type, event_count
+            FROM audit_outbox
+            """,
+            key_columns, filters, params, cursor, limit
+        )
+
+
+async def get_tier_counts() -> Dict:
+    """Total users and users per tier (a full scan; tier_counters keeps these live)"""
+    return await run_db(_get_tier_counts)
+
+
+def _get_tier_counts() -> Dict:
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT user_id, timestamp, tier, '' as tx_hash, 'confirmed' as status
-            FROM query_logs 
-            WHERE tier = 3 
-            ORDER BY timestamp DESC 
-            LIMIT 100
-        """)
-        rows = cursor.fetchall()
-        
-        return [dict(row) for row in rows]
\ No newline at end of file
+        # Rows from before the tier column default count as Tier 1
+        cursor.execute("SELECT COALESCE(tier, 1), COUNT(*) FROM users GROUP BY 1")
+        counts = {tier: count for tier, count in cursor.fetchall()}
+        return {
+            "total": sum(counts.values()),
+            "by_tier": counts
+        }
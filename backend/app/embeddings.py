@@ -0,0 +1,269 @@
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from scoring import SimpleEmbedder, normalize_prompt
+
+
+# "hash" (default, no downloads) or "onnx-minilm"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hash")
+EMBEDDING_ONNX_MODEL = os.getenv("EMBEDDING_ONNX_MODEL", "models/all-MiniLM-L6-v2/model.onnx")
+EMBEDDING_TOKENIZER = os.getenv("EMBEDDING_TOKENIZER", "models/all-MiniLM-L6-v2/tokenizer.json")
+EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", "128"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "2"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "3"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+EMBEDDING_RESULT_CACHE_SIZE = int(os.getenv("EMBEDDING_RESULT_CACHE_SIZE", "4096"))
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+class OnnxEmbedder:
+    """
+    Sentence embeddings from a MiniLM-style transformer exported to ONNX
+    (fp32 or int8-quantized: point EMBEDDING_ONNX_MODEL at either file).
+    Mean-pooled over the attention mask and L2-normalized.
+
+    Requires the optional `onnxruntime` and `tokenizers` packages.
+    """
+
+    name = "onnx-minilm"
+    # Too slow to run on the event loop; goes through the micro-batcher
+    inline = False
+
+    def __init__(self, model_path: str = EMBEDDING_ONNX_MODEL, tokenizer_path: str = EMBEDDING_TOKENIZER):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=onnx-minilm requires `pip install onnxruntime tokenizers`"
+            ) from e
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = EMBEDDING_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=EMBEDDING_MAX_TOKENS)
+        self.tokenizer.enable_padding()
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([normalize_prompt(t) for t in texts])
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, feed)[0]  # (batch, tokens, hidden)
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(self, text, convert_to_numpy=True):
+        return self.encode_batch([text])[0]
+
+
+EMBEDDER_REGISTRY: Dict[str, Callable[[], object]] = {
+    "hash": SimpleEmbedder,
+    "onnx-minilm": OnnxEmbedder,
+}
+
+
+def register_embedder(name: str, factory: Callable[[], object]):
+    """Register an additional embedder selectable via EMBEDDING_BACKEND"""
+    EMBEDDER_REGISTRY[name] = factory
+
+
+# ============================================================================
+# Micro-batching over a worker thread pool
+# ============================================================================
+
+class MicroBatcher:
+    """
+    Collects concurrent encode() calls for up to EMBEDDING_BATCH_WINDOW_MS
+    (or EMBEDDING_MAX_BATCH prompts) and runs them as one encode_batch() on
+    the worker pool, so concurrent requests share a forward pass.
+    """
+
+    def __init__(self, embedder, executor: ThreadPoolExecutor,
+                 window_ms: float = EMBEDDING_BATCH_WINDOW_MS, max_batch: int = EMBEDDING_MAX_BATCH):
+        self.embedder = embedder
+        self.executor = executor
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.batched_items = 0
+
+    async def encode(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.batched_items += len(batch)
+
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self.executor, self.embedder.encode_batch, [text for text, _ in batch])
+
+        def deliver(done: asyncio.Future):
+            error = done.exception()
+            for i, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(done.result()[i])
+
+        work.add_done_callback(deliver)
+
+
+# ============================================================================
+# Public API
+# ============================================================================
+
+_embedder = None
+_batcher: Optional[MicroBatcher] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_load_lock: Optional[asyncio.Lock] = None
+_load_task: Optional[asyncio.Task] = None
+_load_error: Optional[str] = None
+# Serves prompts until the configured backend is loaded
+_fallback: Optional[SimpleEmbedder] = None
+_result_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_cache_hits = 0
+_cache_misses = 0
+
+
+def _create_embedder():
+    if EMBEDDING_BACKEND not in EMBEDDER_REGISTRY:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}' (known: {', '.join(EMBEDDER_REGISTRY)})")
+    embedder = EMBEDDER_REGISTRY[EMBEDDING_BACKEND]()
+    print(f"✅ Embedding backend loaded: {EMBEDDING_BACKEND}")
+    return embedder
+
+
+def _fallback_embedder() -> SimpleEmbedder:
+    global _fallback
+    if _fallback is None:
+        _fallback = SimpleEmbedder()
+    return _fallback
+
+
+async def load_embedder():
+    """
+    Load the configured embedder once, on the worker pool (model loads can
+    take seconds); called by the startup warmup. If the load fails, the
+    hash embedder is used from then on: the error is logged, kept for
+    /metrics and raised to this caller only, and the load isn't retried.
+    """
+    global _embedder, _batcher, _executor, _load_lock, _load_error
+    if _embedder is not None:
+        return _embedder
+    if _load_lock is None:
+        _load_lock = asyncio.Lock()
+    async with _load_lock:
+        if _embedder is None:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS, thread_name_prefix="embed")
+            try:
+                embedder = await asyncio.get_running_loop().run_in_executor(_executor, _create_embedder)
+            except Exception as e:
+                _load_error = str(e)
+                _embedder = _fallback_embedder()
+                print(f"❌ Embedding backend '{EMBEDDING_BACKEND}' failed to load, using 'hash' instead: {e}")
+                raise
+            if not getattr(embedder, "inline", False):
+                _batcher = MicroBatcher(embedder, _executor)
+            _embedder = embedder
+    return _embedder
+
+
+async def _load_in_background():
+    try:
+        await load_embedder()
+    except Exception:
+        pass  # already logged; the fallback is in place
+
+
+async def embed_prompt(text: str) -> np.ndarray:
+    """
+    Embed one prompt with the configured backend (read-only float32 vector).
+    Never waits for a model load: until the backend is ready (warmup still
+    running, or WARMUP_EMBEDDER=0) prompts are embedded by the hash embedder.
+    """
+    global _cache_hits, _cache_misses, _load_task
+    embedder = _embedder
+    if embedder is None:
+        if _load_task is None and _load_lock is None:
+            _load_task = asyncio.create_task(_load_in_background())
+        embedder = _fallback_embedder()
+    if _batcher is None or embedder is not _embedder:
+        return embedder.encode(text, convert_to_numpy=True)
+
+    key = normalize_prompt(text)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        _cache_hits += 1
+        _result_cache.move_to_end(key)
+        return cached
+
+    _cache_misses += 1
+    embedding = await _batcher.encode(text)
+    embedding.flags.writeable = False
+    _result_cache[key] = embedding
+    if len(_result_cache) > EMBEDDING_RESULT_CACHE_SIZE:
+        _result_cache.popitem(last=False)
+    return embedding
+
+
+def embedding_metrics() -> Dict:
+    if _embedder is None:
+        return {"backend": EMBEDDING_BACKEND, "loaded": False}
+    if _load_error is not None:
+        return {"backend": "hash", "loaded": False, "error": _load_error, "cache": _embedder.cache_info()}
+    if _batcher is None:
+        return {"backend": EMBEDDING_BACKEND, "loaded": True, "cache": _embedder.cache_info()}
+    return {
+        "backend": EMBEDDING_BACKEND,
+        "loaded": True,
+        "cache": {"hits": _cache_hits, "misses": _cache_misses, "size": len(_result_cache)},
+        "batches": _batcher.batches,
+        "avg_batch_size": round(_batcher.batched_items / _batcher.batches, 2) if _batcher.batches else 0.0
+    }
+
+
+def close_embedder():
+    global _embedder, _batcher, _executor, _load_lock, _load_task, _load_error
+    if _load_task is not None:
+        _load_task.cancel()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _embedder = _batcher = _executor = _load_lock = _load_task = _load_error = None
@@ -0,0 +1,132 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Set, Tuple
+
+
+# Events buffered per dashboard connection before the oldest are dropped
+LIVE_BUFFER_MAX = int(os.getenv("LIVE_BUFFER_MAX", "500"))
+LIVE_HEARTBEAT_S = float(os.getenv("LIVE_HEARTBEAT_S", "15"))
+
+# "stats" (tier counters), "session" (one user's row), "log" (new query log),
+# "audit" (audit event queued / confirmed / failed)
+LIVE_TOPICS = ("stats", "session", "log", "audit")
+
+
+class Subscription:
+    """
+    One dashboard connection's bounded, coalescing event buffer.
+
+    Events are keyed by (topic, key): a newer event for a key that is still
+    buffered replaces the older one (a session or the stats update twice,
+    the client only needs the latest), so a slow client receives the latest
+    state rather than every intermediate step. Beyond max_events the oldest
+    events are dropped and the next batch starts with a "resync" event
+    telling the client to reload from the REST endpoints.
+    """
+
+    def __init__(self, topics: Set[str], max_events: int = LIVE_BUFFER_MAX):
+        self.topics = topics
+        self.max_events = max_events
+        self._events: "OrderedDict[Tuple[str, Hashable], Dict]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._lagged = False
+        self.closed = False
+        self.coalesced = 0
+        self.dropped = 0
+
+    def put(self, topic: str, key: Hashable, data: Dict):
+        slot = (topic, key)
+        if slot in self._events:
+            del self._events[slot]
+            self.coalesced += 1
+        self._events[slot] = data
+        while len(self._events) > self.max_events:
+            self._events.popitem(last=False)
+            self.dropped += 1
+            self._lagged = True
+        self._wakeup.set()
+
+    async def next_batch(self, timeout: float) -> List[Tuple[str, Dict]]:
+        """Wait up to timeout for events; returns [(topic, data), ...] oldest first ([] on timeout)"""
+        if not self._events and not self.closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._wakeup.clear()
+
+        batch = [(topic, data) for (topic, _), data in self._events.items()]
+        self._events.clear()
+        if self._lagged:
+            self._lagged = False
+            batch.insert(0, ("resync", {"dropped": self.dropped}))
+        return batch
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+
+class LiveFeed:
+    """
+    In-process pub/sub behind /api/live.
+
+    The request pipeline, query-log writer and audit outbox publish events
+    built from data they already hold; each open dashboard gets its own
+    Subscription. Publishing never awaits and never touches SQLite, so
+    the number of open dashboards doesn't affect request latency or DB load.
+    """
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self.published = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscriptions)
+
+    def subscribe(self, topics=LIVE_TOPICS) -> Subscription:
+        subscription = Subscription(set(topics))
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+        subscription.close()
+
+    def publish(self, topic: str, key: Hashable, data: Dict):
+        self.published += 1
+        for subscription in self._subscriptions:
+            if topic in subscription.topics:
+                subscription.put(topic, key, data)
+
+    def on_query_log(self, row: tuple, embedding=None):
+        """QueryLogWriter subscriber: publish the row as the /api/logs listing shows it"""
+        if not self._subscriptions:
+            return
+        user_id, timestamp, query, clean_response, served_response, tier = row[:6]
+        request_id = row[8] if len(row) > 8 else None
+        self.publish("log", request_id or (user_id, timestamp), {
+            "timestamp": timestamp,
+            "userId": user_id,
+            "prompt": query,
+            "tier": tier,
+            "noisy_answer_served": clean_response != served_response
+        })
+
+    def close(self):
+        """Release every open stream (server shutdown)"""
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+
+    def metrics(self) -> Dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "coalesced": sum(s.coalesced for s in self._subscriptions),
+            "dropped": sum(s.dropped for s in self._subscriptions)
+        }
+
+
+live_feed = LiveFeed()
@@ -0,0 +1,256 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import (
+    drop_log_partition,
+    get_log_partition,
+    get_query_log as get_hot_query_log,
+    list_log_partitions,
+    log_id_day,
+    read_log_partition,
+    run_db
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Days kept as live SQLite partitions (today included)
+LOG_HOT_DAYS = max(1, int(os.getenv("LOG_HOT_DAYS", "7")))
+# Days kept at all; older partitions and archives are deleted
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "log_archive")
+# "zstd" (needs `pip install zstandard`) or "gzip"
+LOG_ARCHIVE_CODEC = os.getenv("LOG_ARCHIVE_CODEC", "zstd" if zstandard is not None else "gzip")
+LOG_ARCHIVE_ROW_GROUP = int(os.getenv("LOG_ARCHIVE_ROW_GROUP", "10000"))
+LOG_MAINTENANCE_INTERVAL_S = float(os.getenv("LOG_MAINTENANCE_INTERVAL_S", "3600"))
+
+ARCHIVE_FORMAT = "mirage-query-logs"
+ARCHIVE_VERSION = 1
+
+
+# ============================================================================
+# Archive files
+# ============================================================================
+# A compressed JSON-lines stream: one header line, then one line per row
+# group holding the group's columns as arrays ({"columns", "min_id",
+# "max_id", "data": [[...column 0...], [...column 1...], ...]}). Storing
+# columns together compresses far better than rows of mixed text.
+
+def _open_archive(path: str, mode: str):
+    """Text stream over a .zst or .gz archive; mode is "r" or "w" """
+    if path.endswith(".zst") or path.endswith(".zst.tmp"):
+        if zstandard is None:
+            raise RuntimeError("zstd log archives require `pip install zstandard`")
+        if mode == "w":
+            raw = zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"))
+        else:
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return gzip.open(path, mode + "t", encoding="utf-8")
+
+
+def iter_archive(path: str) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """Yield (columns, rows) per row group of an archive file"""
+    with _open_archive(path, "r") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"{path} is not a query log archive")
+        for line in f:
+            group = json.loads(line)
+            yield group["columns"], list(zip(*group["data"]))
+
+
+def find_archived_log(path: str, log_id: int) -> Optional[Dict]:
+    """Look up one row by id, decoding only the row group that holds it"""
+    with _open_archive(path, "r") as f:
+        f.readline()
+        for line in f:
+            # min_id/max_id lead each line, so groups are skipped without parsing the data
+            head = json.loads(line[:line.index(',"data"')] + "}")
+            if not head["min_id"] <= log_id <= head["max_id"]:
+                continue
+            group = json.loads(line)
+            ids = group["data"][group["columns"].index("id")]
+            if log_id in ids:
+                i = ids.index(log_id)
+                return {col: values[i] for col, values in zip(group["columns"], group["data"])}
+    return None
+
+
+def _write_group(f, columns: List[str], rows: List[tuple]) -> int:
+    id_index = columns.index("id")
+    ids = [row[id_index] for row in rows]
+    group = {"columns": columns, "min_id": min(ids), "max_id": max(ids), "data": [list(c) for c in zip(*rows)]}
+    f.write(json.dumps(group, separators=(",", ":")) + "\n")
+    return len(rows)
+
+
+def _remove_archives(day: str, keep: Optional[str] = None):
+    """Delete the day's files in LOG_ARCHIVE_DIR other than `keep` (superseded or orphaned versions)"""
+    if not os.path.isdir(LOG_ARCHIVE_DIR):
+        return
+    keep = os.path.abspath(keep) if keep else None
+    for name in os.listdir(LOG_ARCHIVE_DIR):
+        path = os.path.join(LOG_ARCHIVE_DIR, name)
+        if name.startswith(f"query_logs_{day}.") and os.path.abspath(path) != keep:
+            os.remove(path)
+
+
+def archive_partition(day: str, previous_path: Optional[str] = None) -> Tuple[str, int, int]:
+    """
+    Blocking: compress a day's partition into a new version of the day's
+    archive in LOG_ARCHIVE_DIR, merged after the previous archive if there
+    is one. The previous file is left alone: it stays the day's archive
+    until drop_log_partition() records the new path, so a failed or
+    interrupted drop can't leave the partition's rows merged in twice.
+    Returns (path, rows in the archive, rows read from the partition).
+    """
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    # Versions written by runs that never got to switch archive_path
+    _remove_archives(day, keep=previous_path)
+    suffix = ".zst" if LOG_ARCHIVE_CODEC == "zstd" else ".gz"
+    version = 1
+    while True:
+        path = os.path.join(LOG_ARCHIVE_DIR, f"query_logs_{day}.v{version}.jsonl{suffix}")
+        if not os.path.exists(path):
+            break
+        version += 1
+    tmp_path = path + ".tmp"
+
+    total = partition_rows = 0
+    with _open_archive(tmp_path, "w") as f:
+        f.write(json.dumps({"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "day": day}) + "\n")
+        if previous_path and os.path.exists(previous_path):
+            for columns, rows in iter_archive(previous_path):
+                total += _write_group(f, columns, rows)
+        for columns, rows in read_log_partition(day, LOG_ARCHIVE_ROW_GROUP):
+            count = _write_group(f, columns, rows)
+            total += count
+            partition_rows += count
+    os.replace(tmp_path, path)
+    return path, total, partition_rows
+
+
+# ============================================================================
+# Retention / compaction
+# ============================================================================
+
+class LogArchiver:
+    """
+    Periodic query-log maintenance. Hot partitions older than LOG_HOT_DAYS
+    are compressed into an archive file and their table dropped; partitions
+    and archives older than LOG_RETENTION_DAYS are deleted outright. Nothing
+    is ever DELETEd row by row.
+    """
+
+    def __init__(self, interval_s: float = LOG_MAINTENANCE_INTERVAL_S):
+        self.interval_s = interval_s
+        self._task: Optional[asyncio.Task] = None
+        self.archived = 0
+        self.expired = 0
+        self.last_run_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Query log maintenance failed: {e}")
+            await asyncio.sleep(self.interval_s)
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """Blocking: archive and expire partitions as of `now` (default: current UTC time)"""
+        today = (now or datetime.now(timezone.utc)).date()
+        hot_cutoff = (today - timedelta(days=LOG_HOT_DAYS - 1)).strftime("%Y%m%d")
+        retention_cutoff = (today - timedelta(days=LOG_RETENTION_DAYS - 1)).strftime("%Y%m%d")
+
+        archived, expired = [], []
+        for partition in list_log_partitions():
+            day = partition["day"]
+            if day < retention_cutoff:
+                if partition["archive_path"] and os.path.exists(partition["archive_path"]):
+                    os.remove(partition["archive_path"])
+                drop_log_partition(day)
+                _remove_archives(day)
+                expired.append(day)
+            elif partition["status"] == "hot" and day < hot_cutoff:
+                previous_path = partition["archive_path"]
+                path, total, partition_rows = archive_partition(day, previous_path)
+                if drop_log_partition(day, path, total, expected_rows=partition_rows):
+                    # The new version is now the day's archive; the one it merged is superseded
+                    _remove_archives(day, keep=path)
+                    archived.append(day)
+                else:
+                    _remove_archives(day, keep=previous_path)
+                    print(f"⚠️ Query log partition {day} changed while archiving, retrying next run")
+
+        self.archived += len(archived)
+        self.expired += len(expired)
+        self.last_run_at = datetime.now(timezone.utc).isoformat()
+        self.last_error = None
+        if archived or expired:
+            print(f"🗄️  Query logs: archived {archived or 'none'}, expired {expired or 'none'}")
+        return {"archived": archived, "expired": expired}
+
+    def metrics(self) -> Dict:
+        return {
+            "hot_days": LOG_HOT_DAYS,
+            "retention_days": LOG_RETENTION_DAYS,
+            "codec": LOG_ARCHIVE_CODEC,
+            "archived_partitions": self.archived,
+            "expired_partitions": self.expired,
+            "last_run_at": self.last_run_at,
+            "last_error": self.last_error
+        }
+
+
+log_archiver = LogArchiver()
+
+
+async def get_query_log(log_id: int) -> Optional[Dict]:
+    """Fetch one query log row by id, from its hot partition or its day's archive"""
+    row = await get_hot_query_log(log_id)
+    if row is not None:
+        return row
+    try:
+        day = log_id_day(log_id)
+    except (ValueError, OverflowError):
+        return None
+    partition = await run_db(get_log_partition, day)
+    if partition is None or not partition["archive_path"]:
+        return None
+    return await asyncio.to_thread(find_archived_log, partition["archive_path"], log_id)
+
+
+if __name__ == "__main__":
+    # Forensics: dump an archived day as JSON lines, optionally for one user
+    #   python log_archive.py log_archive/query_logs_20260101.jsonl.zst [user_id]
+    user_filter = sys.argv[2] if len(sys.argv) > 2 else None
+    for columns, rows in iter_archive(sys.argv[1]):
+        for row in rows:
+            record = dict(zip(columns, row))
+            if user_filter is None or record["user_id"] == user_filter:
+                print(json.dumps(record))
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import shutil
+from typing import Callable, List, Optional
+
+from database import QUERY_LOG_ROW_LEN, insert_query_logs, query_log_row, run_db
+
+
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL_S = float(os.getenv("LOG_FLUSH_INTERVAL_S", "0.5"))
+# What to do when the queue is full: "block", "drop_oldest" or "spill"
+LOG_BACKPRESSURE = os.getenv("LOG_BACKPRESSURE", "block")
+LOG_SPILL_PATH = os.getenv("LOG_SPILL_PATH", "query_log_spill.jsonl")
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class QueryLogWriter:
+    """
+    Background pipeline for query_logs.
+
+    Requests push rows onto a bounded queue; one writer task drains it and
+    inserts up to LOG_BATCH_SIZE rows per transaction, at least every
+    LOG_FLUSH_INTERVAL_S. When the queue is full the LOG_BACKPRESSURE policy
+    applies: "block" waits for room, "drop_oldest" discards the oldest queued
+    row, "spill" appends the row to LOG_SPILL_PATH, which is replayed into
+    SQLite once the queue has drained.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = LOG_QUEUE_MAX,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval_s: float = LOG_FLUSH_INTERVAL_S,
+        backpressure: str = LOG_BACKPRESSURE,
+        spill_path: str = LOG_SPILL_PATH
+    ):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"LOG_BACKPRESSURE must be one of {BACKPRESSURE_POLICIES}, got '{backpressure}'")
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.backpressure = backpressure
+        self.spill_path = spill_path
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._subscribers: List[Callable] = []
+
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def subscribe(self, callback: Callable):
+        """
+        Tap the log stream: callback(row, embedding) runs for every logged
+        query, on the event loop, before the row is queued. Callbacks must
+        not block; stream consumers should enqueue and return.
+        """
+        self._subscribers.append(callback)
+
+    async def log(
+        self,
+        user_id: str,
+        query: str,
+        clean_response: str,
+        served_response: str,
+        tier: int,
+        hybrid_score: float,
+        duration_mins: float,
+        embedding=None,
+        request_id: Optional[str] = None,
+        noise_seed: Optional[int] = None,
+        noise_pipeline: Optional[str] = None
+    ):
+        """
+        Queue one query log row; same arguments as database.query_log_row.
+        The prompt embedding is only passed to stream subscribers, not stored.
+        """
+        row = query_log_row(
+            user_id, query, clean_response, served_response,
+            tier, hybrid_score, duration_mins,
+            request_id=request_id, noise_seed=noise_seed, noise_pipeline=noise_pipeline
+        )
+        for callback in self._subscribers:
+            try:
+                callback(row, embedding)
+            except Exception as e:
+                print(f"❌ Query log subscriber failed: {e}")
+        await self.submit(row)
+
+    async def submit(self, row: tuple):
+        if self._stopping:
+            # Writer is draining for shutdown; write straight through
+            await run_db(insert_query_logs, [row])
+            return
+
+        try:
+            self._queue.put_nowait(row)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.backpressure == "block":
+            await self._queue.put(row)
+        elif self.backpressure == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+            self._queue.put_nowait(row)
+        else:
+            await asyncio.to_thread(self._spill, [row])
+
+    # ------------------------------------------------------------------
+    # Writer side
+    # ------------------------------------------------------------------
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Drain everything queued (and spilled) before returning"""
+        self._stopping = True
+        if self._task is None:
+            return
+        if not self._task.done():
+            # The sentinel may have to wait for room; stop waiting if the writer dies meanwhile
+            sentinel = asyncio.ensure_future(self._queue.put(None))
+            await asyncio.wait({sentinel, self._task}, return_when=asyncio.FIRST_COMPLETED)
+            sentinel.cancel()
+        try:
+            await self._task
+        except Exception as e:
+            print(f"❌ Query log writer task failed: {e}")
+        self._task = None
+
+        # Rows a dead writer left queued
+        leftover = self._drain_queue()
+        if leftover:
+            await self._write(leftover)
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = []
+        first = await self._queue.get()
+        if first is None:
+            return batch
+        batch.append(first)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval_s
+        while len(batch) < self.batch_size:
+            try:
+                row = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            if row is None:
+                # Shutdown sentinel: write what we have, then let _run exit
+                self._queue.put_nowait(None)
+                break
+            batch.append(row)
+        return batch
+
+    async def _run(self):
+        # Rows spilled (or left mid-replay) by a previous process
+        await self._replay_spill()
+        while True:
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+            if self._queue.empty():
+                await self._replay_spill()
+            if not batch and self._stopping:
+                break
+
+        # Producers that were blocked on a full queue may have landed after the sentinel
+        leftover = self._drain_queue()
+        if leftover:
+            await self._write(leftover)
+
+    def _drain_queue(self) -> List[tuple]:
+        rows = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    async def _write(self, batch: List[tuple]):
+        try:
+            await run_db(insert_query_logs, batch)
+            self.written += len(batch)
+        except Exception as e:
+            # Never lose forensic rows: park them on disk for replay
+            print(f"❌ Query log batch failed ({len(batch)} rows), spilling to disk: {e}")
+            await asyncio.to_thread(self._spill, batch)
+
+    def _spill(self, rows: List[tuple]):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        self.spilled += len(rows)
+
+    async def _replay_spill(self):
+        replay_path = self.spill_path + ".replay"
+        if not os.path.exists(self.spill_path) and not os.path.exists(replay_path):
+            return
+
+        def load() -> List[tuple]:
+            # Move the spill aside first so new spills go to a fresh file while we
+            # replay. A replay file left by a process that died mid-replay still
+            # holds unwritten rows: append to it rather than replacing it.
+            if os.path.exists(self.spill_path):
+                if os.path.exists(replay_path):
+                    with open(self.spill_path, encoding="utf-8") as src, open(replay_path, "a", encoding="utf-8") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, replay_path)
+            with open(replay_path, encoding="utf-8") as f:
+                rows = [tuple(json.loads(line)) for line in f if line.strip()]
+            # Rows spilled by older versions lack the newer trailing columns
+            return [row + (None,) * (QUERY_LOG_ROW_LEN - len(row)) for row in rows]
+
+        rows = await asyncio.to_thread(load)
+        for i in range(0, len(rows), self.batch_size):
+            batch = rows[i:i + self.batch_size]
+            try:
+                await run_db(insert_query_logs, batch)
+            except Exception as e:
+                print(f"❌ Spill replay failed, will retry: {e}")
+                # Re-append only the unwritten rows to whatever accumulated meanwhile
+                await asyncio.to_thread(self._spill, rows[i:])
+                break
+            self.written += len(batch)
+        else:
+            print(f"✅ Replayed {len(rows)} spilled query log rows")
+
+        # Every row is now in SQLite or back in the spill file. A replay file
+        # that can't be removed is replayed again (rows may repeat, none are lost).
+        try:
+            await asyncio.to_thread(os.remove, replay_path)
+        except OSError as e:
+            print(f"⚠️ Could not remove {replay_path}: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "backpressure": self.backpressure
+        }
+
+
+query_log_writer = QueryLogWriter()
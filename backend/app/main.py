@@ -1,5 +1,10 @@
-from fastapi import FastAPI, Header, Body, HTTPException
+from warmup import warmup
+import asyncio
+import json
+import uuid
+from fastapi import FastAPI, Header, Body, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timezone
@@ -9,12 +14,36 @@ from scoring import (
     calculate_d_score, 
     calculate_hybrid_score,
     calculate_rpm_from_timestamps,
-    embedding_model
+    EmbeddingWindow
 )
-from security import get_clean_response, get_noisy_response
-from database import get_user_state, update_user_state, log_query, init_database, get_db_connection
+from ann_index import probe_index
+from campaign_detector import campaign_detector
+from embeddings import embed_prompt, embedding_metrics, close_embedder
+from synonyms import synonym_index
+from security import SentenceStreamNoiser, NoiseModelUnavailable, reproduce_perturbation
+from noise_pool import noise_pool, derive_seed
+from response_cache import response_cache, get_cached_clean_response, stream_cached_clean_response
+from database import (
+    init_database,
+    run_db,
+    get_all_users,
+    get_all_logs,
+    list_log_partitions,
+    get_all_audit_records,
+    ADMIN_PAGE_MAX,
+    get_pool_metrics,
+    close_db_pool
+)
+from log_writer import query_log_writer
+from log_archive import log_archiver, get_query_log
+from state_store import user_store
+from user_locks import user_locks
+from tier_counters import tier_counters
+from live_feed import live_feed, LIVE_TOPICS, LIVE_HEARTBEAT_S
 from time_manager import calculate_duration
-from audit_bridge import trigger_blockchain_audit
+from audit_policy import audit_policy
+from audit_bridge import audit_outbox, trigger_blockchain_audit
+from upstream import close_upstream
 
 
 app = FastAPI(title="MIRAGE Security System", version="2.0")
@@ -24,8 +53,42 @@ app = FastAPI(title="MIRAGE Security System", version="2.0")
 @app.on_event("startup")
 async def startup_event():
     """Initialize SQLite database schema"""
-    init_database()
+    await run_db(init_database)
     print("✅ Database initialized")
+    await tier_counters.reconcile()
+    user_store.start()
+    query_log_writer.start()
+    audit_outbox.start()
+    log_archiver.start()
+    query_log_writer.subscribe(live_feed.on_query_log)
+    if campaign_detector is not None:
+        query_log_writer.subscribe(campaign_detector.on_query_log)
+        campaign_detector.start()
+    # NLTK, upstream client and embedder load in the background; see /ready
+    warmup.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain background writers and release pooled connections"""
+    await warmup.stop()
+    live_feed.close()
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+    if campaign_detector is not None:
+        await campaign_detector.stop()
+    await query_log_writer.stop()
+    await audit_outbox.stop()
+    await log_archiver.stop()
+    await user_store.stop()
+    await close_upstream()
+    noise_pool.close()
+    try:
+        await asyncio.to_thread(response_cache.save)
+    except Exception as e:
+        print(f"❌ Could not save response cache: {e}")
+    close_embedder()
+    close_db_pool()
 
 
 # CORS for frontend
@@ -35,6 +98,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Request-ID"],
 )
 
 
@@ -77,46 +141,60 @@ class BlockchainEvent(BaseModel):
     tier: int
     txHash: Optional[str]
     status: str
+    eventType: str
+    eventCount: int
 
 
 # ============================================================================
-# MAIN CHAT ENDPOINT - 3-Tier Time-Stateful Defense
+# Request Pipeline - shared by /api/chat and /api/chat/stream
 # ============================================================================
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def handle_query(
-    request: ChatRequest = Body(...),
-    user_id: str = Header(..., alias="X-User-ID")
-):
+async def assess_request(user_id: str, prompt: str, request_id: Optional[str] = None) -> dict:
     """
-    Main chat endpoint with 3-Tier Time-Stateful Defense.
+    Steps 1-6: score the request, pick its tier, queue any blockchain audit
+    event and commit the query to the user's state. Returns the request context consumed by finalize_request(),
+    including the request's noise seed.
     
-    Tier 1 (0-2 min): Clean responses, normal user
-    Tier 2 (2-10 min): Noisy responses, suspicious activity
-    Tier 3 (10+ min): Noisy + blockchain logging, malicious actor
+    The state read-modify-write runs under a per-user lock, so parallel
+    requests from one X-User-ID are counted one by one (each sees the
+    others' timestamps in its RPM) while other users stay concurrent. The
+    lock is released before the upstream call.
     """
-    try:
-        # ✅ Step 1: Fetch existing user state or create new
-        user_state = await get_user_state(user_id)
+    request_id = request_id or uuid.uuid4().hex
+    # Embedding doesn't depend on user state: compute it outside the lock
+    current_embedding = await embed_prompt(prompt)
+    
+    async with user_locks.hold(user_id):
+        # ✅ Step 1: Fetch existing user state or create new (served from RAM when hot)
+        user_state = await user_store.get(user_id)
         now = datetime.now(timezone.utc)
+        # Fixed-capacity ring buffer: O(1) append, oldest timestamp dropped when full
         user_state["query_timestamps"].append(now)
         
-        # Keep only last 50 timestamps for memory efficiency
-        if len(user_state["query_timestamps"]) > 50:
-            user_state["query_timestamps"] = user_state["query_timestamps"][-50:]
-        
         # ✅ Step 2: Calculate threat scores
         rpm = calculate_rpm_from_timestamps(user_state["query_timestamps"])
         v_score = calculate_v_score(rpm)
-        d_score = calculate_d_score(request.prompt, user_state.get("last_query_embedding"))
+        window = user_state.get("embedding_window")
+        d_score = calculate_d_score(current_embedding, window)
+        if probe_index is not None:
+            # Same probe recently sent from several other X-User-IDs
+            d_score = max(d_score, probe_index.cross_user_score(user_id, current_embedding))
+            probe_index.add(user_id, current_embedding)
         hybrid_score = calculate_hybrid_score(v_score, d_score, w1=0.4, w2=0.6)
         
         print(f"📊 User {user_id} | RPM: {rpm:.2f} | V-Score: {v_score:.3f} | D-Score: {d_score:.3f} | Hybrid: {hybrid_score:.3f}")
         
+        # Cross-user campaign score, published by the background detector (O(1) lookup).
+        # Blended as a max: it can escalate a user, never lower their score.
+        if campaign_detector is not None:
+            campaign_score = campaign_detector.score_for(user_id)
+            if campaign_score > hybrid_score:
+                print(f"🕸️  User {user_id} is part of a probe campaign (Campaign score: {campaign_score:.3f})")
+                hybrid_score = campaign_score
+        
         # ✅ Step 3: Start tracking if suspicious
         if hybrid_score > 0.65 and user_state["first_seen_at"] is None:
-            user_state["first_seen_at"] = now
-            await update_user_state(user_id, {"first_seen_at": now})
+            user_store.update(user_state, {"first_seen_at": now})
             print(f"🚨 Starting tracking for user {user_id}")
         
         # ✅ Step 4: Calculate duration
@@ -136,65 +214,146 @@ async def handle_query(
             tier = 1
             print(f"✅ TIER 1: Normal user (Score: {hybrid_score:.3f})")
         
-        # ✅ Step 6: Generate response (CRITICAL FIX)
-        clean_response = ""
-        served_response = ""
+        # ✅ Step 5b: Audit policy - one on-chain event per Tier 3 episode plus periodic summaries
+        audit_event, audit_updates = audit_policy.observe(user_state, tier, hybrid_score, duration_mins, now)
+        if audit_event is not None:
+            # Queued here, in the critical section that commits the episode state, so a
+            # failing upstream call can't lose it; the outbox writes the confirmed tx
+            # hash back to the user's state. If the outbox write fails the episode
+            # state is left as it was and the next request emits the event again.
+            event_id = await trigger_blockchain_audit(user_id, audit_event)
+            if event_id is None:
+                audit_updates = {}
+            else:
+                print(f"   ✅ Blockchain audit queued: #{event_id} ({audit_event.event_type}, {audit_event.event_count} request(s))")
         
-        if tier == 1:
-            # Tier 1: User gets clean response
-            response_text = await get_clean_response(request.prompt)
-            clean_response = response_text
-            served_response = response_text
-            print(f"   Serving CLEAN response")
-        else:
-            # Tier 2 & 3: Get clean, then inject noise
-            clean_response = await get_clean_response(request.prompt)
-            clean_text, noisy_text = await get_noisy_response(request.prompt)
-            response_text = noisy_text  # User sees noisy version
-            served_response = noisy_text
-            print(f"   Serving NOISY response (perturbation applied)")
-        
-        # ✅ Step 7: Blockchain audit for Tier 3 only
-        tx_hash = None
-        hash_id = None
-        if tier == 3:
-            audit_result = await trigger_blockchain_audit(user_id, hybrid_score, duration_mins)
-            if audit_result:
-                tx_hash = audit_result.get("tx_hash")
-                hash_id = audit_result.get("hash_id")
-                print(f"   ✅ Blockchain audit logged: {tx_hash}")
-        
-        # ✅ Step 8: Update user state in database
-        current_embedding = embedding_model.encode(request.prompt, convert_to_numpy=True)
-        await update_user_state(
-            user_id,
+        # ✅ Step 6: Commit the query to cached user state (flushed to SQLite in the background)
+        counts_changed = tier_counters.record(user_state["tier"] if user_state["in_tier_counts"] else None, tier)
+        if window is None or window.dim != current_embedding.shape[-1]:
+            window = EmbeddingWindow(current_embedding.shape[-1])
+        window.add(current_embedding)
+        user_store.update(
+            user_state,
             {
                 "last_active_at": now,
                 "last_query_embedding": current_embedding,
+                "embedding_window": window,
+                "query_timestamps": user_state["query_timestamps"],
                 "dynamic_mean_rpm": rpm,
                 "total_queries": user_state["total_queries"] + 1,
                 "tier": tier,
-                "blockchain_tx": tx_hash, 
-                "privacy_hash_id": hash_id
+                "in_tier_counts": True,
+                **audit_updates
             }
         )
+        if live_feed.active:
+            _publish_session(user_state, counts_changed)
+    
+    return {
+        "user_id": user_id,
+        "request_id": request_id,
+        "noise_seed": derive_seed(user_id, request_id),
+        "user_state": user_state,
+        "embedding": current_embedding,
+        "hybrid_score": hybrid_score,
+        "duration_mins": duration_mins,
+        "tier": tier
+    }
+
+
+def _publish_session(user_state: dict, counts_changed: bool):
+    """Push the user's /api/sessions row (and the stats, if a tier count moved) to live dashboards"""
+    first_seen = user_state["first_seen_at"]
+    last_active = user_state["last_active_at"]
+    time_active = max(0.0, (last_active - first_seen).total_seconds() / 60) if first_seen else 0.0
+    live_feed.publish("session", user_state["user_id"], {
+        "userId": user_state["user_id"],
+        "tier": user_state["tier"],
+        "first_seen_at": first_seen.isoformat() if first_seen else None,
+        "last_active_at": last_active.isoformat(),
+        "time_active": round(time_active, 1),
+        "request_count": user_state["total_queries"],
+        "dynamic_mean_rpm": round(user_state["dynamic_mean_rpm"], 2)
+    })
+    if counts_changed:
+        live_feed.publish("stats", None, _dashboard_stats())
+
+
+async def finalize_request(ctx: dict, prompt: str, clean_response: str, served_response: str,
+                           noise_pipeline: Optional[str] = None):
+    """
+    Step 9: query log, once the response is known (the blockchain audit is
+    queued by assess_request). noise_pipeline is None when the clean text
+    was served.
+    """
+    user_id = ctx["user_id"]
+    tier = ctx["tier"]
+    
+    # ✅ Step 9: Queue query log for forensic analysis (written in batches)
+    await query_log_writer.log(
+        user_id=user_id,
+        query=prompt,
+        clean_response=clean_response,
+        served_response=served_response,
+        tier=tier,
+        hybrid_score=ctx["hybrid_score"],
+        duration_mins=ctx["duration_mins"],
+        embedding=ctx["embedding"],
+        request_id=ctx["request_id"],
+        noise_seed=ctx["noise_seed"] if noise_pipeline else None,
+        noise_pipeline=noise_pipeline
+    )
+
+
+# ============================================================================
+# MAIN CHAT ENDPOINT - 3-Tier Time-Stateful Defense
+# ============================================================================
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def handle_query(
+    response: Response,
+    request: ChatRequest = Body(...),
+    user_id: str = Header(..., alias="X-User-ID"),
+    request_id: Optional[str] = Header(None, alias="X-Request-ID")
+):
+    """
+    Main chat endpoint with 3-Tier Time-Stateful Defense.
+    
+    Tier 1 (0-2 min): Clean responses, normal user
+    Tier 2 (2-10 min): Noisy responses, suspicious activity
+    Tier 3 (10+ min): Noisy + blockchain logging, malicious actor
+    
+    The request id (X-Request-ID, generated if absent) is echoed back and
+    logged with the noise seed derived from it.
+    """
+    warmup.mark_request()
+    try:
+        ctx = await assess_request(user_id, request.prompt, request_id)
+        response.headers["X-Request-ID"] = ctx["request_id"]
+        tier = ctx["tier"]
         
-        # ✅ Step 9: Log query for forensic analysis
-        await log_query(
-            user_id=user_id,
-            query=request.prompt,
-            clean_response=clean_response,
-            served_response=served_response,
-            tier=tier,
-            hybrid_score=hybrid_score,
-            duration_mins=duration_mins
-        )
+        # ✅ Step 7: Generate response (single upstream call, or a cached one for RESPONSE_CACHE_TIERS)
+        clean_response, from_cache = await get_cached_clean_response(request.prompt, tier)
+        if from_cache:
+            print(f"   ♻️  Clean response served from cache")
+        
+        noise_pipeline = None
+        if tier == 1:
+            # Tier 1: User gets clean response
+            served_response = clean_response
+            print(f"   Serving CLEAN response")
+        else:
+            # Tier 2 & 3: Inject seeded noise into the same clean completion (worker processes)
+            served_response, noise_pipeline = await noise_pool.perturb(clean_response, ctx["noise_seed"])
+            print(f"   Serving NOISY response (perturbation applied)")
+        
+        await finalize_request(ctx, request.prompt, clean_response, served_response, noise_pipeline)
         
         return ChatResponse(
-            response=response_text,
+            response=served_response,
             tier=tier,
-            duration_mins=round(duration_mins, 2),
-            hybrid_score=round(hybrid_score, 3)
+            duration_mins=round(ctx["duration_mins"], 2),
+            hybrid_score=round(ctx["hybrid_score"], 3)
         )
         
     except Exception as e:
@@ -202,117 +361,213 @@ async def handle_query(
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
 
+# Post-stream finalize tasks, referenced until done and drained on shutdown
+_background_tasks = set()
+
+
+def _finalize_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Error finalizing streamed request: {task.exception()}")
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def handle_query_stream(
+    request: ChatRequest = Body(...),
+    user_id: str = Header(..., alias="X-User-ID"),
+    request_id: Optional[str] = Header(None, alias="X-Request-ID")
+):
+    """
+    Streaming variant of /api/chat as Server-Sent Events.
+    
+    Each `data:` event carries {"delta": text}. Tier 1 passes upstream chunks
+    straight through; Tier 2/3 output is noised sentence by sentence as it
+    arrives, on the noise worker pool. A final `done` event carries tier, duration_mins and
+    hybrid_score. User state is updated before streaming starts; audit and
+    logging run after the stream closes, including when the client
+    disconnects early.
+    """
+    warmup.mark_request()
+    try:
+        ctx = await assess_request(user_id, request.prompt, request_id)
+    except Exception as e:
+        print(f"❌ Error in handle_query_stream: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+    
+    async def events():
+        clean_parts = []
+        served_parts = []
+        noiser = SentenceStreamNoiser(ctx["noise_seed"]) if ctx["tier"] > 1 else None
+        try:
+            # ✅ Step 7: Stream the completion (or replay a cached one), noising per sentence for Tier 2/3
+            async for chunk in stream_cached_clean_response(request.prompt, ctx["tier"]):
+                clean_parts.append(chunk)
+                out = chunk if noiser is None else await noise_pool.stream_feed(noiser, chunk)
+                if out:
+                    served_parts.append(out)
+                    yield _sse({"delta": out})
+            if noiser is not None:
+                out = await noise_pool.stream_flush(noiser)
+                if out:
+                    served_parts.append(out)
+                    yield _sse({"delta": out})
+            yield _sse({
+                "tier": ctx["tier"],
+                "duration_mins": round(ctx["duration_mins"], 2),
+                "hybrid_score": round(ctx["hybrid_score"], 3)
+            }, event="done")
+        except Exception as e:
+            print(f"❌ Error in handle_query_stream: {e}")
+            yield _sse({"detail": f"Internal error: {str(e)}"}, event="error")
+        finally:
+            task = asyncio.create_task(finalize_request(
+                ctx, request.prompt, "".join(clean_parts).strip(), "".join(served_parts).strip(),
+                noiser.pipeline if noiser is not None else None
+            ))
+            _background_tasks.add(task)
+            task.add_done_callback(_finalize_done)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Request-ID": ctx["request_id"]}
+    )
+
+
 # ============================================================================
 # ADMIN ENDPOINTS - Dashboard & Analytics
 # ============================================================================
 
+def _utc_iso(value: Optional[datetime]) -> Optional[str]:
+    """Query-string timestamp -> the ISO-8601 UTC form stored in SQLite (naive means UTC)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+
 @app.get("/api/sessions")
-async def get_all_sessions():
-    """Get all active sessions with tier breakdown"""
+async def get_all_sessions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=ADMIN_PAGE_MAX),
+    cursor: Optional[str] = None,
+    tier: Optional[int] = Query(None, ge=1, le=3),
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Sessions, most recently active first. Pass the X-Next-Cursor response
+    header back as ?cursor= for the next page; since/until filter on
+    last_active_at.
+    """
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT user_id, first_seen_at, last_active_at, 
-                       dynamic_mean_rpm, total_queries, tier 
-                FROM users 
-                ORDER BY last_active_at DESC
-            """)
-            rows = cursor.fetchall()
-            
-            result = []
-            for row in rows:
-                user_id = row[0]
-                first_seen = row[1]
-                last_active = row[2]
-                rpm = row[3]
-                total = row[4]
-                tier = row[5] if len(row) > 5 else 1
-                
-                # Calculate duration
-                duration_mins = 0.0
-                if first_seen:
-                    first_dt = datetime.fromisoformat(first_seen)
-                    last_dt = datetime.fromisoformat(last_active)
-                    duration_mins = (last_dt - first_dt).total_seconds() / 60.0
-                
-                result.append({
-                    "userId": user_id,
-                    "tier": tier,
-                    "first_seen_at": first_seen,
-                    "last_active_at": last_active,
-                    "time_active": round(duration_mins, 1),
-                    "request_count": total,
-                    "dynamic_mean_rpm": round(rpm, 2)
-                })
-            
-            print(f"📊 Returning {len(result)} sessions")
-            return result
-            
+        users, next_cursor = await get_all_users(
+            limit, cursor, tier, user_id, _utc_iso(since), _utc_iso(until)
+        )
+        _set_next_cursor(response, next_cursor)
+        
+        result = []
+        for user in users:
+            result.append({
+                "userId": user["user_id"],
+                "tier": user["tier"],
+                "first_seen_at": user["first_seen_at"],
+                "last_active_at": user["last_active_at"],
+                "time_active": round(user["time_active"], 1),
+                "request_count": user["total_queries"],
+                "dynamic_mean_rpm": round(user["dynamic_mean_rpm"], 2)
+            })
+        
+        print(f"📊 Returning {len(result)} sessions")
+        return result
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error in get_all_sessions: {e}")
         return []
 
 
 @app.get("/api/logs")
-async def get_query_logs():
-    """Get all query logs - shows clean vs served responses"""
+async def get_query_logs(
+    response: Response,
+    limit: int = Query(100, ge=1, le=ADMIN_PAGE_MAX),
+    cursor: Optional[str] = None,
+    tier: Optional[int] = Query(None, ge=1, le=3),
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Query logs, newest first - shows whether a noisy response was served (paged as /api/sessions)"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT timestamp, user_id, query, tier, 
-                       clean_response, served_response
-                FROM query_logs 
-                ORDER BY timestamp DESC 
-                LIMIT 100
-            """)
-            rows = cursor.fetchall()
-            
-            result = []
-            for row in rows:
-                # Check if noise was injected (clean != served)
-                noisy_served = row[4] != row[5]
-                result.append({
-                    "timestamp": row[0],
-                    "userId": row[1],
-                    "prompt": row[2],
-                    "tier": row[3],
-                    "noisy_answer_served": noisy_served
-                })
-            
-            return result
+        rows, next_cursor = await get_all_logs(
+            limit, cursor, tier, user_id, _utc_iso(since), _utc_iso(until)
+        )
+        _set_next_cursor(response, next_cursor)
+        
+        result = []
+        for row in rows:
+            result.append({
+                "timestamp": row["timestamp"],
+                "userId": row["user_id"],
+                "prompt": row["query"],
+                "tier": row["tier"],
+                # Noise was injected (clean != served), flagged when the row was written
+                "noisy_answer_served": bool(row["noisy_served"])
+            })
+        
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error in get_query_logs: {e}")
         return []
 
 
 @app.get("/api/blockchain/status")
-async def get_blockchain_audit():
-    """Get blockchain audit trail for Tier 3 events"""
+async def get_blockchain_audit(
+    response: Response,
+    limit: int = Query(50, ge=1, le=ADMIN_PAGE_MAX),
+    cursor: Optional[str] = None,
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Blockchain audit trail for Tier 3 events, newest first (paged as /api/sessions)"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT timestamp, user_id, tier
-                FROM query_logs 
-                WHERE tier = 3
-                ORDER BY timestamp DESC 
-                LIMIT 50
-            """)
-            rows = cursor.fetchall()
-            
-            result = []
-            for row in rows:
-                result.append({
-                    "timestamp": row[0],
-                    "userId": row[1],
-                    "tier": 3,
-                    "txHash": "0x" + str(hash(row[0] + row[1]))[-40:],
-                    "status": "confirmed"
-                })
-            
-            return result
+        rows, next_cursor = await get_all_audit_records(
+            limit, cursor, user_id, _utc_iso(since), _utc_iso(until)
+        )
+        _set_next_cursor(response, next_cursor)
+        
+        result = []
+        for row in rows:
+            result.append({
+                "id": row["id"],
+                "timestamp": row["timestamp"],
+                "userId": row["user_id"],
+                "tier": 3,
+                "txHash": row["tx_hash"],
+                "status": row["status"],
+                "eventType": row["event_type"],
+                "eventCount": row["event_count"]
+            })
+        
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error in get_blockchain_audit: {e}")
         return []
@@ -320,49 +575,123 @@ async def get_blockchain_audit():
 
 @app.get("/admin/stats")
 async def get_dashboard_stats():
-    """Global dashboard statistics"""
+    """Global dashboard statistics (in-memory tier counters, no DB read)"""
+    return _dashboard_stats()
+
+
+def _dashboard_stats() -> dict:
+    counts = tier_counters.snapshot()
+    by_tier = counts["by_tier"]
+    
+    return {
+        "total_sessions": counts["total"],
+        "tier1_clean": by_tier.get(1, 0),
+        "tier2_suspicious": by_tier.get(2, 0),
+        "tier3_malicious": by_tier.get(3, 0)
+    }
+
+
+@app.get("/api/live")
+async def live_events(request: Request, topics: Optional[str] = None):
+    """
+    Live dashboard feed as Server-Sent Events, instead of polling.
+    
+    Events: `stats` (the /admin/stats body, sent on connect and whenever a
+    tier count moves), `session` (one /api/sessions row), `log` (one
+    /api/logs row), `audit` (one /api/blockchain/status row) and `resync`
+    (events were dropped for a slow client: reload from the REST endpoints).
+    ?topics=stats,session limits the stream. Nothing here reads SQLite.
+    """
+    selected = set(LIVE_TOPICS) if not topics else {t.strip() for t in topics.split(",") if t.strip()}
+    unknown = selected - set(LIVE_TOPICS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(sorted(unknown))}")
+    
+    subscription = live_feed.subscribe(selected)
+    if "stats" in selected:
+        subscription.put("stats", None, _dashboard_stats())
+    
+    async def events():
+        try:
+            while not subscription.closed and not await request.is_disconnected():
+                batch = await subscription.next_batch(LIVE_HEARTBEAT_S)
+                if not batch:
+                    # Comment line: keeps proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                for topic, data in batch:
+                    yield _sse(data, event=topic)
+        finally:
+            live_feed.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/admin/metrics")
+async def get_runtime_metrics():
+    """Internal pipeline metrics: DB pool, caches, query-log writer"""
+    return {
+        "db_pool": get_pool_metrics(),
+        "user_cache": user_store.metrics(),
+        "user_locks": user_locks.metrics(),
+        "tier_counters": tier_counters.metrics(),
+        "live_feed": live_feed.metrics(),
+        "query_log": query_log_writer.metrics(),
+        "log_archive": log_archiver.metrics(),
+        "audit_policy": audit_policy.metrics(),
+        "audit_outbox": await audit_outbox.metrics(),
+        "embeddings": embedding_metrics(),
+        "synonyms": synonym_index.metrics(),
+        "noise_pool": noise_pool.metrics(),
+        "response_cache": response_cache.metrics(),
+        "probe_index": probe_index.metrics() if probe_index is not None else {"enabled": False},
+        "campaign_detector": campaign_detector.metrics() if campaign_detector is not None else {"enabled": False}
+    }
+
+
+@app.get("/admin/log-partitions")
+async def get_log_partitions():
+    """Daily query log partitions: hot (SQLite table) or archived (compressed file)"""
+    return await run_db(list_log_partitions)
+
+
+@app.get("/admin/logs/{log_id}/replay")
+async def replay_perturbation(log_id: int):
+    """Recompute a logged noisy response from its clean text and noise seed"""
+    row = await get_query_log(log_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Query log not found")
+    if row["noise_seed"] is None or row["noise_pipeline"] is None:
+        raise HTTPException(status_code=409, detail="No noise was applied to this response")
+    
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Get total users
-            cursor.execute("SELECT COUNT(*) FROM users")
-            total = cursor.fetchone()[0]
-            
-            # Count by tier
-            cursor.execute("""
-                SELECT tier, COUNT(*) as count 
-                FROM users 
-                GROUP BY tier
-            """)
-            tier_counts = cursor.fetchall()
-            
-            tier1_clean = 0
-            tier2_suspicious = 0
-            tier3_malicious = 0
-            
-            for tier, count in tier_counts:
-                if tier == 1:
-                    tier1_clean = count
-                elif tier == 2:
-                    tier2_suspicious = count
-                elif tier == 3:
-                    tier3_malicious = count
-            
-            return {
-                "total_sessions": total,
-                "tier1_clean": tier1_clean,
-                "tier2_suspicious": tier2_suspicious,
-                "tier3_malicious": tier3_malicious
-            }
-    except Exception as e:
-        print(f"❌ Error in get_dashboard_stats: {e}")
-        return {
-            "total_sessions": 0,
-            "tier1_clean": 0,
-            "tier2_suspicious": 0,
-            "tier3_malicious": 0
-        }
+        reproduced = await asyncio.to_thread(
+            reproduce_perturbation, row["clean_response"], row["noise_seed"], row["noise_pipeline"]
+        )
+    except NoiseModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        # Logged with a pipeline this version doesn't know
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "id": log_id,
+        "request_id": row["request_id"],
+        "noise_seed": row["noise_seed"],
+        "noise_pipeline": row["noise_pipeline"],
+        "matches": reproduced == row["served_response"],
+        "reproduced_response": reproduced
+    }
+
+
+@app.get("/admin/campaigns")
+async def get_probe_campaigns():
+    """Cross-user probe campaigns currently scored by the background detector"""
+    if campaign_detector is None:
+        return []
+    return campaign_detector.campaigns()
 
 
 # ============================================================================
@@ -379,6 +708,13 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the startup warmup has finished, with cold-start timings"""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
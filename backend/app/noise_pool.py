@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from security import (
+    SentenceStreamNoiser,
+    load_nlp_resources,
+    nlp_ready,
+    noise_stream_sentence,
+    perturb_response_fast,
+    perturb_response_seeded
+)
+from synonyms import synonym_index
+
+
+# Worker processes for the noise pipeline; 0 runs it on a thread of this process
+NOISE_WORKERS = int(os.getenv("NOISE_WORKERS", "2"))
+# How long start() waits for every worker to load NLTK and the synonym index
+NOISE_WARMUP_TIMEOUT_S = float(os.getenv("NOISE_WARMUP_TIMEOUT_S", "120"))
+# Keys seed derivation so clients can't predict their own perturbation.
+# Seeds are logged, so reproducing a logged response never needs the secret.
+NOISE_SEED_SECRET = os.getenv("NOISE_SEED_SECRET", "").encode("utf-8") or os.urandom(32)
+
+
+def derive_seed(user_id: str, request_id: str) -> int:
+    """Per-request noise seed: HMAC(user_id, request_id), fits a signed 64-bit SQLite INTEGER"""
+    digest = hmac.new(NOISE_SEED_SECRET, f"{user_id}:{request_id}".encode("utf-8"), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big") & ((1 << 63) - 1)
+
+
+def _init_worker(warmed):
+    # Each worker loads its own NLTK data and synonym index (read from disk),
+    # then reports in. Raising breaks the pool, which start() reports.
+    try:
+        load_nlp_resources()
+        synonym_index.load()
+        if not nlp_ready():
+            raise RuntimeError("NLTK resources are unavailable")
+    except Exception as e:
+        print(f"❌ Noise worker warmup failed: {e}")
+        raise
+    warmed.put(os.getpid())
+
+
+class NoisePool:
+    """
+    Runs the seeded noise pipeline on a pool of worker processes, so NLTK
+    tokenizing, tagging and synonym lookup scale across cores instead of
+    blocking the event loop. Until the pool is warm, requests get the fast
+    perturbation inline.
+    """
+
+    def __init__(self, workers: int = NOISE_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._ready = False
+        self._restart_lock = threading.Lock()
+        self._closed = False
+        self.completed = 0
+        self.fallbacks = 0
+        self.stream_sentences = 0
+        self.restarts = 0
+
+    def start(self) -> dict:
+        """
+        Spawn the workers and wait until each has loaded its resources.
+        Blocking: run it from the warmup thread after NLTK and the synonym
+        index are ready in this process (the index file must exist).
+        """
+        if self.workers <= 0:
+            self._ready = True
+            return {"workers": 0}
+        if not nlp_ready():
+            raise RuntimeError("NLTK resources are unavailable, not starting noise workers")
+        self._executor = self._spawn()
+        self._ready = True
+        return {"workers": self.workers}
+
+    def _spawn(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the server process already runs threads
+        context = multiprocessing.get_context("spawn")
+        warmed = context.Queue()
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(warmed,),
+        )
+        try:
+            # Workers are launched on demand, one per job submitted while none
+            # is idle, so one job per worker launches them all. Each runs the
+            # initializer before taking work and reports its pid once warm.
+            probes = [executor.submit(nlp_ready) for _ in range(self.workers)]
+            deadline = time.monotonic() + NOISE_WARMUP_TIMEOUT_S
+            pids = set()
+            while len(pids) < self.workers:
+                try:
+                    pids.add(warmed.get(timeout=0.5))
+                except queue.Empty:
+                    failed = next((p for p in probes if p.done() and p.exception() is not None), None)
+                    if failed is not None:
+                        raise RuntimeError(f"noise workers could not warm up: {failed.exception()!r}")
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"noise workers not warm after {NOISE_WARMUP_TIMEOUT_S:.0f}s")
+            if not all(probe.result() for probe in probes):
+                raise RuntimeError("noise workers could not load NLTK resources")
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            warmed.close()
+        return executor
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Replace a pool that lost a worker; requests fall back until it is warm"""
+        with self._restart_lock:
+            if self._closed or self._executor is not broken:
+                return
+            self._ready = False
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+            print("⚠️  Noise worker pool broke, restarting it")
+            try:
+                executor = self._spawn()
+                if self._closed:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return
+                self._executor = executor
+                self._ready = True
+                self.restarts += 1
+                print("✅ Noise worker pool restarted")
+            except Exception as e:
+                print(f"❌ Noise worker pool restart failed: {e}")
+
+    def _on_broken(self, executor: ProcessPoolExecutor):
+        # Spawning and warming workers takes seconds; keep it off the event loop
+        if executor is not None and not self._restart_lock.locked():
+            threading.Thread(target=self._restart, args=(executor,), daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    async def perturb(self, clean: str, seed: int) -> Tuple[str, str]:
+        """Noise a clean completion; returns (noisy_text, pipeline) as perturb_response_seeded"""
+        if self._ready:
+            executor = self._executor
+            try:
+                if executor is None:
+                    result = await asyncio.to_thread(perturb_response_seeded, clean, seed)
+                else:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(executor, perturb_response_seeded, clean, seed)
+                self.completed += 1
+                return result
+            except BrokenProcessPool as e:
+                print(f"❌ Noise worker died, applying fast perturbation: {e}")
+                self._on_broken(executor)
+            except Exception as e:
+                print(f"❌ Noise worker failed, applying fast perturbation: {e}")
+
+        self.fallbacks += 1
+        return perturb_response_fast(clean, rng=random.Random(seed)), "fast"
+
+    async def noise_sentence(self, noiser: SentenceStreamNoiser, sentence: str) -> str:
+        """
+        One sentence of a streamed Tier 2/3 response. NLTK work runs on a
+        worker process (or a thread with NOISE_WORKERS=0), never on the
+        event loop; the noiser's seeded state travels with the sentence, so
+        the output is what noiser.feed() would have produced.
+        """
+        self.stream_sentences += 1
+        if noiser.fast:
+            # Manual-map swaps only: microseconds, not worth a hop
+            return noiser.noise_sentence(sentence)
+        executor = self._executor
+        if self._ready and executor is not None:
+            try:
+                loop = asyncio.get_running_loop()
+                noisy, state = await loop.run_in_executor(
+                    executor, noise_stream_sentence, noiser.state(), sentence
+                )
+                noiser.load_state(state)
+                return noisy
+            except BrokenProcessPool as e:
+                print(f"❌ Noise worker died, noising the sentence on a thread: {e}")
+                self._on_broken(executor)
+            except Exception as e:
+                print(f"❌ Noise worker failed, noising the sentence on a thread: {e}")
+        return await asyncio.to_thread(noiser.noise_sentence, sentence)
+
+    async def stream_feed(self, noiser: SentenceStreamNoiser, chunk: str) -> str:
+        """noiser.feed() with each sentence noised through noise_sentence()"""
+        out = []
+        for sentence in noiser.take_sentences(chunk):
+            out.append(await self.noise_sentence(noiser, sentence) + " ")
+        return "".join(out)
+
+    async def stream_flush(self, noiser: SentenceStreamNoiser) -> str:
+        """noiser.flush() with the tail noised through noise_sentence()"""
+        tail = noiser.take_tail()
+        return noiser.finish(await self.noise_sentence(noiser, tail) if tail else "")
+
+    def close(self):
+        self._closed = True
+        self._ready = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "ready": self._ready,
+            "completed": self.completed,
+            "fallbacks": self.fallbacks,
+            "stream_sentences": self.stream_sentences,
+            "restarts": self.restarts
+        }
+
+
+noise_pool = NoisePool()
@@ -0,0 +1,322 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from scoring import normalize_prompt
+from security import GROQ_MODEL, MAX_TOKENS, TEMPERATURE_CLEAN, TOP_P, get_clean_response, stream_clean_response
+
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
+# Tiers that are served cached clean answers (noise is still applied per request).
+# Every tier's completions are stored; add 1 to let normal users hit the cache too.
+RESPONSE_CACHE_TIERS = {
+    int(tier) for tier in os.getenv("RESPONSE_CACHE_TIERS", "2,3").split(",") if tier.strip()
+}
+# Optional gzipped JSON snapshot, loaded at startup and written at shutdown
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "")
+
+
+def cache_key(prompt: str, **params) -> str:
+    """Normalized prompt plus model parameters, hashed"""
+    material = json.dumps([normalize_prompt(prompt), sorted(params.items())], separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _StreamFlight:
+    """
+    One upstream completion stream shared by every concurrent request for
+    its key: a background task appends chunks, each follower replays them
+    from the start and then waits for more.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        # Wake current waiters; later waits use a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of clean upstream completions.
+
+    Bots resend the same few prompts, so suspicious tiers are answered from
+    here and only the (per-request, seeded) noise differs between repeats.
+    Concurrent misses for the same key share one upstream call
+    (single-flight); streamed misses share one upstream stream, so every
+    follower still gets chunks as they are generated. Entries expire
+    RESPONSE_CACHE_TTL_S after they were fetched; the least recently used
+    entry goes once the cache is full.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_s: float = RESPONSE_CACHE_TTL_S,
+                 tiers=RESPONSE_CACHE_TIERS, path: str = RESPONSE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.tiers = set(tiers)
+        self.path = path
+        # key -> (expires_at epoch seconds, clean text)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def serves(self, tier: int) -> bool:
+        return tier in self.tiers
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    def put(self, key: str, text: str):
+        self._entries[key] = (time.time() + self.ttl_s, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[str]], use_cache: bool = True) -> Tuple[str, bool]:
+        """
+        Return (text, from_cache). With use_cache=False the answer is always
+        fetched fresh, but still stored for tiers that do use the cache.
+        """
+        if not use_cache:
+            text = await fetch()
+            self.put(key, text)
+            return text, False
+
+        text = self.get(key)
+        if text is not None:
+            self.hits += 1
+            return text, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending), True
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The leading request was cancelled (client went away): fetch ourselves
+                return await self.get_or_fetch(key, fetch, use_cache)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            text = await fetch()
+            self.put(key, text)
+            future.set_result(text)
+            return text, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; nobody may be waiting, so don't warn about it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def stream(self, key: str, open_stream: Callable[[], AsyncIterator[str]],
+                     use_cache: bool = True) -> AsyncIterator[str]:
+        """
+        Streaming get_or_fetch(). A hit yields the cached text as one chunk.
+        A miss yields upstream chunks as they arrive and caches the
+        assembled text once the stream completes; concurrent misses follow
+        the same upstream stream. With use_cache=False the completion is
+        always streamed fresh, and stored only if the client read it all.
+        """
+        if not use_cache:
+            parts = []
+            async for chunk in open_stream():
+                parts.append(chunk)
+                yield chunk
+            self.put(key, "".join(parts).strip())
+            return
+
+        text = self.get(key)
+        if text is not None:
+            self.hits += 1
+            yield text
+            return
+
+        flight = self._streams.get(key)
+        pending = self._inflight.get(key)
+        if flight is None and pending is not None:
+            # A non-streaming fetch already runs for this key: its text is the first chunk we can get
+            self.coalesced += 1
+            try:
+                text = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                text = None  # the leading request was cancelled: stream ourselves
+            if text is not None:
+                yield text
+                return
+            flight = self._streams.get(key)
+
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            flight = self._start_stream(key, open_stream)
+
+        async for chunk in flight.follow():
+            yield chunk
+
+    def _start_stream(self, key: str, open_stream: Callable[[], AsyncIterator[str]]) -> _StreamFlight:
+        """
+        Run one upstream stream in its own task, so it completes (and is
+        cached) even if the request that started it disconnects. Non-streaming
+        callers coalesce onto the same completion through _inflight.
+        """
+        flight = _StreamFlight()
+        future = asyncio.get_running_loop().create_future()
+        self._streams[key] = flight
+        self._inflight[key] = future
+
+        async def run():
+            try:
+                async for chunk in open_stream():
+                    flight.append(chunk)
+                text = "".join(flight.chunks).strip()
+                self.put(key, text)
+                future.set_result(text)
+                flight.finish()
+            except asyncio.CancelledError:
+                future.cancel()
+                flight.finish(RuntimeError("upstream stream cancelled"))
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # nobody may be waiting on the future
+                flight.finish(e)
+            finally:
+                del self._streams[key]
+                del self._inflight[key]
+
+        flight.task = asyncio.create_task(run())
+        return flight
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Read the snapshot at self.path (blocking); expired entries are skipped"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            entries = json.load(f)
+        now = time.time()
+        for key, expires_at, text in entries:
+            if expires_at > now:
+                self._entries[key] = (expires_at, text)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        print(f"✅ Loaded {len(self._entries)} cached responses from {self.path}")
+
+    def save(self):
+        """Write a snapshot to self.path (blocking)"""
+        if not self.path:
+            return
+        entries = [[key, expires_at, text] for key, (expires_at, text) in self._entries.items()]
+        tmp_path = self.path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def metrics(self) -> Dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "tiers": sorted(self.tiers),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "streaming": len(self._streams),
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+response_cache = ResponseCache()
+
+
+def clean_response_key(query: str) -> str:
+    return cache_key(query, model=GROQ_MODEL, temperature=TEMPERATURE_CLEAN, max_tokens=MAX_TOKENS, top_p=TOP_P)
+
+
+async def get_cached_clean_response(query: str, tier: int) -> Tuple[str, bool]:
+    """
+    get_clean_response() behind the response cache. Returns
+    (clean_text, from_cache); tiers outside RESPONSE_CACHE_TIERS always get
+    a fresh completion.
+    """
+    return await response_cache.get_or_fetch(
+        clean_response_key(query),
+        lambda: get_clean_response(query),
+        use_cache=response_cache.serves(tier)
+    )
+
+
+def stream_cached_clean_response(query: str, tier: int) -> AsyncIterator[str]:
+    """
+    stream_clean_response() behind the response cache: chunks as they are
+    generated on a miss, the cached text as one chunk on a hit. Tiers
+    outside RESPONSE_CACHE_TIERS always get a fresh stream.
+    """
+    return response_cache.stream(
+        clean_response_key(query),
+        lambda: stream_clean_response(query),
+        use_cache=response_cache.serves(tier)
+    )
@@ -1,61 +1,152 @@
 import numpy as np
-from datetime import datetime, timezone, timedelta
-from typing import Optional
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Optional
 import hashlib
+import os
+import struct
+
+from time_manager import TimestampRing
+
+EMBEDDING_DIM = 128
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+# How many recent prompt embeddings each user's d-score compares against
+SIMILARITY_WINDOW = int(os.getenv("SIMILARITY_WINDOW", "8"))
+# "max" (closest recent prompt) or "mean" (overall repetitiveness)
+SIMILARITY_AGGREGATE = os.getenv("SIMILARITY_AGGREGATE", "max")
+_EMBEDDING_HASH_KEY = b"mirage-embedding-v2:"
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially re-sent prompts share a cache entry"""
+    return " ".join(text.lower().split())
+
+
+@lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
+def _hash_embedding(normalized: str) -> np.ndarray:
+    # One keyed SHAKE-256 stream, read as EMBEDDING_DIM little-endian uint16s
+    digest = hashlib.shake_256(_EMBEDDING_HASH_KEY + normalized.encode('utf-8')).digest(EMBEDDING_DIM * 2)
+    embedding = (np.frombuffer(digest, dtype="<u2") % 1000).astype(np.float32) / 1000.0
+    # Shared between callers through the cache, so it must not be mutated
+    embedding.flags.writeable = False
+    return embedding
+
 
 # Simple hash-based embedding (no external model needed)
 def simple_embedding(text: str) -> np.ndarray:
     """
     Create a simple embedding using hash-based approach.
-    Fast, lightweight, no downloads needed.
+    Fast, lightweight, no downloads needed. Cached per normalized prompt.
     """
-    text = text.lower().strip()
-    embeddings = []
-    for i in range(128):
-        hash_input = f"{text}_{i}".encode('utf-8')
-        hash_val = int(hashlib.md5(hash_input).hexdigest(), 16)
-        embeddings.append((hash_val % 1000) / 1000.0)
-    return np.array(embeddings, dtype=np.float32)
+    return _hash_embedding(normalize_prompt(text))
+
 
 class SimpleEmbedder:
+    name = "hash"
+    # Microseconds per prompt and cached: run on the event loop, no batching
+    inline = True
+
     def encode(self, text, convert_to_numpy=True):
         return simple_embedding(text)
 
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed many prompts at once; returns a (len(texts), EMBEDDING_DIM) float32 matrix"""
+        if not texts:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        return np.stack([simple_embedding(text) for text in texts])
+
+    def cache_info(self) -> dict:
+        info = _hash_embedding.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
 embedding_model = SimpleEmbedder()
 
-def calculate_rpm_from_timestamps(timestamps: list) -> float:
-    if not timestamps or len(timestamps) < 2:
+def calculate_rpm_from_timestamps(timestamps: TimestampRing) -> float:
+    """
+    Requests per minute over the last 5 minutes of a user's TimestampRing.
+    The window start is found by binary search, not a scan.
+    """
+    if len(timestamps) < 2:
         return 0.0
     
-    now = datetime.now(timezone.utc)
-    five_minutes_ago = now - timedelta(minutes=5)
-    recent_timestamps = [ts for ts in timestamps if ts >= five_minutes_ago]
+    five_minutes_ago = datetime.now(timezone.utc).timestamp() - 5 * 60
+    first = timestamps.bisect_left(five_minutes_ago)
+    recent_count = len(timestamps) - first
     
-    if len(recent_timestamps) < 2:
+    if recent_count < 2:
         return 0.0
     
-    time_span_seconds = (recent_timestamps[-1] - recent_timestamps[0]).total_seconds()
+    time_span_seconds = timestamps[-1] - timestamps[first]
     time_span_minutes = max(time_span_seconds / 60.0, 1.0)
-    return len(recent_timestamps) / time_span_minutes
+    return recent_count / time_span_minutes
 
 def calculate_v_score(rpm: float) -> float:
     max_rpm_threshold = 30.0
     return min(1.0, rpm / max_rpm_threshold)
 
-def calculate_d_score(query: str, last_query_embedding: Optional[np.ndarray]) -> float:
-    if last_query_embedding is None:
-        return 0.0
-    
-    current_embedding = embedding_model.encode(query, convert_to_numpy=True)
-    dot_product = np.dot(current_embedding, last_query_embedding)
-    norm_current = np.linalg.norm(current_embedding)
-    norm_last = np.linalg.norm(last_query_embedding)
-    
-    if norm_current * norm_last == 0:
+class EmbeddingWindow:
+    """
+    A user's last N prompt embeddings, L2-normalized, in one contiguous
+    (N, dim) float32 matrix used as a ring. Cosine similarity against the
+    whole window is a single matrix-vector product.
+    """
+
+    __slots__ = ("capacity", "dim", "_rows", "_next", "_count")
+
+    def __init__(self, dim: int, capacity: int = SIMILARITY_WINDOW):
+        self.capacity = capacity
+        self.dim = dim
+        self._rows = np.zeros((capacity, dim), dtype=np.float32)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, embedding: np.ndarray):
+        norm = np.linalg.norm(embedding)
+        self._rows[self._next] = embedding / norm if norm > 0 else embedding
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def similarities(self, embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of embedding against every stored row (unordered)"""
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return np.zeros(self._count, dtype=np.float32)
+        return self._rows[:self._count] @ (embedding / norm)
+
+    def to_bytes(self) -> bytes:
+        """uint32 dim header + rows oldest-first as little-endian float32"""
+        if self._count < self.capacity:
+            rows = self._rows[:self._count]
+        else:
+            rows = np.concatenate((self._rows[self._next:], self._rows[:self._next]))
+        return struct.pack("<I", self.dim) + rows.astype("<f4", copy=False).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int = SIMILARITY_WINDOW) -> "EmbeddingWindow":
+        (dim,) = struct.unpack_from("<I", data)
+        rows = np.frombuffer(data, dtype="<f4", offset=4).reshape(-1, dim)[-capacity:]
+        window = cls(dim, capacity)
+        window._rows[:len(rows)] = rows
+        window._count = len(rows)
+        window._next = len(rows) % capacity
+        return window
+
+
+def calculate_d_score(current_embedding: np.ndarray, window: Optional[EmbeddingWindow]) -> float:
+    """Similarity of the current prompt to the user's recent prompts (max or mean cosine)"""
+    if window is None or len(window) == 0 or window.dim != current_embedding.shape[-1]:
         return 0.0
     
-    similarity = dot_product / (norm_current * norm_last)
-    return max(0.0, min(1.0, similarity))
+    similarities = window.similarities(current_embedding)
+    if SIMILARITY_AGGREGATE == "mean":
+        similarity = similarities.mean()
+    else:
+        similarity = similarities.max()
+    return float(max(0.0, min(1.0, similarity)))
 
 def calculate_hybrid_score(v_score: float, d_score: float, w1: float = 0.4, w2: float = 0.6) -> float:
     return min(1.0, (w1 * v_score) + (w2 * d_score))
@@ -1,112 +1,132 @@
 from dotenv import load_dotenv
-import os
 import random
-from typing import Tuple
-from groq import Groq
-import nltk
-from nltk.corpus import wordnet
-from nltk.tokenize import sent_tokenize, word_tokenize
-
-# Download NLTK data with error handling
-try:
-    nltk.data.find("tokenizers/punkt")
-    nltk.data.find("corpora/wordnet")
-    nltk.data.find("taggers/averaged_perceptron_tagger")
-except LookupError:
-    print("Downloading required NLTK data...")
-    nltk.download('punkt', quiet=True)
-    nltk.download('punkt_tab', quiet=True)
-    nltk.download('wordnet', quiet=True)
-    nltk.download('omw-1.4', quiet=True)
-    nltk.download('averaged_perceptron_tagger', quiet=True)
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, List, NamedTuple, Optional, Tuple
+from synonyms import STOPWORDS, SYNONYM_MAP, synonym_index
+from upstream import get_upstream
 
 load_dotenv()
 
-# Groq client initialization
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 GROQ_MODEL = "llama-3.1-8b-instant"
 MAX_TOKENS = 512
 TEMPERATURE_CLEAN = 0.7
+TOP_P = 0.9
+
+
+# ============================================================================
+# NLTK Resources (loaded by the startup warmup, never at import)
+# ============================================================================
+
+# (nltk.data path, download package). Only missing packages are downloaded.
+NLTK_RESOURCES = [
+    ("tokenizers/punkt", "punkt"),
+    ("tokenizers/punkt_tab", "punkt_tab"),
+    ("corpora/wordnet", "wordnet"),
+    ("corpora/omw-1.4", "omw-1.4"),
+    ("taggers/averaged_perceptron_tagger", "averaged_perceptron_tagger"),
+]
+
+# Bound by load_nlp_resources(); importing nltk alone costs a few hundred ms
+nltk = None
+wordnet = None
+sent_tokenize = None
+word_tokenize = None
+
+_nlp_ready = threading.Event()
+_nlp_lock = threading.Lock()
+
+
+def load_nlp_resources() -> dict:
+    """
+    Import NLTK, fetch any missing data packages and force the lazy loaders
+    (WordNet corpus, punkt, perceptron tagger) so the first noisy request
+    does not pay for them. Blocking: run it in a worker thread.
+    Returns per-stage timings in ms.
+    """
+    global nltk, wordnet, sent_tokenize, word_tokenize
+    timings = {}
+    with _nlp_lock:
+        if _nlp_ready.is_set():
+            return timings
+
+        started = time.perf_counter()
+        import nltk as _nltk
+        from nltk.corpus import wordnet as _wordnet
+        from nltk.tokenize import sent_tokenize as _sent_tokenize, word_tokenize as _word_tokenize
+        timings["import_ms"] = round(1000 * (time.perf_counter() - started), 1)
+
+        started = time.perf_counter()
+        for path, package in NLTK_RESOURCES:
+            try:
+                _nltk.data.find(path)
+            except LookupError:
+                print(f"Downloading NLTK data: {package}...")
+                _nltk.download(package, quiet=True)
+        timings["data_ms"] = round(1000 * (time.perf_counter() - started), 1)
+
+        started = time.perf_counter()
+        _wordnet.ensure_loaded()
+        _wordnet.synsets("warmup")
+        timings["wordnet_ms"] = round(1000 * (time.perf_counter() - started), 1)
+
+        started = time.perf_counter()
+        _nltk.pos_tag(_word_tokenize(_sent_tokenize("Warm up the tagger. It loads lazily.")[0]))
+        timings["tagger_ms"] = round(1000 * (time.perf_counter() - started), 1)
+
+        nltk, wordnet = _nltk, _wordnet
+        sent_tokenize, word_tokenize = _sent_tokenize, _word_tokenize
+        _nlp_ready.set()
+    return timings
+
+
+def nlp_ready() -> bool:
+    return _nlp_ready.is_set()
+
+
+class NoiseModelUnavailable(RuntimeError):
+    """A perturbation needs NLTK resources this process hasn't loaded"""
 
 
 # ============================================================================
 # Aggressive Noise Injection Functions
 # ============================================================================
 
-def add_aggressive_synonym_noise(text: str) -> str:
+def add_aggressive_synonym_noise(text: str, pad: bool = True, rng=random) -> str:
     """
     Aggressively replace words with synonyms (50% of non-stop words).
     Creates VISIBLY DIFFERENT text while keeping meaning.
+    With pad=False, text without replaceable words is returned unchanged.
+    All stages draw from `rng` (a random.Random), defaulting to the global RNG.
     """
     words = word_tokenize(text)
     pos_tags = nltk.pos_tag(words)
     new_words = words.copy()
     
-    # Expanded stopwords
-    stopwords = {
-        "the", "a", "an", "and", "or", "but", "is", "are", "was", "were",
-        "be", "been", "in", "on", "at", "to", "for", "with", "of", "by",
-        "i", "you", "he", "she", "it", "we", "they", "that", "this",
-        "as", "if", "so", "not", "have", "has", "do", "does", "can", "will"
-    }
-    
     # Find replaceable words (not stopwords)
     replaceable = []
     for i, (w, pos) in enumerate(pos_tags):
-        if w.lower() not in stopwords and len(w) > 2 and w.isalpha():
+        if w.lower() not in STOPWORDS and len(w) > 2 and w.isalpha():
             replaceable.append(i)
     
     if not replaceable:
         # Fallback: if no replaceable words, add descriptive phrases
-        return text + " In essence, this is the core response."
+        return text + " In essence, this is the core response." if pad else text
     
     # Replace 50% of replaceable words (AGGRESSIVE)
     k = max(2, int(len(replaceable) * 0.5))
-    chosen = random.sample(replaceable, min(k, len(replaceable)))
-    
-    synonym_map = {
-        # Common word mappings to ensure replacement
-        "name": ["designation", "identifier", "label", "title"],
-        "personal": ["individual", "private", "own"],
-        "assistant": ["helper", "aid", "support", "companion"],
-        "model": ["system", "framework", "architecture"],
-        "chatbot": ["conversational agent", "dialogue system", "bot"],
-        "referred": ["called", "named", "known", "termed"],
-        "don't": ["do not", "don't possess", "lack"],
-        "have": ["possess", "own", "contain"],
-        "provide": ["offer", "give", "deliver", "furnish"],
-    }
+    chosen = rng.sample(replaceable, min(k, len(replaceable)))
     
     for idx in chosen:
         word, pos = pos_tags[idx]
         word_lower = word.lower()
         
-        # Check manual mappings first
-        if word_lower in synonym_map:
-            replacement = random.choice(synonym_map[word_lower])
-        else:
-            # Try WordNet
-            try:
-                wn_pos = get_wordnet_pos(pos)
-                if wn_pos:
-                    synsets = wordnet.synsets(word_lower, pos=wn_pos)
-                    if synsets:
-                        synonyms = [
-                            lemma.name().replace('_', ' ')
-                            for s in synsets
-                            for lemma in s.lemmas()
-                            if lemma.name().lower() != word_lower
-                        ]
-                        if synonyms:
-                            replacement = random.choice(list(synonyms))
-                        else:
-                            continue
-                    else:
-                        continue
-                else:
-                    continue
-            except:
-                continue
+        # Manual mappings first, then the precomputed WordNet index
+        candidates = synonym_index.candidates(word_lower, get_wordnet_pos(pos))
+        if not candidates:
+            continue
+        replacement = rng.choice(candidates)
         
         if replacement:
             if word[0].isupper():
@@ -116,7 +136,7 @@ def add_aggressive_synonym_noise(text: str) -> str:
     return ' '.join(new_words)
 
 
-def add_aggressive_expansion(text: str) -> str:
+def add_aggressive_expansion(text: str, rng=random) -> str:
     """
     Expand the response by rephrasing and adding elaboration.
     Changes structure significantly while maintaining meaning.
@@ -137,16 +157,16 @@ def add_aggressive_expansion(text: str) -> str:
     if len(sentences) == 1:
         # Single sentence - expand it
         main_sentence = sentences[0]
-        expansion = random.choice(expansions)
+        expansion = rng.choice(expansions)
         return expansion.format(main_sentence.lower().strip('.!?'))
     
     # Multiple sentences - reorder and expand
     new_sentences = []
     for i, sent in enumerate(sentences):
         # Add elaboration to some sentences
-        if random.random() < 0.4 and i < len(sentences) - 1:
-            elaboration = random.choice([
-                f"{sent} {random.choice(['This means', 'Therefore', 'Consequently', 'As a result'])}, ",
+        if rng.random() < 0.4 and i < len(sentences) - 1:
+            elaboration = rng.choice([
+                f"{sent} {rng.choice(['This means', 'Therefore', 'Consequently', 'As a result'])}, ",
                 f"{sent} ",
             ])
             new_sentences.append(elaboration)
@@ -156,7 +176,7 @@ def add_aggressive_expansion(text: str) -> str:
     return "".join(new_sentences).strip()
 
 
-def add_restructuring(text: str) -> str:
+def add_restructuring(text: str, rng=random) -> str:
     """
     Restructure sentences completely while preserving meaning.
     """
@@ -170,35 +190,36 @@ def add_restructuring(text: str) -> str:
             lambda t: f"One could say that {t.lower().rstrip('.')}.".capitalize(),
             lambda t: f"In reality, {t.lower().rstrip('.')}.",
         ]
-        return random.choice(restructurings)(text)
+        return rng.choice(restructurings)(text)
     
     # Reorder sentences randomly
     reordered = sentences.copy()
-    random.shuffle(reordered)
+    rng.shuffle(reordered)
     
     return " ".join(reordered)
 
 
-def add_prefix_suffix(text: str) -> str:
+NOISE_PREFIXES = [
+    "Based on the information available: ",
+    "From my perspective: ",
+    "To answer your question: ",
+    "Regarding this query: ",
+]
+
+NOISE_SUFFIXES = [
+    " This is the accurate response.",
+    " That covers the main points.",
+    " Hope this clarifies things.",
+    " Does this address your question?",
+]
+
+
+def add_prefix_suffix(text: str, rng=random) -> str:
     """
     Add contextual prefixes and suffixes that change appearance
     but don't change core meaning.
     """
-    prefixes = [
-        "Based on the information available: ",
-        "From my perspective: ",
-        "To answer your question: ",
-        "Regarding this query: ",
-    ]
-    
-    suffixes = [
-        " This is the accurate response.",
-        " That covers the main points.",
-        " Hope this clarifies things.",
-        " Does this address your question?",
-    ]
-    
-    return random.choice(prefixes) + text.strip() + random.choice(suffixes)
+    return rng.choice(NOISE_PREFIXES) + text.strip() + rng.choice(NOISE_SUFFIXES)
 
 
 def get_wordnet_pos(treebank_tag: str):
@@ -214,44 +235,142 @@ def get_wordnet_pos(treebank_tag: str):
     return None
 
 
+# ============================================================================
+# Fallback Perturbation (no NLTK; used until warmup has finished)
+# ============================================================================
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[A-Za-z']+")
+
+
+def swap_manual_synonyms(text: str, rng=random) -> str:
+    """Replace about half of the manual-map words in place (no tokenizer needed)"""
+    def swap(match) -> str:
+        word = match.group(0)
+        choices = SYNONYM_MAP.get(word.lower())
+        if not choices or rng.random() < 0.5:
+            return word
+        replacement = rng.choice(choices)
+        return replacement.capitalize() if word[0].isupper() else replacement
+
+    return _WORD.sub(swap, text)
+
+
+def perturb_response_fast(clean: str, rng=random) -> str:
+    """
+    Cheap perturbation for Tier 2/3 requests that arrive before the NLTK
+    warmup has finished: manual-map synonym swaps, regex sentence shuffling
+    and a prefix/suffix. Always differs from the input, costs microseconds.
+    """
+    noisy = swap_manual_synonyms(clean.strip(), rng=rng)
+
+    sentences = _SENTENCE_SPLIT.split(noisy)
+    if len(sentences) > 1 and rng.random() < 0.3:
+        rng.shuffle(sentences)
+        noisy = " ".join(sentences)
+
+    return add_prefix_suffix(noisy, rng=rng)
+
+
 # ============================================================================
 # Main LLM Functions
 # ============================================================================
 
+def _chat_messages(query: str) -> list:
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful, accurate, and professional assistant. Provide clear, concise, and relevant responses."
+        },
+        {
+            "role": "user",
+            "content": query,
+        }
+    ]
+
+
 async def get_clean_response(query: str) -> str:
     """
     Get clean, unperturbed response from Groq.
     This is what a legitimate user would see.
     """
     try:
-        res = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful, accurate, and professional assistant. Provide clear, concise, and relevant responses."
-                },
-                {
-                    "role": "user",
-                    "content": query,
-                }
-            ],
+        return await get_upstream().complete(
+            messages=_chat_messages(query),
             model=GROQ_MODEL,
             temperature=TEMPERATURE_CLEAN,
             max_tokens=MAX_TOKENS,
-            top_p=0.9,
-            stream=False,
+            top_p=TOP_P,
         )
-        response_text = res.choices[0].message.content.strip()
-        return response_text
     except Exception as e:
         print(f"❌ Error in get_clean_response: {e}")
         raise
 
 
-async def get_noisy_response(query: str) -> Tuple[str, str]:
+async def stream_clean_response(query: str) -> AsyncIterator[str]:
+    """Same completion as get_clean_response(), yielded as it is generated"""
+    async for chunk in get_upstream().stream(
+        messages=_chat_messages(query),
+        model=GROQ_MODEL,
+        temperature=TEMPERATURE_CLEAN,
+        max_tokens=MAX_TOKENS,
+        top_p=TOP_P,
+    ):
+        yield chunk
+
+
+class NoiseStage(NamedTuple):
+    name: str
+    fn: Callable  # fn(text, rng=...) -> str
+    probability: float
+
+
+class NoisePipeline:
+    """
+    Ordered noise stages, each applied with its own probability.
+    
+    Every random decision (which stages fire and everything inside them)
+    comes from one random.Random seeded per request, so the same clean text,
+    seed and NLTK resources always give the same noisy text, and the
+    pipeline holds no shared state, so it can run in any worker process.
+    """
+
+    def __init__(self, stages: List[NoiseStage]):
+        self.stages = list(stages)
+
+    def run(self, clean: str, seed: Optional[int] = None) -> str:
+        rng = random.Random(seed)
+        noisy = clean
+        for stage in self.stages:
+            if stage.probability >= 1.0 or rng.random() < stage.probability:
+                noisy = stage.fn(noisy, rng=rng)
+                print(f"   ✏️  Applied: {stage.name}")
+        
+        # Final check: ensure noisy is actually different
+        if noisy.strip() == clean.strip():
+            print(f"   ⚠️  Noisy text same as clean, forcing difference...")
+            noisy = add_aggressive_synonym_noise(clean, rng=rng)
+            if noisy.strip() == clean.strip():
+                noisy = add_prefix_suffix(clean, rng=rng)
+        return noisy
+
+
+NOISE_PIPELINE = NoisePipeline([
+    # Always apply aggressive synonym replacement
+    NoiseStage("add_aggressive_synonym_noise", add_aggressive_synonym_noise, 1.0),
+    NoiseStage("add_aggressive_expansion", add_aggressive_expansion, 0.5),
+    NoiseStage("add_restructuring", add_restructuring, 0.3),
+    NoiseStage("add_prefix_suffix", add_prefix_suffix, 0.5),
+])
+
+
+def perturb_response_seeded(clean: str, seed: Optional[int] = None) -> Tuple[str, str]:
     """
-    Get clean response then apply AGGRESSIVE noise functions.
-    Returns (clean_text, noisy_text) - VISIBLY DIFFERENT.
+    Apply AGGRESSIVE noise functions to an existing clean completion.
+    Returns (noisy_text, pipeline) where pipeline names the path used:
+    "full" (NOISE_PIPELINE) or "fast" (perturb_response_fast, used until
+    the startup warmup has loaded NLTK, or if the full pipeline fails).
+    Together with the seed this is enough to reproduce the output.
     
     The noisy version is what suspicious/malicious users see.
     Noise functions applied:
@@ -260,47 +379,145 @@ async def get_noisy_response(query: str) -> Tuple[str, str]:
     3. Sentence restructuring
     4. Prefix/suffix addition
     """
-    clean = await get_clean_response(query)
+    if not nlp_ready():
+        print(f"   ⏳ NLP warmup in progress, applying fast perturbation")
+        return perturb_response_fast(clean, rng=random.Random(seed)), "fast"
     
     try:
-        # Apply multiple noise functions for VISIBLE differences
-        noisy = clean
-        
-        # Always apply aggressive synonym replacement
-        noisy = add_aggressive_synonym_noise(noisy)
-        print(f"   ✏️  Applied: add_aggressive_synonym_noise")
-        
-        # Apply expansion (20% chance to make it visibly longer/different)
-        if random.random() < 0.5:
-            noisy = add_aggressive_expansion(noisy)
-            print(f"   📝 Applied: add_aggressive_expansion")
-        
-        # Apply restructuring (30% chance)
-        if random.random() < 0.3:
-            noisy = add_restructuring(noisy)
-            print(f"   🔀 Applied: add_restructuring")
-        
-        # Apply prefix/suffix (50% chance)
-        if random.random() < 0.5:
-            noisy = add_prefix_suffix(noisy)
-            print(f"   ➕ Applied: add_prefix_suffix")
-        
-        # Final check: ensure noisy is actually different
-        if noisy.strip() == clean.strip():
-            print(f"   ⚠️  Noisy text same as clean, forcing difference...")
-            noisy = add_aggressive_synonym_noise(clean)
-            if noisy.strip() == clean.strip():
-                noisy = add_prefix_suffix(clean)
-        
+        noisy = NOISE_PIPELINE.run(clean, seed)
         print(f"\n   📊 Clean length: {len(clean)} chars")
         print(f"   📊 Noisy length: {len(noisy)} chars")
-        
-        return clean, noisy
+        return noisy, "full"
         
     except Exception as e:
-        print(f"❌ Error in get_noisy_response: {e}")
-        # Fallback: at least apply aggressive changes
-        noisy = add_aggressive_synonym_noise(clean)
-        if noisy.strip() == clean.strip():
-            noisy = add_prefix_suffix(clean)
-        return clean, noisy
\ No newline at end of file
+        print(f"❌ Error in perturb_response_seeded: {e}")
+        # Fallback: at least apply visible changes
+        return perturb_response_fast(clean, rng=random.Random(seed)), "fast"
+
+
+def reproduce_perturbation(clean: str, seed: int, pipeline: str) -> str:
+    """
+    Recompute a logged perturbation from its clean text, noise_seed and
+    noise_pipeline. "full" and "stream" need the same NLTK data as the
+    server that served it and raise NoiseModelUnavailable until it is
+    loaded; synonym candidates are ordered the same with or without the
+    synonym index (see synonyms.build_wordnet_index).
+    """
+    if pipeline in ("full", "stream") and not nlp_ready():
+        raise NoiseModelUnavailable("noise model unavailable: NLTK resources are not loaded yet")
+    try:
+        if pipeline == "full":
+            return NOISE_PIPELINE.run(clean, seed)
+        if pipeline == "fast":
+            return perturb_response_fast(clean, rng=random.Random(seed))
+        if pipeline in ("stream", "stream-fast"):
+            noiser = SentenceStreamNoiser(seed, fast=pipeline == "stream-fast")
+            return (noiser.feed(clean) + noiser.flush()).strip()
+    except LookupError as e:
+        # An NLTK data package is missing
+        raise NoiseModelUnavailable(f"noise model unavailable: {e}") from e
+    raise ValueError(f"Unknown noise pipeline '{pipeline}'")
+
+
+# ============================================================================
+# Streaming Perturbation
+# ============================================================================
+
+# End of a sentence: terminal punctuation, optional closing quote/bracket, whitespace
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+
+class SentenceStreamNoiser:
+    """
+    Incremental perturbation for streamed Tier 2/3 completions.
+    
+    Chunks are buffered until a sentence boundary, then each complete
+    sentence gets synonym noise (WordNet once warmup is done, the manual map
+    before that) and the first one may get a prefix. Expansion and
+    restructuring need the whole answer, so they are not applied here. The
+    stream always ends with a suffix if nothing else changed.
+    
+    Seeded like NoisePipeline; output depends only on the concatenated text,
+    not on how it was chunked. The path is fixed at construction (`fast`
+    defaults to "NLTK not loaded yet") and reported as `pipeline`.
+    
+    feed()/flush() noise inline. The server splits instead (take_sentences,
+    take_tail, finish) and noises each sentence off the event loop through
+    noise_pool, carrying the seeded state across with state()/load_state(),
+    which gives the same output.
+    """
+
+    def __init__(self, seed: Optional[int] = None, fast: Optional[bool] = None):
+        self._rng = random.Random(seed)
+        self.fast = not nlp_ready() if fast is None else fast
+        self.pipeline = "stream-fast" if self.fast else "stream"
+        self._buffer = ""
+        self._first = True
+        self.changed = False
+
+    def state(self) -> tuple:
+        """Everything noise_sentence() reads or advances (picklable)"""
+        return self._rng.getstate(), self._first, self.changed, self.fast
+
+    def load_state(self, state: tuple):
+        rng_state, self._first, self.changed, self.fast = state
+        self._rng.setstate(rng_state)
+
+    def noise_sentence(self, sentence: str) -> str:
+        try:
+            if self.fast:
+                noisy = swap_manual_synonyms(sentence, rng=self._rng)
+            else:
+                noisy = add_aggressive_synonym_noise(sentence, pad=False, rng=self._rng)
+        except Exception as e:
+            print(f"❌ Error in SentenceStreamNoiser: {e}")
+            noisy = swap_manual_synonyms(sentence, rng=self._rng)
+
+        if self._first:
+            self._first = False
+            if self._rng.random() < 0.5:
+                noisy = self._rng.choice(NOISE_PREFIXES) + noisy
+        if noisy != sentence:
+            self.changed = True
+        return noisy
+
+    def take_sentences(self, chunk: str) -> List[str]:
+        """Add upstream text; returns the sentences it completed, not yet noised"""
+        self._buffer += chunk
+        sentences = []
+        while True:
+            match = _SENTENCE_END.search(self._buffer)
+            if match is None:
+                break
+            sentences.append(self._buffer[:match.end()].strip())
+            self._buffer = self._buffer[match.end():]
+        return sentences
+
+    def take_tail(self) -> str:
+        """Whatever is left once the upstream stream has ended, not yet noised"""
+        tail = self._buffer.strip()
+        self._buffer = ""
+        return tail
+
+    def finish(self, noisy_tail: str) -> str:
+        """Final output: the noised tail, plus a suffix if nothing changed (or at random)"""
+        if not self.changed or self._rng.random() < 0.5:
+            noisy_tail = (noisy_tail.rstrip() + self._rng.choice(NOISE_SUFFIXES)).lstrip()
+        return noisy_tail
+
+    def feed(self, chunk: str) -> str:
+        """Add upstream text; returns the noised sentences it completed (may be empty)"""
+        return "".join(self.noise_sentence(sentence) + " " for sentence in self.take_sentences(chunk))
+
+    def flush(self) -> str:
+        """Noise whatever is left once the upstream stream has ended"""
+        tail = self.take_tail()
+        return self.finish(self.noise_sentence(tail) if tail else "")
+
+
+def noise_stream_sentence(state: tuple, sentence: str) -> Tuple[str, tuple]:
+    """Worker-process entry point: noise one sentence from a SentenceStreamNoiser state"""
+    noiser = SentenceStreamNoiser(fast=state[3])
+    noiser.load_state(state)
+    noisy = noiser.noise_sentence(sentence)
+    return noisy, noiser.state()
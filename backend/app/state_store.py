@@ -0,0 +1,218 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from database import load_user_state, new_user_state, run_db, save_user_rows, state_to_row
+
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_S = float(os.getenv("USER_CACHE_TTL_S", "1800"))
+USER_FLUSH_INTERVAL_S = float(os.getenv("USER_FLUSH_INTERVAL_S", "2.0"))
+USER_FLUSH_THRESHOLD = int(os.getenv("USER_FLUSH_THRESHOLD", "500"))
+
+
+class UserStateStore:
+    """
+    In-process user-state cache in front of the `users` table.
+
+    Reads are served from RAM; a miss loads the row once (concurrent misses
+    for the same user share one load). Updates mark the entry dirty and a
+    background task flushes dirty states to SQLite in batches, either every
+    USER_FLUSH_INTERVAL_S or as soon as USER_FLUSH_THRESHOLD users are dirty.
+    Entries are evicted LRU beyond USER_CACHE_MAX_ENTRIES or after
+    USER_CACHE_TTL_S idle; dirty entries are flushed before they are dropped.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = USER_CACHE_MAX_ENTRIES,
+        ttl_s: float = USER_CACHE_TTL_S,
+        flush_interval_s: float = USER_FLUSH_INTERVAL_S,
+        flush_threshold: int = USER_FLUSH_THRESHOLD
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.flush_interval_s = flush_interval_s
+        self.flush_threshold = flush_threshold
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._dirty: set = set()
+        # Dirty states evicted from the LRU, kept readable until flushed
+        self._pending: Dict[str, Dict] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+
+        # Users whose rows are being written right now
+        self._flushing: set = set()
+
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.flushed_rows = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and write every dirty state"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    # ------------------------------------------------------------------
+    # Reads / writes
+    # ------------------------------------------------------------------
+
+    async def get(self, user_id: str) -> Dict:
+        """Return the live state dict for a user, loading it on a miss"""
+        state = self._entries.get(user_id)
+        if state is not None:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            self._last_access[user_id] = time.monotonic()
+            return state
+
+        if user_id in self._pending:
+            self.hits += 1
+            state = self._pending.pop(user_id)
+            self._insert(user_id, state)
+            return state
+
+        if user_id in self._loading:
+            return await asyncio.shield(self._loading[user_id])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            state = await run_db(load_user_state, user_id)
+            if state is None:
+                # New user: the row is created by the next flush
+                state = new_user_state(user_id)
+                self._dirty.add(user_id)
+            self._insert(user_id, state)
+            future.set_result(state)
+            return state
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a lone loader doesn't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._loading[user_id]
+
+    def update(self, state: Dict, updates: Dict) -> Dict:
+        """
+        Apply updates to a state returned by get() and schedule a flush.
+        If the entry was evicted while the caller held it, it is re-admitted.
+        """
+        user_id = state["user_id"]
+        state.update(updates)
+        if self._entries.get(user_id) is state:
+            self._entries.move_to_end(user_id)
+        else:
+            self._pending.pop(user_id, None)
+            self._insert(user_id, state)
+        self._dirty.add(user_id)
+        if len(self._dirty) >= self.flush_threshold:
+            self._flush_wakeup.set()
+        return state
+
+    def _insert(self, user_id: str, state: Dict):
+        self._entries[user_id] = state
+        self._entries.move_to_end(user_id)
+        self._last_access[user_id] = time.monotonic()
+        while len(self._entries) > self.max_entries:
+            oldest, _ = next(iter(self._entries.items()))
+            self._evict(oldest)
+
+    def _evict(self, user_id: str):
+        state = self._entries.pop(user_id)
+        self._last_access.pop(user_id, None)
+        if user_id in self._dirty or user_id in self._flushing:
+            self._pending[user_id] = state
+            self._flush_wakeup.set()
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl_s
+        # _entries is in LRU order, so stop at the first fresh entry
+        while self._entries:
+            user_id = next(iter(self._entries))
+            if self._last_access.get(user_id, 0.0) > cutoff:
+                break
+            self._evict(user_id)
+
+    # ------------------------------------------------------------------
+    # Write-behind flushing
+    # ------------------------------------------------------------------
+
+    async def flush(self):
+        """Write all dirty states to SQLite in one batch"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            user_ids = list(self._dirty)
+            self._dirty.clear()
+            self._flushing.update(user_ids)
+
+            # Serialize on the loop thread so the writer thread never sees a
+            # state dict that is being mutated by a request
+            rows = []
+            flushed_pending = {}
+            for uid in user_ids:
+                state = self._entries.get(uid)
+                if state is None and uid in self._pending:
+                    state = flushed_pending[uid] = self._pending[uid]
+                if state is not None:
+                    rows.append(state_to_row(state))
+
+            try:
+                await run_db(save_user_rows, rows)
+                self.flushed_rows += len(rows)
+            except Exception as e:
+                print(f"❌ User state flush failed ({len(rows)} rows): {e}")
+                self._dirty.update(user_ids)
+                return
+            finally:
+                self._flushing.difference_update(user_ids)
+
+            # Evicted states stay readable until their row is durable
+            for uid, state in flushed_pending.items():
+                if self._pending.get(uid) is state and uid not in self._dirty:
+                    del self._pending[uid]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            self._evict_expired()
+            await self.flush()
+
+    def metrics(self) -> Dict:
+        return {
+            "cached_users": len(self._entries),
+            "dirty_users": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushed_rows": self.flushed_rows
+        }
+
+
+user_store = UserStateStore()
@@ -0,0 +1,207 @@
+import gzip
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+
+SYNONYM_INDEX_PATH = os.getenv("SYNONYM_INDEX_PATH", "synonym_index.json.gz")
+SYNONYM_MISS_CACHE_SIZE = int(os.getenv("SYNONYM_MISS_CACHE_SIZE", "8192"))
+
+# 2: candidates sorted (see build_wordnet_index)
+SYNONYM_INDEX_VERSION = 2
+# WordNet POS tags used as index sections (adjective satellites "s" fold into "a")
+WORDNET_POS = ("n", "v", "a", "r")
+
+# Words never replaced by the synonym stage
+STOPWORDS = frozenset({
+    "the", "a", "an", "and", "or", "but", "is", "are", "was", "were",
+    "be", "been", "in", "on", "at", "to", "for", "with", "of", "by",
+    "i", "you", "he", "she", "it", "we", "they", "that", "this",
+    "as", "if", "so", "not", "have", "has", "do", "does", "can", "will"
+})
+
+# Common word mappings to ensure replacement (checked before WordNet, any POS)
+SYNONYM_MAP = {
+    "name": ["designation", "identifier", "label", "title"],
+    "personal": ["individual", "private", "own"],
+    "assistant": ["helper", "aid", "support", "companion"],
+    "model": ["system", "framework", "architecture"],
+    "chatbot": ["conversational agent", "dialogue system", "bot"],
+    "referred": ["called", "named", "known", "termed"],
+    "don't": ["do not", "don't possess", "lack"],
+    "have": ["possess", "own", "contain"],
+    "provide": ["offer", "give", "deliver", "furnish"],
+}
+
+
+def _wordnet():
+    """The NLTK WordNet reader, or None if NLTK or its corpus is unavailable"""
+    try:
+        from nltk.corpus import wordnet
+        wordnet.ensure_loaded()
+        return wordnet
+    except (ImportError, LookupError):
+        return None
+
+
+def build_wordnet_index(wordnet) -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    """
+    Invert WordNet once: for every single-word lemma and POS, the distinct
+    lemma names of all synsets it belongs to (excluding itself), with
+    underscores as spaces, sorted. The live fallback (_wordnet_candidates)
+    returns the same sorted tuple for these words, so a seeded noise run
+    picks the same replacements whether or not the index is loaded.
+    """
+    index: Dict[str, Dict[str, list]] = {pos: {} for pos in WORDNET_POS}
+    for synset in wordnet.all_synsets():
+        pos = "a" if synset.pos() == "s" else synset.pos()
+        names = [lemma.name() for lemma in synset.lemmas()]
+        for name in names:
+            key = name.lower()
+            if "_" in key:
+                # Tokens never contain spaces, so multi-word keys can't be looked up
+                continue
+            bucket = index[pos].setdefault(key, [])
+            bucket.extend(other.replace("_", " ") for other in names if other.lower() != key)
+
+    return {
+        pos: {word: tuple(sorted(set(candidates))) for word, candidates in section.items() if candidates}
+        for pos, section in index.items()
+    }
+
+
+def save_index(index: Dict[str, Dict[str, Tuple[str, ...]]], path: str = SYNONYM_INDEX_PATH):
+    payload = {"version": SYNONYM_INDEX_VERSION, "wordnet": index}
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def read_index(path: str = SYNONYM_INDEX_PATH) -> Optional[Dict[str, Dict[str, Tuple[str, ...]]]]:
+    """Load a saved index; None if it is missing or from another index version"""
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        payload = json.load(f)
+    if payload.get("version") != SYNONYM_INDEX_VERSION:
+        return None
+    return {
+        pos: {word: tuple(candidates) for word, candidates in section.items()}
+        for pos, section in payload["wordnet"].items()
+    }
+
+
+@lru_cache(maxsize=SYNONYM_MISS_CACHE_SIZE)
+def _wordnet_candidates(word: str, pos: str) -> Tuple[str, ...]:
+    """
+    Live WordNet lookup for words the index lacks (inflections like
+    "running"), sorted like the index. For a word that is itself a lemma
+    only the synsets naming it count, exactly as in build_wordnet_index;
+    synsets() would add those of its base forms too.
+    """
+    wordnet = _wordnet()
+    if wordnet is None:
+        return ()
+    try:
+        synsets = wordnet.synsets(word, pos=pos)
+    except Exception:
+        return ()
+    own = [synset for synset in synsets if any(lemma.name().lower() == word for lemma in synset.lemmas())]
+    candidates = {
+        lemma.name().replace("_", " ")
+        for synset in own or synsets
+        for lemma in synset.lemmas()
+        if lemma.name().lower() != word
+    }
+    return tuple(sorted(candidates))
+
+
+class SynonymIndex:
+    """
+    (lemma, POS) -> replacement candidates for the noise engine.
+
+    Built once from WordNet, saved to SYNONYM_INDEX_PATH (gzipped JSON) and
+    loaded by the startup warmup, so a lookup is a dict hit instead of a
+    synsets() walk. The manual SYNONYM_MAP is applied on top at lookup time,
+    so editing it needs no rebuild. Words missing from the index (mostly
+    inflected forms, which WordNet lemmatizes) fall back to a live lookup
+    behind an LRU of SYNONYM_MISS_CACHE_SIZE entries.
+    """
+
+    def __init__(self, path: str = SYNONYM_INDEX_PATH):
+        self.path = path
+        self._index: Optional[Dict[str, Dict[str, Tuple[str, ...]]]] = None
+        self._manual = {word: tuple(choices) for word, choices in SYNONYM_MAP.items()}
+        self.source = None
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> dict:
+        """
+        Read the saved index, or build and save it if there is none.
+        Blocking (building takes several seconds): run it in a worker thread.
+        """
+        started = time.perf_counter()
+        index = read_index(self.path)
+        if index is not None:
+            self.source = "disk"
+        else:
+            wordnet = _wordnet()
+            if wordnet is None:
+                raise RuntimeError("no saved synonym index and WordNet is unavailable")
+            index = build_wordnet_index(wordnet)
+            self.source = "built"
+            try:
+                save_index(index, self.path)
+            except OSError as e:
+                print(f"⚠️  Could not save synonym index to {self.path}: {e}")
+
+        self._index = index
+        entries = sum(len(section) for section in index.values())
+        load_ms = round(1000 * (time.perf_counter() - started), 1)
+        print(f"✅ Synonym index ready: {entries} entries ({self.source}, {load_ms:.0f} ms)")
+        return {"source": self.source, "entries": entries}
+
+    def candidates(self, word: str, pos: Optional[str]) -> Tuple[str, ...]:
+        """Replacement candidates for a lowercased word; pos is a WordNet tag or None"""
+        manual = self._manual.get(word)
+        if manual is not None:
+            return manual
+        if pos is None:
+            return ()
+        if self._index is not None:
+            found = self._index.get(pos, {}).get(word)
+            if found is not None:
+                self.hits += 1
+                return found
+        self.misses += 1
+        return _wordnet_candidates(word, pos)
+
+    def metrics(self) -> dict:
+        if self._index is None:
+            return {"loaded": False, "misses": self.misses}
+        info = _wordnet_candidates.cache_info()
+        return {
+            "loaded": True,
+            "source": self.source,
+            "entries": sum(len(section) for section in self._index.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "miss_cache": {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+        }
+
+
+synonym_index = SynonymIndex()
+
+
+if __name__ == "__main__":
+    # Prebuild the index (e.g. in a Docker build step) so startup only reads it
+    wordnet = _wordnet()
+    if wordnet is None:
+        raise SystemExit("WordNet is unavailable: run nltk.download('wordnet') first")
+    started = time.perf_counter()
+    save_index(build_wordnet_index(wordnet))
+    print(f"✅ Wrote {SYNONYM_INDEX_PATH} in {time.perf_counter() - started:.1f}s")
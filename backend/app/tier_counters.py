@@ -0,0 +1,59 @@
+import time
+from typing import Dict, Optional
+
+from database import get_tier_counts
+
+
+class TierCounters:
+    """
+    Users per tier, kept in memory for /admin/stats.
+
+    Seeded from one GROUP BY over `users` at startup, then moved by every
+    tier transition in assess_request() (under the user's lock), so reading
+    the dashboard numbers never touches SQLite. The counters follow the
+    cached user states, which are flushed to SQLite shortly after.
+    """
+
+    TIERS = (1, 2, 3)
+
+    def __init__(self):
+        self._by_tier: Dict[int, int] = {tier: 0 for tier in self.TIERS}
+        self.reconciled_at: Optional[float] = None
+        self.transitions = 0
+
+    async def reconcile(self):
+        """Reset the counters from the users table"""
+        counts = await get_tier_counts()
+        self._by_tier = {tier: 0 for tier in self.TIERS}
+        self._by_tier.update(counts["by_tier"])
+        self.reconciled_at = time.time()
+
+    def record(self, old_tier: Optional[int], new_tier: int) -> bool:
+        """
+        Count one request's tier; old_tier is None for a user not counted
+        yet (no users row existed when the state was loaded). Returns True
+        if the counts changed.
+        """
+        if old_tier == new_tier:
+            return False
+        if old_tier is not None:
+            self._by_tier[old_tier] = self._by_tier.get(old_tier, 0) - 1
+            self.transitions += 1
+        self._by_tier[new_tier] = self._by_tier.get(new_tier, 0) + 1
+        return True
+
+    def snapshot(self) -> Dict:
+        return {
+            "total": sum(self._by_tier.values()),
+            "by_tier": dict(self._by_tier)
+        }
+
+    def metrics(self) -> Dict:
+        return {
+            **self.snapshot(),
+            "transitions": self.transitions,
+            "reconciled_at": self.reconciled_at
+        }
+
+
+tier_counters = TierCounters()
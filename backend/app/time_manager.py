@@ -1,5 +1,8 @@
+import os
 from datetime import datetime, timezone
 
+import numpy as np
+
 
 def calculate_duration(first_seen_at: datetime, last_active_at: datetime) -> float:
     """
@@ -26,3 +29,81 @@ def calculate_duration(first_seen_at: datetime, last_active_at: datetime) -> flo
     
     return max(0.0, duration_minutes)  # Prevent negative durations
 
+
+# ============================================================================
+# Per-user Query Timestamp Ring Buffer
+# ============================================================================
+
+QUERY_TIMESTAMP_CAPACITY = int(os.getenv("QUERY_TIMESTAMP_CAPACITY", "50"))
+
+
+class TimestampRing:
+    """
+    Fixed-capacity ring buffer of query times as epoch seconds (float64).
+    
+    Appends are O(1) and overwrite the oldest entry once full. Timestamps are
+    appended in arrival order, so the logical sequence is sorted and window
+    queries use binary search. Persisted as a compact BLOB (8 bytes/entry).
+    """
+
+    __slots__ = ("capacity", "_buf", "_start", "_count")
+
+    def __init__(self, capacity: int = QUERY_TIMESTAMP_CAPACITY):
+        self.capacity = capacity
+        self._buf = np.zeros(capacity, dtype=np.float64)
+        self._start = 0
+        self._count = 0
+
+    def append(self, ts):
+        """Add a datetime or epoch-seconds float"""
+        if isinstance(ts, datetime):
+            ts = ts.timestamp()
+        end = (self._start + self._count) % self.capacity
+        self._buf[end] = ts
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> float:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("TimestampRing index out of range")
+        return float(self._buf[(self._start + i) % self.capacity])
+
+    def bisect_left(self, ts: float) -> int:
+        """Logical index of the first entry >= ts"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._buf[(self._start + mid) % self.capacity] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def to_array(self) -> np.ndarray:
+        """Entries oldest-first as a new float64 array"""
+        end = self._start + self._count
+        if end <= self.capacity:
+            return self._buf[self._start:end].copy()
+        return np.concatenate((self._buf[self._start:], self._buf[:end - self.capacity]))
+
+    def to_bytes(self) -> bytes:
+        return self.to_array().astype("<f8", copy=False).tobytes()
+
+    @classmethod
+    def from_array(cls, values, capacity: int = QUERY_TIMESTAMP_CAPACITY) -> "TimestampRing":
+        ring = cls(capacity)
+        values = np.asarray(values, dtype=np.float64)[-capacity:]
+        ring._buf[:len(values)] = values
+        ring._count = len(values)
+        return ring
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int = QUERY_TIMESTAMP_CAPACITY) -> "TimestampRing":
+        return cls.from_array(np.frombuffer(data, dtype="<f8"), capacity)
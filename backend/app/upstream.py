@@ -0,0 +1,301 @@
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import os
+import random
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+load_dotenv()
+
+UPSTREAM_BACKEND = os.getenv("UPSTREAM_BACKEND", "groq")
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "16"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", str(UPSTREAM_MAX_IN_FLIGHT)))
+UPSTREAM_TIMEOUT_S = float(os.getenv("UPSTREAM_TIMEOUT_S", "30"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE_S = float(os.getenv("UPSTREAM_BACKOFF_BASE_S", "0.5"))
+UPSTREAM_BACKOFF_MAX_S = float(os.getenv("UPSTREAM_BACKOFF_MAX_S", "8"))
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+
+
+class UpstreamError(Exception):
+    """Raised by backends; `retryable` tells the client whether to back off and retry."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+class UpstreamBackend:
+    """
+    Interface for LLM completion providers.
+    Implementations must be safe to call concurrently from the event loop.
+    """
+
+    name = "base"
+
+    async def complete(self, messages: List[Dict], *, model: str, temperature: float,
+                       max_tokens: int, top_p: float) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict], *, model: str, temperature: float,
+                     max_tokens: int, top_p: float) -> AsyncIterator[str]:
+        """Yield the completion in text chunks; defaults to one chunk from complete()."""
+        yield await self.complete(messages, model=model, temperature=temperature,
+                                  max_tokens=max_tokens, top_p=top_p)
+
+    async def aclose(self):
+        pass
+
+
+class GroqBackend(UpstreamBackend):
+    """Groq chat completions over one shared, pooled HTTP connection."""
+
+    name = "groq"
+
+    def __init__(self):
+        from groq import AsyncGroq
+
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_CONNECTIONS,
+            ),
+            timeout=UPSTREAM_TIMEOUT_S,
+        )
+        # Retries are handled by UpstreamClient so they respect the semaphore
+        self._client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=self._http,
+            max_retries=0,
+            timeout=UPSTREAM_TIMEOUT_S,
+        )
+
+    @staticmethod
+    def _error(e: Exception) -> Optional[UpstreamError]:
+        """Map a Groq/httpx exception to UpstreamError (None if it isn't one)"""
+        import groq
+
+        if isinstance(e, groq.APIStatusError):
+            status = e.status_code
+            retry_after = None
+            try:
+                retry_after = float(e.response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+            return UpstreamError(
+                f"Groq returned HTTP {status}",
+                status_code=status,
+                retryable=status == 429 or status >= 500,
+                retry_after=retry_after,
+            )
+        if isinstance(e, (groq.APIConnectionError, httpx.TransportError)):
+            # APITimeoutError is a subclass of APIConnectionError
+            return UpstreamError(f"Groq connection error: {e}", retryable=True)
+        return None
+
+    async def complete(self, messages, *, model, temperature, max_tokens, top_p):
+        try:
+            res = await self._client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+                stream=False,
+            )
+        except Exception as e:
+            error = self._error(e)
+            if error is None:
+                raise
+            raise error from e
+
+        return res.choices[0].message.content.strip()
+
+    async def stream(self, messages, *, model, temperature, max_tokens, top_p):
+        try:
+            chunks = await self._client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+                stream=True,
+            )
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            error = self._error(e)
+            if error is None:
+                raise
+            raise error from e
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class StubBackend(UpstreamBackend):
+    """
+    Local stand-in for tests and benchmarks.
+    Deterministic output per prompt, optional artificial latency (STUB_LATENCY_MS).
+    """
+
+    name = "stub"
+
+    @staticmethod
+    def _answer(messages) -> str:
+        prompt = messages[-1]["content"] if messages else ""
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return (
+            f"This is a stub answer to your question about {prompt.strip()[:80]}. "
+            f"The stub backend provides deterministic responses for testing. "
+            f"Reference code {digest}."
+        )
+
+    async def complete(self, messages, *, model, temperature, max_tokens, top_p):
+        if STUB_LATENCY_MS > 0:
+            await asyncio.sleep(STUB_LATENCY_MS / 1000.0)
+        return self._answer(messages)
+
+    async def stream(self, messages, *, model, temperature, max_tokens, top_p):
+        # Word-sized chunks, with STUB_LATENCY_MS spread across the stream
+        words = self._answer(messages).split(" ")
+        for i, word in enumerate(words):
+            if STUB_LATENCY_MS > 0:
+                await asyncio.sleep(STUB_LATENCY_MS / 1000.0 / len(words))
+            yield word if i == 0 else " " + word
+
+
+_BACKENDS: Dict[str, Callable[[], UpstreamBackend]] = {
+    "groq": GroqBackend,
+    "stub": StubBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], UpstreamBackend]):
+    """Register an additional upstream backend selectable via UPSTREAM_BACKEND."""
+    _BACKENDS[name] = factory
+
+
+# ============================================================================
+# Client: concurrency limit, timeouts, retry with jittered backoff
+# ============================================================================
+
+class UpstreamClient:
+    def __init__(self, backend: UpstreamBackend):
+        self.backend = backend
+        self._semaphore = asyncio.Semaphore(UPSTREAM_MAX_IN_FLIGHT)
+        self.in_flight = 0
+        self.retries = 0
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter: uniform(0, min(cap, base * 2^attempt))
+        delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX_S, UPSTREAM_BACKOFF_BASE_S * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, min(retry_after, UPSTREAM_BACKOFF_MAX_S))
+        return delay
+
+    async def complete(self, messages: List[Dict], **params) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    try:
+                        return await asyncio.wait_for(
+                            self.backend.complete(messages, **params),
+                            timeout=UPSTREAM_TIMEOUT_S,
+                        )
+                    finally:
+                        self.in_flight -= 1
+            except asyncio.TimeoutError:
+                error = UpstreamError(f"Upstream timed out after {UPSTREAM_TIMEOUT_S}s", retryable=True)
+            except UpstreamError as e:
+                error = e
+
+            if not error.retryable or attempt >= UPSTREAM_MAX_RETRIES:
+                raise error
+
+            # Sleep outside the semaphore so waiting retries don't hold a slot
+            delay = self._backoff(attempt, error.retry_after)
+            attempt += 1
+            self.retries += 1
+            print(f"⚠️  Upstream retry {attempt}/{UPSTREAM_MAX_RETRIES} in {delay:.2f}s: {error}")
+            await asyncio.sleep(delay)
+
+    async def stream(self, messages: List[Dict], **params) -> AsyncIterator[str]:
+        """
+        Stream a completion. Holds a semaphore slot until the stream ends;
+        UPSTREAM_TIMEOUT_S applies to each chunk. Failures before the first
+        chunk are retried like complete(); once text has been yielded they
+        are raised to the caller.
+        """
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    chunks = self.backend.stream(messages, **params)
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=UPSTREAM_TIMEOUT_S)
+                            except StopAsyncIteration:
+                                return
+                            started = True
+                            yield chunk
+                    finally:
+                        self.in_flight -= 1
+                        await chunks.aclose()
+            except asyncio.TimeoutError:
+                error = UpstreamError(f"Upstream stream stalled for {UPSTREAM_TIMEOUT_S}s", retryable=True)
+            except UpstreamError as e:
+                error = e
+
+            if started or not error.retryable or attempt >= UPSTREAM_MAX_RETRIES:
+                raise error
+
+            delay = self._backoff(attempt, error.retry_after)
+            attempt += 1
+            self.retries += 1
+            print(f"⚠️  Upstream stream retry {attempt}/{UPSTREAM_MAX_RETRIES} in {delay:.2f}s: {error}")
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+
+_client: Optional[UpstreamClient] = None
+# The startup warmup may create the client from a worker thread
+_client_lock = threading.Lock()
+
+
+def get_upstream() -> UpstreamClient:
+    """Return the shared upstream client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if UPSTREAM_BACKEND not in _BACKENDS:
+                    raise ValueError(f"Unknown UPSTREAM_BACKEND '{UPSTREAM_BACKEND}' (known: {', '.join(_BACKENDS)})")
+                _client = UpstreamClient(_BACKENDS[UPSTREAM_BACKEND]())
+                print(f"✅ Upstream backend: {UPSTREAM_BACKEND}")
+    return _client
+
+
+async def close_upstream():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
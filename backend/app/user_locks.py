@@ -0,0 +1,68 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+
+class KeyedLockTable:
+    """
+    One asyncio.Lock per key (X-User-ID), created on demand.
+
+    Each entry is reference-counted by its holder and waiters and removed as
+    soon as the last one leaves, so the table only ever holds keys with a
+    request in flight. Different keys never contend.
+    """
+
+    def __init__(self):
+        # key -> [lock, holders + waiters]
+        self._locks: Dict[str, List] = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        lock = entry[0]
+        contended = lock.locked()
+        started = time.perf_counter()
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._release_ref(key, entry)
+            raise
+
+        waited = time.perf_counter() - started
+        self.acquisitions += 1
+        if contended:
+            self.contended += 1
+            self._wait_total_s += waited
+            self._wait_max_s = max(self._wait_max_s, waited)
+        try:
+            yield
+        finally:
+            lock.release()
+            self._release_ref(key, entry)
+
+    def _release_ref(self, key: str, entry: List):
+        entry[1] -= 1
+        if entry[1] == 0 and self._locks.get(key) is entry:
+            del self._locks[key]
+
+    def metrics(self) -> Dict:
+        return {
+            "active_keys": len(self._locks),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_avg_ms": round(1000 * self._wait_total_s / self.contended, 3) if self.contended else 0.0,
+            "wait_max_ms": round(1000 * self._wait_max_s, 3)
+        }
+
+
+# Serializes each user's state read-modify-write in handle_query
+user_locks = KeyedLockTable()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+# Reference point for cold-start timings; main imports this module first
+PROCESS_START = time.perf_counter()
+
+# Also load the embedding backend during warmup (seconds for onnx-minilm).
+# With 0 the load starts in the background on the first request; prompts
+# are embedded by the hash embedder until it is ready.
+WARMUP_EMBEDDER = os.getenv("WARMUP_EMBEDDER", "1") == "1"
+
+
+def _elapsed_ms(since: float) -> float:
+    return round(1000 * (time.perf_counter() - since), 1)
+
+
+class Warmup:
+    """
+    Explicit startup phase for slow, lazily loaded resources.
+
+    startup_event only schedules it, so the server accepts requests right
+    away; NLTK data, the WordNet corpus, the POS tagger, the upstream client
+    and the embedding backend are then loaded concurrently off the event
+    loop. Requests that need a resource before it is ready fall back to a
+    cheap path (see security.perturb_response_fast) instead of stalling.
+    Progress and cold-start timings are reported by /ready.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.steps: Dict[str, Dict] = {}
+        self.startup_ms: Optional[float] = None
+        self.ready_ms: Optional[float] = None
+        self.first_request_ms: Optional[float] = None
+
+    def start(self):
+        """Call at the end of startup_event"""
+        self.startup_ms = _elapsed_ms(PROCESS_START)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_ms is not None
+
+    def mark_request(self):
+        """Record time-to-first-request (cheap enough to call on every request)"""
+        if self.first_request_ms is None:
+            self.first_request_ms = _elapsed_ms(PROCESS_START)
+
+    async def _step(self, name: str, fn, blocking: bool = True):
+        self.steps[name] = {"status": "loading"}
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.to_thread(fn) if blocking else await fn()
+            self.steps[name] = {"status": "ready", "ms": _elapsed_ms(started)}
+            if isinstance(detail, dict) and detail:
+                self.steps[name]["detail"] = detail
+        except Exception as e:
+            # Leave the fallback path in place; the service still serves
+            self.steps[name] = {"status": "failed", "ms": _elapsed_ms(started), "error": str(e)}
+            print(f"❌ Warmup step '{name}' failed: {e}")
+
+    async def _run(self):
+        from embeddings import load_embedder
+        from noise_pool import noise_pool
+        from response_cache import response_cache
+        from security import load_nlp_resources
+        from synonyms import synonym_index
+        from upstream import get_upstream
+
+        async def nlp():
+            await self._step("nltk", load_nlp_resources)
+            # Built from WordNet on first run, so it goes after the NLTK data
+            await self._step("synonyms", synonym_index.load)
+            # Workers load NLTK and read the saved index themselves
+            await self._step("noise_pool", noise_pool.start)
+
+        steps = [
+            nlp(),
+            self._step("upstream", get_upstream),
+            self._step("response_cache", response_cache.load),
+        ]
+        if WARMUP_EMBEDDER:
+            steps.append(self._step("embedder", load_embedder, blocking=False))
+        await asyncio.gather(*steps)
+
+        self.ready_ms = _elapsed_ms(PROCESS_START)
+        failed = [name for name, step in self.steps.items() if step["status"] == "failed"]
+        if failed:
+            print(f"⚠️  Warmup finished with failures ({', '.join(failed)}) after {self.ready_ms:.0f} ms")
+        else:
+            print(f"✅ Warmup complete: ready {self.ready_ms:.0f} ms after start")
+
+    def status(self) -> Dict:
+        failed = any(step["status"] == "failed" for step in self.steps.values())
+        return {
+            "ready": self.ready,
+            "status": ("degraded" if failed else "ready") if self.ready else "warming_up",
+            "startup_ms": self.startup_ms,
+            "ready_ms": self.ready_ms,
+            "first_request_ms": self.first_request_ms,
+            "steps": self.steps
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app's modules are flat and import each other by name
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+# Never let an import touch the checked-in sentinel.db or ./log_archive
+_scratch = tempfile.mkdtemp(prefix="mirage-tests-")
+os.environ.setdefault("SQLITE_DB_PATH", os.path.join(_scratch, "sentinel.db"))
+os.environ.setdefault("LOG_ARCHIVE_DIR", os.path.join(_scratch, "log_archive"))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh database and archive directory per test"""
+    import database
+    import log_archive
+
+    database.close_db_pool()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "sentinel.db"))
+    monkeypatch.setattr(log_archive, "LOG_ARCHIVE_DIR", str(tmp_path / "log_archive"))
+    database.init_database()
+    yield database
+    database.close_db_pool()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+import log_archive
+from database import (
+    get_all_logs,
+    get_log_partition,
+    insert_query_logs,
+    log_id_day,
+    query_log_row
+)
+
+DAY = "20261010"
+TIMESTAMP = "2026-10-10T10:00:00+00:00"
+# Far enough past DAY that it is archived, not within retention's reach
+NOW = datetime(2026, 10, 20, tzinfo=timezone.utc)
+
+
+def _log(query: str):
+    insert_query_logs([query_log_row("u1", query, f"clean {query}", f"served {query}", 1, 0.1, 0.0,
+                                     timestamp=TIMESTAMP)])
+
+
+def _archived_queries(path: str) -> list:
+    queries = []
+    for columns, rows in log_archive.iter_archive(path):
+        queries.extend(row[columns.index("query")] for row in rows)
+    return queries
+
+
+def _archived_ids(path: str) -> list:
+    ids = []
+    for columns, rows in log_archive.iter_archive(path):
+        ids.extend(row[columns.index("id")] for row in rows)
+    return ids
+
+
+def test_late_row_after_archive_gets_a_fresh_id(db):
+    for query in ("q1", "q2", "q3"):
+        _log(query)
+    assert log_archive.log_archiver.run_once(NOW)["archived"] == [DAY]
+    first_ids = _archived_ids(get_log_partition(DAY)["archive_path"])
+
+    # A late row reopens the archived day as a new hot partition
+    _log("late")
+    rows, _ = asyncio.run(get_all_logs(10))
+    assert [row["query"] for row in rows] == ["late"]
+    late_id = rows[0]["id"]
+    assert log_id_day(late_id) == DAY
+    assert late_id > max(first_ids)
+
+    assert log_archive.log_archiver.run_once(NOW)["archived"] == [DAY]
+    partition = get_log_partition(DAY)
+    ids = _archived_ids(partition["archive_path"])
+    assert len(ids) == len(set(ids)) == partition["row_count"] == 4
+    assert partition["max_id"] == late_id
+
+    for log_id, query in zip(ids, ("q1", "q2", "q3", "late")):
+        row = log_archive.find_archived_log(partition["archive_path"], log_id)
+        assert row["query"] == query
+
+    # A third reopen keeps counting past everything archived so far
+    _log("later")
+    rows, _ = asyncio.run(get_all_logs(10))
+    assert rows[0]["id"] > late_id
+
+
+def test_refused_drop_does_not_merge_rows_twice(db, monkeypatch):
+    _log("q1")
+    log_archive.log_archiver.run_once(NOW)
+    _log("q2")
+
+    # q3 lands after the archive read the partition, so the drop is refused
+    read = log_archive.read_log_partition
+
+    def read_then_log(day, *args):
+        yield from read(day, *args)
+        _log("q3")
+
+    monkeypatch.setattr(log_archive, "read_log_partition", read_then_log)
+    assert log_archive.log_archiver.run_once(NOW)["archived"] == []
+    partition = get_log_partition(DAY)
+    assert partition["status"] == "hot"
+    assert _archived_queries(partition["archive_path"]) == ["q1"]
+    assert os.listdir(log_archive.LOG_ARCHIVE_DIR) == [os.path.basename(partition["archive_path"])]
+
+    monkeypatch.setattr(log_archive, "read_log_partition", read)
+    assert log_archive.log_archiver.run_once(NOW)["archived"] == [DAY]
+    partition = get_log_partition(DAY)
+    assert partition["row_count"] == 3
+    assert _archived_queries(partition["archive_path"]) == ["q1", "q2", "q3"]
+    assert os.listdir(log_archive.LOG_ARCHIVE_DIR) == [os.path.basename(partition["archive_path"])]
@@ -6,6 +6,9 @@ import { fileURLToPath } from "url";
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+// Idempotency keys remembered per process; older ones are still deduped on chain
+const MAX_REMEMBERED_SUBMISSIONS = 10000;
+
 /**
  * Blockchain Integration Module
  * Handles all Web3 interactions with ThreatChain smart contract
@@ -16,6 +19,8 @@ class BlockchainService {
     this.wallet = null;
     this.contract = null;
     this.isConnected = false;
+    // threatId -> pending/settled logThreat result, for idempotent retries
+    this.submitted = new Map();
   }
 
   /**
@@ -70,21 +75,111 @@ class BlockchainService {
 
   /**
    * Log a threat to the blockchain
-   * @param {Object} threatData - Threat information
+   * @param {Object} threatData - Threat information; idempotency_key (the
+   *   backend outbox id) makes retries of the same event return the first
+   *   submission instead of logging it again
+   * @param {Object} options - waitForReceipt: false returns as soon as the
+   *   transaction is sent (bulk path), without waiting for it to be mined
    * @returns {Object} Transaction result
    */
-  async logThreat(threatData) {
+  async logThreat(threatData, { waitForReceipt = true } = {}) {
+    if (!this.isConnected) {
+      throw new Error("Blockchain service not connected");
+    }
+
+    const key = threatData.idempotency_key;
+    if (key === undefined || key === null || key === "") {
+      const prefix = threatData.event_type === "summary" ? "summary" : "threat";
+      return this._logThreat(threatData, `${prefix}_${threatData.user_id}_${Date.now()}`, waitForReceipt);
+    }
+
+    const threatId = `audit_${key}`;
+    const previous = this.submitted.get(threatId);
+    if (previous) {
+      console.log(`   ↩️  ${threatId} already submitted, returning the first result`);
+      return previous;
+    }
+
+    const pending = this._logThreat(threatData, threatId, waitForReceipt).catch((error) => {
+      // Not on chain: let the next retry submit it
+      this.submitted.delete(threatId);
+      throw error;
+    });
+    this.submitted.set(threatId, pending);
+    if (this.submitted.size > MAX_REMEMBERED_SUBMISSIONS) {
+      // Maps iterate in insertion order: forget the oldest (the chain still dedupes it)
+      this.submitted.delete(this.submitted.keys().next().value);
+    }
+    return pending;
+  }
+
+  /**
+   * Whether an idempotent submission made it on chain:
+   * { status: "confirmed", txHash, blockNumber } once the threat is logged,
+   * "pending" while txHash is still known to the node, "reverted" or
+   * "dropped" (with error) when it never will be - the caller resubmits.
+   */
+  async threatStatus(idempotencyKey, txHash) {
     if (!this.isConnected) {
       throw new Error("Blockchain service not connected");
     }
+    const threatId = `audit_${idempotencyKey}`;
+    const logged = await this._findLoggedThreat(threatId);
+    if (logged) {
+      return { status: "confirmed", txHash: logged.transactionHash, blockNumber: logged.blockNumber };
+    }
+    if (txHash) {
+      const receipt = await this.provider.getTransactionReceipt(txHash);
+      if (receipt && receipt.status === 0) {
+        this.submitted.delete(threatId);
+        return { status: "reverted", error: `Transaction ${txHash} reverted` };
+      }
+      // Mined just now, or still waiting in the mempool
+      if (receipt || (await this.provider.getTransaction(txHash))) {
+        return { status: "pending" };
+      }
+    }
+    this.submitted.delete(threatId);
+    return { status: "dropped", error: `Transaction ${txHash} is not known to the node` };
+  }
 
+  /**
+   * Receipt of an already logged threatId, or null if it is not on chain
+   */
+  async _findLoggedThreat(threatId) {
+    if (!(await this.contract.isThreatLogged(threatId))) {
+      return null;
+    }
+    const logs = await this.contract.queryFilter(this.contract.filters.ThreatLogged(threatId));
+    return logs.length > 0 ? logs[0] : { transactionHash: null, blockNumber: null };
+  }
+
+  async _logThreat(threatData, threatId, waitForReceipt) {
     try {
       const { user_id, threat_score, duration_minutes, timestamp } = threatData;
+      // Escalation episodes: one "escalation" record, then periodic "summary"
+      // records aggregating event_count requests (see backend audit_policy.py)
+      const event_type = threatData.event_type || "escalation";
+      const event_count = threatData.event_count || 1;
 
-      const threatId = `threat_${user_id}_${Date.now()}`;
-      
       // 1. Generate the Privacy-Preserving hashId for the company to verify
       const userHashId = ethers.keccak256(ethers.toUtf8Bytes(user_id));
+
+      // 2. A retry after a lost response (or a bridge restart) must not log the event twice
+      if (threatData.idempotency_key !== undefined && threatData.idempotency_key !== null) {
+        const logged = await this._findLoggedThreat(threatId);
+        if (logged) {
+          return {
+            success: true,
+            threatId: threatId,
+            transactionHash: logged.transactionHash,
+            userHashId: userHashId,
+            blockNumber: logged.blockNumber,
+            mined: true,
+            duplicate: true
+          };
+        }
+      }
       
       const threatDetails = {
         userId: user_id,
@@ -92,6 +187,9 @@ class BlockchainService {
         threatScore: threat_score,
         durationMinutes: duration_minutes,
         timestamp: timestamp,
+        eventType: event_type,
+        eventCount: event_count,
+        episodeStartedAt: threatData.episode_started_at || null,
         detectionTime: new Date().toISOString()
       };
       
@@ -113,6 +211,23 @@ class BlockchainService {
         severity
       );
       
+      if (!waitForReceipt) {
+        // Mined later: the caller polls threatStatus(), which reports a revert.
+        // The contract rejects a second record with this threatId.
+        tx.wait().catch((error) => {
+          console.error(`❌ ${threatId} (${tx.hash}) failed after submission:`, error.message);
+          this.submitted.delete(threatId);
+        });
+        return {
+          success: true,
+          threatId: threatId,
+          transactionHash: tx.hash,
+          userHashId: userHashId,
+          blockNumber: null,
+          mined: false
+        };
+      }
+
       const receipt = await tx.wait();
       
       return {
@@ -121,7 +236,8 @@ class BlockchainService {
         transactionHash: receipt.hash, // The proof for SQLite
         userHashId: userHashId,        // The lookup ID for the company
         blockNumber: receipt.blockNumber,
-        gasUsed: receipt.gasUsed.toString()
+        gasUsed: receipt.gasUsed.toString(),
+        mined: true
       };
       
     } catch (error) {
@@ -39,6 +39,27 @@ app.get("/health", async (req, res) => {
   }
 });
 
+/**
+ * Validate a threat event; returns an error message or null
+ */
+function validateThreat(threat) {
+  const { user_id, threat_score, duration_minutes, timestamp } = threat || {};
+
+  // Validate required fields
+  if (!user_id || threat_score === undefined || duration_minutes === undefined || !timestamp) {
+    return "Missing required fields: user_id, threat_score, duration_minutes, timestamp";
+  }
+
+  // Validate data types
+  if (typeof threat_score !== "number" || typeof duration_minutes !== "number") {
+    return "threat_score and duration_minutes must be numbers";
+  }
+
+  return null;
+}
+
+const MAX_BATCH_SIZE = parseInt(process.env.MAX_BATCH_SIZE || "100", 10);
+
 /**
  * Log threat to blockchain - Main endpoint for Python backend
  * POST /log-threat
@@ -48,20 +69,9 @@ app.post("/log-threat", async (req, res) => {
   try {
     const { user_id, threat_score, duration_minutes, timestamp } = req.body;
 
-    // Validate required fields
-    if (!user_id || threat_score === undefined || !duration_minutes || !timestamp) {
-      return res.status(400).json({
-        success: false,
-        error: "Missing required fields: user_id, threat_score, duration_minutes, timestamp"
-      });
-    }
-
-    // Validate data types
-    if (typeof threat_score !== "number" || typeof duration_minutes !== "number") {
-      return res.status(400).json({
-        success: false,
-        error: "threat_score and duration_minutes must be numbers"
-      });
+    const validationError = validateThreat(req.body);
+    if (validationError) {
+      return res.status(400).json({ success: false, error: validationError });
     }
 
     console.log(`\n🚨 Received threat log request:`);
@@ -74,7 +84,11 @@ app.post("/log-threat", async (req, res) => {
       user_id,
       threat_score,
       duration_minutes,
-      timestamp
+      timestamp,
+      event_type: req.body.event_type,
+      event_count: req.body.event_count,
+      episode_started_at: req.body.episode_started_at,
+      idempotency_key: req.body.idempotency_key
     });
 
     // Return forensic evidence to Python
@@ -91,6 +105,106 @@ app.post("/log-threat", async (req, res) => {
   }
 });
 
+/**
+ * Log a batch of threats - used by the Python audit outbox
+ * POST /log-threats
+ * Body: { events: [{ user_id, threat_score, duration_minutes, timestamp,
+ *                   event_type?, event_count?, episode_started_at?,
+ *                   idempotency_key? }, ...] }
+ * Events are sent one after another (single signer, sequential nonces) but
+ * not waited on until mined, so a batch answers in about one RPC round trip
+ * per event instead of one block time per event. txHash is the submitted
+ * transaction and mined is false: poll POST /threat-status until it is
+ * confirmed. An event whose idempotency_key was already logged returns
+ * the original record (duplicate: true, mined: true) instead of being
+ * logged again, so the caller can retry a batch whose response it never got.
+ * Results come back in request order, each with its own success flag, so
+ * the caller can retry just the events that failed.
+ */
+app.post("/log-threats", async (req, res) => {
+  const { events } = req.body;
+
+  if (!Array.isArray(events) || events.length === 0) {
+    return res.status(400).json({ success: false, error: "events must be a non-empty array" });
+  }
+  if (events.length > MAX_BATCH_SIZE) {
+    return res.status(400).json({ success: false, error: `At most ${MAX_BATCH_SIZE} events per batch` });
+  }
+
+  console.log(`\n🚨 Received batch of ${events.length} threat log requests`);
+
+  const results = [];
+  for (const event of events) {
+    const validationError = validateThreat(event);
+    if (validationError) {
+      results.push({ success: false, error: validationError, retryable: false });
+      continue;
+    }
+
+    try {
+      const result = await blockchainService.logThreat({
+        user_id: event.user_id,
+        threat_score: event.threat_score,
+        duration_minutes: event.duration_minutes,
+        timestamp: event.timestamp,
+        event_type: event.event_type,
+        event_count: event.event_count,
+        episode_started_at: event.episode_started_at,
+        idempotency_key: event.idempotency_key
+      }, { waitForReceipt: false });
+      results.push({
+        success: true,
+        txHash: result.transactionHash,
+        userHashId: result.userHashId,
+        threatId: result.threatId,
+        mined: Boolean(result.mined),
+        duplicate: Boolean(result.duplicate)
+      });
+    } catch (error) {
+      results.push({ success: false, error: error.message, retryable: true });
+    }
+  }
+
+  res.json({
+    success: results.every((r) => r.success),
+    results
+  });
+});
+
+/**
+ * Receipt status of events submitted through /log-threats
+ * POST /threat-status
+ * Body: { events: [{ idempotency_key, txHash }, ...] }
+ * Returns one { status: "confirmed" | "pending" | "reverted" | "dropped",
+ * txHash?, blockNumber?, error? } per event, in request order. Reverted and
+ * dropped events are not on chain and should be submitted again.
+ */
+app.post("/threat-status", async (req, res) => {
+  const { events } = req.body;
+
+  if (!Array.isArray(events) || events.length === 0) {
+    return res.status(400).json({ success: false, error: "events must be a non-empty array" });
+  }
+  if (events.length > MAX_BATCH_SIZE) {
+    return res.status(400).json({ success: false, error: `At most ${MAX_BATCH_SIZE} events per batch` });
+  }
+
+  const results = [];
+  for (const event of events) {
+    if (!event || !event.idempotency_key) {
+      results.push({ status: "dropped", error: "Missing idempotency_key" });
+      continue;
+    }
+    try {
+      results.push(await blockchainService.threatStatus(event.idempotency_key, event.txHash));
+    } catch (error) {
+      results.push({ status: "pending", error: error.message });
+    }
+  }
+
+  res.json({ success: true, results });
+});
+
 /**
  * Get threat by ID
  * GET /threat/:id
@@ -143,6 +257,8 @@ app.get("/", (req, res) => {
     version: "1.0.0",
     endpoints: {
       "POST /log-threat": "Log a threat to blockchain",
+      "POST /log-threats": "Log a batch of threats to blockchain",
+      "POST /threat-status": "Receipt status of threats sent by /log-threats",
       "GET /threat/:id": "Get threat by ID",
       "GET /threat-count": "Get total threat count",
       "GET /health": "Health check"
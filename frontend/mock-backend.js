@@ -83,6 +83,22 @@ app.get("/api/blockchain/status", (_, res) => {
   res.json(audit);
 });
 
+// Live feed: one stats event on connect, then heartbeats
+app.get("/api/live", (req, res) => {
+  res.set({ "Content-Type": "text/event-stream", "Cache-Control": "no-cache" });
+  res.flushHeaders();
+  const count = (tier) => sessions.filter((s) => s.tier === tier).length;
+  const stats = {
+    total_sessions: sessions.length,
+    tier1_clean: count(1),
+    tier2_suspicious: count(2),
+    tier3_malicious: count(3)
+  };
+  res.write(`event: stats\ndata: ${JSON.stringify(stats)}\n\n`);
+  const heartbeat = setInterval(() => res.write(": heartbeat\n\n"), 15000);
+  req.on("close", () => clearInterval(heartbeat));
+});
+
 app.post("/api/chat", (req, res) => {
   const { userId, prompt } = req.body;
   const isMalicious = /dump|exfiltrate|bypass|token|password/i.test(prompt || "");
@@ -1,5 +1,8 @@
 import { useState, useEffect } from "react";
 import API from "../services/api";
+import { subscribeLive } from "../services/live";
+
+const MAX_RECORDS = 50;
 
 export default function Audit() {
   const [records, setRecords] = useState([]);
@@ -20,8 +23,16 @@ export default function Audit() {
     };
 
     fetchAudit();
-    const interval = setInterval(fetchAudit, 2000);
-    return () => clearInterval(interval);
+    // Audit events are pushed when queued, then again once confirmed or failed
+    return subscribeLive(["audit"], {
+      audit: (record) =>
+        setRecords((prev) =>
+          prev.some((r) => r.id === record.id)
+            ? prev.map((r) => (r.id === record.id ? record : r))
+            : [record, ...prev].slice(0, MAX_RECORDS)
+        ),
+      resync: fetchAudit
+    });
   }, []);
 
   if (loading) return <div className="audit-container loading-state">Loading...</div>;
@@ -41,16 +52,20 @@ export default function Audit() {
           </div>
         ) : (
           records.map((record, idx) => (
-            <div key={idx} className="audit-record">
+            <div key={record.id ?? idx} className="audit-record">
               <div className="audit-record-header">
-                <h3>Tier 3 Threat Detected</h3>
+                <h3>
+                  {record.eventType === "summary"
+                    ? `Tier 3 Activity Summary (${record.eventCount} requests)`
+                    : "Tier 3 Threat Detected"}
+                </h3>
                 <span className="timestamp-cell">
                   {new Date(record.timestamp).toLocaleString()}
                 </span>
               </div>
               <div className="audit-record-details">
                 <p><strong>User ID:</strong> <code>{record.userId}</code></p>
-                <p><strong>Status:</strong> Confirmed</p>
+                <p><strong>Status:</strong> {record.status}</p>
                 <p><strong>Transaction Hash:</strong> <code className="tx-hash">{record.txHash}</code></p>
               </div>
               <div className="audit-record-footer">
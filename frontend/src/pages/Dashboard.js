@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import API from "../services/api";
+import { subscribeLive } from "../services/live";
 
 export default function Dashboard() {
   const [stats, setStats] = useState({
@@ -25,8 +26,15 @@ export default function Dashboard() {
     };
 
     fetchStats();
-    const interval = setInterval(fetchStats, 2000);
-    return () => clearInterval(interval);
+    // Pushed whenever a tier count changes, no polling
+    return subscribeLive(["stats"], {
+      stats: (data) => {
+        setStats(data);
+        setError("");
+        setLoading(false);
+      },
+      resync: fetchStats
+    });
   }, []);
 
   if (loading) return <div className="dashboard loading-state">Loading...</div>;
@@ -1,5 +1,8 @@
 import { useState, useEffect } from "react";
 import API from "../services/api";
+import { subscribeLive } from "../services/live";
+
+const MAX_ROWS = 100;
 
 export default function Logs() {
   const [logs, setLogs] = useState([]);
@@ -20,8 +23,11 @@ export default function Logs() {
     };
 
     fetchLogs();
-    const interval = setInterval(fetchLogs, 2000);
-    return () => clearInterval(interval);
+    // New query logs are pushed as they are written
+    return subscribeLive(["log"], {
+      log: (row) => setLogs((prev) => [row, ...prev].slice(0, MAX_ROWS)),
+      resync: fetchLogs
+    });
   }, []);
 
   if (loading) return <div className="logs-container loading-state">Loading...</div>;
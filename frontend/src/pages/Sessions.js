@@ -1,5 +1,8 @@
 import { useState, useEffect } from "react";
 import API from "../services/api";
+import { subscribeLive } from "../services/live";
+
+const MAX_ROWS = 100;
 
 export default function Sessions() {
   const [sessions, setSessions] = useState([]);
@@ -20,8 +23,14 @@ export default function Sessions() {
     };
 
     fetchSessions();
-    const interval = setInterval(fetchSessions, 2000);
-    return () => clearInterval(interval);
+    // Each event is one user's updated row; most recently active first
+    return subscribeLive(["session"], {
+      session: (row) =>
+        setSessions((prev) =>
+          [row, ...prev.filter((s) => s.userId !== row.userId)].slice(0, MAX_ROWS)
+        ),
+      resync: fetchSessions
+    });
   }, []);
 
   if (loading) return <div className="sessions-container loading-state">Loading...</div>;
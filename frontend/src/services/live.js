@@ -0,0 +1,30 @@
+import API from "./api";
+
+// Subscribe to the backend's live feed (GET /api/live, Server-Sent Events).
+// handlers maps event names ("stats", "session", "log", "audit") to callbacks
+// receiving the parsed event data. handlers.resync runs when events may have
+// been missed (slow client, or the stream reconnected): reload from REST.
+// Returns a function that closes the stream.
+export function subscribeLive(topics, handlers) {
+  const url = `${API.defaults.baseURL}/api/live?topics=${topics.join(",")}`;
+  const source = new EventSource(url);
+  let disconnected = false;
+
+  topics.forEach((topic) => {
+    if (handlers[topic]) {
+      source.addEventListener(topic, (e) => handlers[topic](JSON.parse(e.data)));
+    }
+  });
+  source.addEventListener("resync", () => handlers.resync && handlers.resync());
+
+  // EventSource reconnects on its own; anything sent meanwhile is lost
+  source.onerror = () => {
+    disconnected = true;
+  };
+  source.onopen = () => {
+    if (disconnected && handlers.resync) handlers.resync();
+    disconnected = false;
+  };
+
+  return () => source.close();
+}